@@ -8,6 +8,7 @@ from .tools import (
 )
 from .imaging_tools import (
     medical_image_analysis,
+    medical_study_analysis,
     extract_imaging_findings,
     compare_imaging_timeline,
 )
@@ -111,7 +112,12 @@ imaging_analyst = Agent(
         "and other medical imaging modalities. Specializes in detecting abnormalities, "
         "measuring anatomical structures, and providing evidence-based diagnostic assessments."
     ),
-    tools=[medical_image_analysis, extract_imaging_findings, compare_imaging_timeline],
+    tools=[
+        medical_image_analysis,
+        medical_study_analysis,
+        extract_imaging_findings,
+        compare_imaging_timeline,
+    ],
     allow_delegation=False,
     llm=get_llm(),
 )
@@ -0,0 +1,262 @@
+"""
+Allergy cross-reactivity screening over a local drug-class hierarchy
+"""
+import csv
+import re
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from .conditions import normalize_medications
+from .config import CROSS_REACTIVITY_PATH, DRUG_CLASSES_PATH
+from .formulary import get_formulary, normalize_drug_name
+from .speculation import extract_drug_names
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+SEVERITY_RANK = {"low": 1, "moderate": 2, "high": 3}
+
+# Free-text allergy names folded onto hierarchy nodes
+_ALLERGEN_ALIASES = {
+    "pcn": "penicillins",
+    "sulfa": "sulfonamide antibiotics",
+    "sulfa drugs": "sulfonamide antibiotics",
+    "sulfonamides": "sulfonamide antibiotics",
+    "nsaid": "nsaids",
+    "contrast": "iodinated contrast",
+    "iodine": "iodinated contrast",
+    "augmentin": "amoxicillin clavulanate",
+    "bactrim": "sulfamethoxazole trimethoprim",
+    "septra": "sulfamethoxazole trimethoprim",
+    "keflex": "cephalexin",
+    "rocephin": "ceftriaxone",
+    "toradol": "ketorolac",
+    "celebrex": "celecoxib",
+    "tegretol": "carbamazepine",
+    "dilantin": "phenytoin",
+    "adrenaline": "epinephrine",
+    "epipen": "epinephrine",
+}
+# Longest drug or class name, in words, looked up when scanning free text
+_MAX_NAME_WORDS = 3
+_NO_ALLERGY_RE = re.compile(
+    r"\b(?:no known (?:drug |medication )?allerg(?:y|ies)|no (?:known )?(?:drug )?allergies|"
+    r"denies (?:any )?(?:drug )?allergies|nk(?:d|m|f)?as?)\b",
+    re.I,
+)
+_REACTION_RE = re.compile(r"\(.*?\)|\b(?:allerg(?:y|ies|ic)(?: to)?|intoleran(?:ce|t)(?: to)?|sensitivity|reaction)\b", re.I)
+
+
+@dataclass(frozen=True)
+class AllergyConflict:
+    """A proposed drug that cross-reacts with a listed allergen"""
+
+    allergen: str
+    drug: str
+    drug_class: str
+    severity: str
+    note: str
+
+
+class AllergyIndex:
+    """Drug-class hierarchy with its transitive closure precomputed.
+
+    ``ancestors`` holds every node's classes, nearest first, computed once at
+    load. Each allergen's reactive classes (its own structural class plus
+    the cross-reactivity edges of its ancestors) are built once per
+    allergen and cached, so a check is a few dict probes along the
+    drug's ancestor list, bounded by tree depth rather than tree size. The
+    nearest reactive class wins, so "NSAIDs -> COX-2 inhibitors: low"
+    overrides a broader "NSAIDs: high".
+    """
+
+    def __init__(self, edges: Sequence[Tuple[str, str]], cross: Sequence[Dict[str, str]] = ()):
+        parents: Dict[str, List[str]] = defaultdict(list)
+        children: Dict[str, List[str]] = defaultdict(list)
+        for child, parent in edges:
+            child, parent = _key(child), _key(parent)
+            parents[child].append(parent)
+            children[parent].append(child)
+        self.nodes = frozenset(parents) | frozenset(children)
+        self._parents = {node: tuple(parents.get(node, ())) for node in self.nodes}
+        self._is_class = {node: node in children for node in self.nodes}
+        self.ancestors: Dict[str, Tuple[str, ...]] = {node: self._closure(node) for node in self.nodes}
+        self._cross: Dict[str, List[Tuple[str, str, str]]] = defaultdict(list)
+        for row in cross:
+            self._cross[_key(row["allergen_class"])].append(
+                (_key(row["reactive_class"]), row["severity"].strip().lower(), row.get("note") or "")
+            )
+        self._reactive: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    def _closure(self, node: str) -> Tuple[str, ...]:
+        """Node and all its ancestors in breadth-first (nearest first) order"""
+        seen, order, queue = {node}, [node], deque([node])
+        while queue:
+            for parent in self._parents[queue.popleft()]:
+                if parent not in seen:
+                    seen.add(parent)
+                    order.append(parent)
+                    queue.append(parent)
+        return tuple(order)
+
+    @classmethod
+    def load(cls, classes_path: Optional[str] = None, cross_path: Optional[str] = None) -> "AllergyIndex":
+        with open(classes_path or DRUG_CLASSES_PATH, newline="", encoding="utf-8") as handle:
+            edges = [(row["name"], row["parent"]) for row in csv.DictReader(handle)]
+        with open(cross_path or CROSS_REACTIVITY_PATH, newline="", encoding="utf-8") as handle:
+            cross = list(csv.DictReader(handle))
+        return cls(edges, cross)
+
+    def resolve(self, term: str) -> Optional[str]:
+        """Hierarchy node for a drug, brand or class name, or None"""
+        if term in self._resolved:
+            return self._resolved[term]
+        node = self._lookup(_key(term))
+        self._resolved[term] = node
+        return node
+
+    def _lookup(self, name: str) -> Optional[str]:
+        name = _ALLERGEN_ALIASES.get(name, name)
+        return next(
+            (candidate for candidate in (name, normalize_drug_name(name), f"{name}s") if candidate in self.nodes),
+            None,
+        )
+
+    def find_drugs(self, text: str) -> List[str]:
+        """Drugs and drug classes named anywhere in free text, in order of first mention.
+
+        Scans word n-grams longest first, so "amoxicillin clavulanate" is one
+        drug rather than amoxicillin. Top-level groups ("antibiotics") are
+        too broad to count as a named drug.
+        """
+        words = _key(text).split()
+        found: Dict[str, None] = {}
+        position = 0
+        while position < len(words):
+            for size in range(min(_MAX_NAME_WORDS, len(words) - position), 0, -1):
+                node = self._lookup(" ".join(words[position : position + size]))
+                if node is not None and not self._is_root(node):
+                    found[node] = None
+                    position += size
+                    break
+            else:
+                position += 1
+        return list(found)
+
+    def members(self, node: str) -> Tuple[str, ...]:
+        """Drugs (leaf nodes) under a class, or the drug itself"""
+        if not self._is_class.get(node):
+            return (node,)
+        return tuple(
+            sorted(name for name, ancestors in self.ancestors.items() if node in ancestors and not self._is_class[name])
+        )
+
+    def _is_root(self, node: str) -> bool:
+        return not self._parents[node]
+
+    def reactive_classes(self, allergen: str) -> Dict[str, Tuple[str, str]]:
+        """Node -> (severity, note) for everything an allergen cross-reacts with"""
+        cached = self._reactive.get(allergen)
+        if cached is not None:
+            return cached
+        # A drug allergy extends to its structural classes; top-level therapeutic groups are not structural
+        reactive: Dict[str, Tuple[str, str]] = {}
+        if not self._is_class[allergen]:
+            for parent in self._parents[allergen]:
+                if not self._is_root(parent):
+                    reactive[parent] = ("high", f"same class as {allergen}")
+        # Listed cross-reactivity overrides the class default; several edges keep the most severe
+        explicit = set()
+        for source in self.ancestors[allergen]:
+            for target, severity, note in self._cross.get(source, ()):
+                current = reactive.get(target)
+                if target not in explicit or SEVERITY_RANK[severity] > SEVERITY_RANK[current[0]]:
+                    reactive[target] = (severity, note)
+                    explicit.add(target)
+        reactive[allergen] = ("high", "listed allergen")
+        self._reactive[allergen] = reactive
+        return reactive
+
+    def check(self, allergen: str, drug: str) -> Optional[AllergyConflict]:
+        """Cross-reactivity between one allergen and one drug, or None"""
+        allergen_node, drug_node = self.resolve(allergen), self.resolve(drug)
+        if allergen_node is None or drug_node is None:
+            return None
+        reactive = self.reactive_classes(allergen_node)
+        for node in self.ancestors[drug_node]:
+            if node in reactive:
+                severity, note = reactive[node]
+                return AllergyConflict(allergen, drug, node, severity, note)
+        return None
+
+    def screen(self, allergies: Iterable[str], drugs: Iterable[str]) -> List[AllergyConflict]:
+        """All allergen/drug conflicts, most severe first"""
+        drugs = list(dict.fromkeys(drugs))
+        conflicts = [
+            conflict
+            for allergen in dict.fromkeys(allergies)
+            for drug in drugs
+            if (conflict := self.check(allergen, drug)) is not None
+        ]
+        return sorted(conflicts, key=lambda conflict: -SEVERITY_RANK[conflict.severity])
+
+
+def _key(name: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", (name or "").lower()).split())
+
+
+def parse_allergies(text: str) -> List[str]:
+    """Allergen names from free text such as "Penicillin (rash), sulfa drugs"; NKDA-style text gives none"""
+    text = _NO_ALLERGY_RE.sub(" ", text or "")
+    index = get_allergy_index()
+    allergens = []
+    for item in normalize_medications(_REACTION_RE.sub(" ", text)):
+        # "pcn/sulfa" lists two allergens; "amoxicillin/clavulanate" names one combination product
+        parts = [item] if "/" not in item or index.resolve(item) is not None else item.split("/")
+        allergens.extend(cleaned for part in parts if (cleaned := " ".join(part.split())))
+    return allergens
+
+
+def proposed_drugs(text: str) -> List[str]:
+    """Drugs named in free text by hierarchy, formulary, brand or class name, then by class suffix"""
+    found = dict.fromkeys(get_allergy_index().find_drugs(text))
+    # Words already part of a multi-word name ("amoxicillin clavulanate") are not separate drugs
+    named = {word for name in found for word in name.split()}
+    ingredients = frozenset(get_formulary().ingredients)
+    for word in _key(text).split():
+        name = normalize_drug_name(word)
+        if name in ingredients and name not in named:
+            found.setdefault(name)
+    for name in sorted(extract_drug_names(text)):
+        name = normalize_drug_name(name)
+        if name not in named:
+            found.setdefault(name)
+    return list(found)
+
+
+def format_screen(conflicts: Sequence[AllergyConflict]) -> str:
+    if not conflicts:
+        return "No cross-reactivity found between listed allergies and proposed medications"
+    return "\n".join(
+        f"- {c.severity.upper()}: {c.drug} vs {c.allergen} allergy ({c.drug_class}; {c.note})" for c in conflicts
+    )
+
+
+def allergy_screen_inputs(inputs: Dict[str, Any], outputs: Dict[str, str]) -> Dict[str, Any]:
+    """Deterministic allergy screen of current and proposed drugs for the drug-safety step"""
+    allergies = parse_allergies(inputs.get("allergies", ""))
+    if not allergies:
+        return {"allergy_screen": "No allergies listed"}
+    drugs = proposed_drugs(inputs.get("medications", "")) + proposed_drugs(outputs.get("treatment_recommendation", ""))
+    conflicts = get_allergy_index().screen(allergies, drugs)
+    if conflicts:
+        logger.warning("Allergy screen flagged %d conflict(s)", len(conflicts))
+    return {"allergy_screen": format_screen(conflicts)}
+
+
+@lru_cache(maxsize=1)
+def get_allergy_index() -> AllergyIndex:
+    """Allergy index loaded once from DRUG_CLASSES_PATH and CROSS_REACTIVITY_PATH"""
+    return AllergyIndex.load()
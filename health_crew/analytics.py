@@ -0,0 +1,390 @@
+"""
+Columnar on-disk dataset of finished runs, partitioned by day, with aggregate queries
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from .config import ANALYTICS_DIR, ANALYTICS_ENABLED, GEMINI_MODEL, OPENAI_MODEL
+from .speculation import differential_candidates
+from .trace import RunTrace
+from .utils.logging import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized within the process only
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# Column name -> on-disk dtype; "str" columns are dictionary-encoded as int32 codes
+SCHEMA: Dict[str, str] = {
+    "finished_at": "<f8",
+    "duration_s": "<f4",
+    "llm_calls": "<i4",
+    "llm_tokens": "<i8",
+    "tool_calls": "<i4",
+    "tool_calls_deduplicated": "<i4",
+    "steps": "<i2",
+    "skipped_steps": "<i2",
+    "partial": "u1",
+    "include_imaging": "u1",
+    # 1 if the treatment or referral text mentions imaging at all (including "no imaging needed"
+    # or "CT if it persists"), 0 if not, -1 without imaging; not evidence that imaging changed the plan
+    "plan_mentions_imaging": "i1",
+    "model": "str",
+    "vision_model": "str",
+    "profile": "str",
+    "source": "str",
+    "top_differential": "str",
+}
+# Dictionary-encoded columns; the only ones latency and top can group or rank by
+STRING_COLUMNS: Tuple[str, ...] = tuple(name for name, dtype in SCHEMA.items() if dtype == "str")
+_FILL = {"str": -1, "<f8": np.nan, "<f4": np.nan}
+# Columns renamed since days were written -> their earlier file name (same values)
+_RENAMED = {"plan_mentions_imaging": "imaging_changed_plan"}
+
+_PARTITION_RE = re.compile(r"^day=(\d{4}-\d{2}-\d{2})$")
+_IMAGING_REFERENCE_RE = re.compile(
+    r"\b(?:imaging|radiograph\w*|x-?rays?|ct|mri|ultrasound|sonograph\w*|scan|radiolog\w*)\b", re.I
+)
+
+
+def _dtype(column: str) -> np.dtype:
+    kind = SCHEMA[column]
+    return np.dtype("<i4" if kind == "str" else kind)
+
+
+def run_row(
+    trace: RunTrace,
+    include_imaging: bool = False,
+    profile: str = "full",
+    partial: bool = False,
+    skipped: int = 0,
+    source: str = "cli",
+    model: str = OPENAI_MODEL,
+) -> Dict[str, Any]:
+    """Analytics row for a finished run, taken from its trace"""
+    outputs = {task.name: task.output for task in trace.tasks}
+    candidates = differential_candidates(outputs.get("symptom_analysis", ""), limit=1)
+    if include_imaging:
+        plan_text = "\n".join(outputs.get(name, "") for name in ("treatment_recommendation", "referral_assessment"))
+        mentions_imaging = int(bool(_IMAGING_REFERENCE_RE.search(plan_text)))
+    else:
+        mentions_imaging = -1
+    return {
+        "finished_at": trace.finished_at or time.time(),
+        "duration_s": trace.duration_s,
+        "llm_calls": trace.llm_calls,
+        "llm_tokens": trace.llm_tokens,
+        "tool_calls": trace.tool_calls,
+        "tool_calls_deduplicated": trace.tool_calls_deduplicated,
+        "steps": len(trace.tasks),
+        "skipped_steps": skipped,
+        "partial": int(partial),
+        "include_imaging": int(include_imaging),
+        "plan_mentions_imaging": mentions_imaging,
+        "model": model,
+        "vision_model": GEMINI_MODEL if include_imaging else "",
+        "profile": profile,
+        "source": source,
+        "top_differential": candidates[0].strip().rstrip(".").lower() if candidates else "",
+    }
+
+
+@dataclass
+class Frame:
+    """Columns scanned from the dataset; string columns hold codes into ``vocab``"""
+
+    columns: Dict[str, np.ndarray]
+    vocab: Dict[str, List[str]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def labels(self, column: str) -> np.ndarray:
+        """Decoded values of a string column (costly on large frames; prefer the codes)"""
+        vocab = np.array(self.vocab[column] + [""], dtype=object)
+        return vocab[self.columns[column]]
+
+
+class AnalyticsStore:
+    """Append-only columnar dataset of finished runs.
+
+    Each day is a directory ``day=YYYY-MM-DD`` holding one raw little-endian
+    file per column, so appending a row is a small write per column and a
+    query reads only the files of the columns it uses. String columns are
+    int32 codes into a per-day dictionary file. A column cut short by a
+    crash is ignored past the shortest column's length.
+    """
+
+    def __init__(self, root: str = ANALYTICS_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        # (day, column) -> (dictionary file size when read, value -> code)
+        self._dictionaries: Dict[Tuple[str, str], Tuple[int, Dict[str, int]]] = {}
+
+    def _partition(self, day: str) -> Path:
+        return self.root / f"day={day}"
+
+    @contextmanager
+    def _locked(self, directory: Path) -> Iterator[None]:
+        with self._lock, open(directory / ".lock", "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _codes(self, directory: Path, day: str, column: str, values: Sequence[str]) -> np.ndarray:
+        """Dictionary codes for values, appending new ones to the day's dictionary file"""
+        path = directory / f"{column}.dict"
+        size = path.stat().st_size if path.exists() else 0
+        cached = self._dictionaries.get((day, column))
+        if cached is None or cached[0] != size:
+            # Another process may have appended since we last read it
+            cached = (size, {value: code for code, value in enumerate(_read_dictionary(path))})
+        lookup = cached[1]
+        new = [value for value in dict.fromkeys(values) if value not in lookup]
+        if new:
+            with open(path, "a", encoding="utf-8") as handle:
+                handle.write("".join(json.dumps(value) + "\n" for value in new))
+            for value in new:
+                lookup[value] = len(lookup)
+            size = path.stat().st_size
+        self._dictionaries[(day, column)] = (size, lookup)
+        return np.fromiter((lookup[value] for value in values), dtype="<i4", count=len(values))
+
+    def _align(self, directory: Path) -> None:
+        """Bring every column file to the same row count before appending.
+
+        Trims the tail a crash left on some columns, moves renamed columns to
+        their current file and back-fills columns added to SCHEMA after the
+        day was started, so rows stay aligned.
+        """
+        lengths = {}
+        for column in SCHEMA:
+            path = directory / f"{column}.bin"
+            previous = directory / f"{_RENAMED.get(column, column)}.bin"
+            if not path.exists() and previous.exists():
+                os.replace(previous, path)
+            lengths[column] = path.stat().st_size // _dtype(column).itemsize if path.exists() else None
+        present = [length for length in lengths.values() if length is not None]
+        rows = min(present, default=0)
+        for column, length in lengths.items():
+            path = directory / f"{column}.bin"
+            if length is None:
+                fill = np.full(rows, _FILL.get(SCHEMA[column], 0), dtype=_dtype(column))
+                path.write_bytes(fill.tobytes())
+            elif path.stat().st_size != rows * _dtype(column).itemsize:
+                os.truncate(path, rows * _dtype(column).itemsize)
+
+    def append(self, rows: Sequence[Dict[str, Any]]) -> None:
+        """Append rows, each landing in the partition of its ``finished_at`` day"""
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            day = datetime.fromtimestamp(row["finished_at"]).date().isoformat()
+            by_day.setdefault(day, []).append(row)
+        for day, day_rows in by_day.items():
+            directory = self._partition(day)
+            directory.mkdir(parents=True, exist_ok=True)
+            with self._locked(directory):
+                self._align(directory)
+                for column, kind in SCHEMA.items():
+                    if kind == "str":
+                        values = [str(row.get(column) or "") for row in day_rows]
+                        data = self._codes(directory, day, column, values)
+                    else:
+                        data = np.array([row.get(column, _FILL.get(kind, 0)) for row in day_rows], dtype=kind)
+                    with open(directory / f"{column}.bin", "ab") as handle:
+                        handle.write(data.tobytes())
+
+    def partitions(self, since: Optional[date] = None, until: Optional[date] = None) -> List[str]:
+        """Days with data in [since, until], oldest first"""
+        if not self.root.is_dir():
+            return []
+        days = []
+        for entry in os.scandir(self.root):
+            match = _PARTITION_RE.match(entry.name)
+            if match and entry.is_dir():
+                day = date.fromisoformat(match.group(1))
+                if (since is None or day >= since) and (until is None or day <= until):
+                    days.append(match.group(1))
+        return sorted(days)
+
+    def scan(self, columns: Sequence[str], since: Optional[date] = None, until: Optional[date] = None) -> Frame:
+        """Read only ``columns`` from the partitions in range.
+
+        String codes are remapped onto one vocabulary across days, so
+        grouping works on integer arrays without decoding.
+        """
+        unknown = [column for column in columns if column not in SCHEMA]
+        if unknown:
+            raise ValueError(f"Unknown analytics column(s): {', '.join(unknown)}")
+        parts: Dict[str, List[np.ndarray]] = {column: [] for column in columns}
+        vocab: Dict[str, Dict[str, int]] = {column: {} for column in columns if SCHEMA[column] == "str"}
+        for day in self.partitions(since, until):
+            directory = self._partition(day)
+            arrays = {column: _read_column(directory, column) for column in columns}
+            rows = min((len(array) for array in arrays.values() if array is not None), default=0)
+            for column in columns:
+                array = arrays[column]
+                if array is None:  # column added after this day was written
+                    array = np.full(rows, _FILL.get(SCHEMA[column], 0), dtype=_dtype(column))
+                array = array[:rows]
+                if column in vocab:
+                    values = _read_dictionary(directory / f"{column}.dict")
+                    codes = [vocab[column].setdefault(value, len(vocab[column])) for value in values]
+                    # The trailing -1 keeps fill codes (-1) pointing at "no value"
+                    array = np.array(codes + [-1], dtype="<i4")[array]
+                parts[column].append(array)
+        return Frame(
+            {
+                column: np.concatenate(arrays) if arrays else np.empty(0, dtype=_dtype(column))
+                for column, arrays in parts.items()
+            },
+            {column: list(values) for column, values in vocab.items()},
+        )
+
+
+def _read_column(directory: Path, column: str) -> Optional[np.ndarray]:
+    path = directory / f"{column}.bin"
+    if not path.exists() and column in _RENAMED:
+        path = directory / f"{_RENAMED[column]}.bin"
+    if not path.exists():
+        return None
+    dtype = _dtype(column)
+    size = path.stat().st_size // dtype.itemsize
+    return np.fromfile(path, dtype=dtype, count=size)
+
+
+def _read_dictionary(path: Path) -> List[str]:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.endswith("\n")]
+
+
+def date_range(
+    days: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None
+) -> Tuple[Optional[date], Optional[date]]:
+    """(since, until) from either the last ``days`` days or explicit ISO dates"""
+    if days:
+        return date.today() - timedelta(days=days - 1), None
+    return (
+        date.fromisoformat(since) if since else None,
+        date.fromisoformat(until) if until else None,
+    )
+
+
+def _check_string_column(name: str) -> None:
+    if name not in STRING_COLUMNS:
+        raise ValueError(f"{name!r} is not a string column; expected one of {', '.join(STRING_COLUMNS)}")
+
+
+def latency_percentiles(
+    store: AnalyticsStore,
+    by: str = "model",
+    percentiles: Sequence[float] = (50, 95),
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> Dict[str, Dict[str, float]]:
+    """Run count and duration percentiles per value of a string column"""
+    _check_string_column(by)
+    frame = store.scan(["duration_s", by], since, until)
+    durations, groups = frame["duration_s"], frame[by]
+    order = np.argsort(groups, kind="stable")
+    groups, durations = groups[order], durations[order]
+    bounds = np.flatnonzero(np.diff(groups)) + 1
+    result = {}
+    for group, values in zip(groups[np.r_[0, bounds]] if len(groups) else [], np.split(durations, bounds)):
+        label = frame.vocab[by][group] if group >= 0 else ""
+        stats = {"runs": len(values)}
+        stats.update(
+            {f"p{q:g}": float(value) for q, value in zip(percentiles, np.nanpercentile(values, percentiles))}
+        )
+        result[label or "(none)"] = stats
+    return result
+
+
+def top_values(
+    store: AnalyticsStore,
+    column: str = "top_differential",
+    limit: int = 10,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> List[Tuple[str, int]]:
+    """Most frequent non-empty values of a string column"""
+    _check_string_column(column)
+    frame = store.scan([column], since, until)
+    codes = frame[column]
+    counts = np.bincount(codes[codes >= 0], minlength=len(frame.vocab[column]))
+    ranked = [
+        (frame.vocab[column][code], int(counts[code])) for code in np.argsort(-counts, kind="stable")
+        if counts[code] and frame.vocab[column][code]
+    ]
+    return ranked[:limit]
+
+
+def imaging_mention_rate(
+    store: AnalyticsStore, since: Optional[date] = None, until: Optional[date] = None
+) -> Dict[str, float]:
+    """Share of imaging runs whose treatment or referral text mentions imaging.
+
+    A mention rate only: it counts "no imaging needed" too and has no
+    no-imaging baseline, so it says nothing about whether imaging changed
+    the plan.
+    """
+    mentions = store.scan(["plan_mentions_imaging"], since, until)["plan_mentions_imaging"]
+    imaging = mentions[mentions >= 0]
+    return {
+        "imaging_runs": len(imaging),
+        "mentioned": int(imaging.sum()),
+        "rate": float(imaging.mean()) if len(imaging) else 0.0,
+    }
+
+
+def summary(store: AnalyticsStore, since: Optional[date] = None, until: Optional[date] = None) -> Dict[str, float]:
+    frame = store.scan(["duration_s", "llm_calls", "llm_tokens", "partial", "include_imaging"], since, until)
+    runs = len(frame)
+    if not runs:
+        return {"runs": 0}
+    return {
+        "runs": runs,
+        "partial_rate": float(frame["partial"].mean()),
+        "imaging_rate": float(frame["include_imaging"].mean()),
+        "mean_duration_s": float(np.nanmean(frame["duration_s"])),
+        "mean_llm_calls": float(frame["llm_calls"].mean()),
+        "total_llm_tokens": int(frame["llm_tokens"].sum()),
+    }
+
+
+def record_rows(rows: Sequence[Dict[str, Any]]) -> None:
+    """Append rows to the analytics dataset; failures are only logged"""
+    if not ANALYTICS_ENABLED or not rows:
+        return
+    try:
+        get_analytics_store().append(rows)
+    except Exception as e:
+        logger.warning("Could not record run analytics: %s", e)
+
+
+def record_run(trace: RunTrace, **details: Any) -> None:
+    """Append a finished run to the analytics dataset"""
+    if ANALYTICS_ENABLED:
+        record_rows([run_row(trace, **details)])
+
+
+@lru_cache(maxsize=1)
+def get_analytics_store() -> AnalyticsStore:
+    """Process-wide store at ANALYTICS_DIR"""
+    return AnalyticsStore()
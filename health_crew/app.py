@@ -1,45 +1,231 @@
+import argparse
 import os
 from rich import print
-from rich.prompt import Prompt
-from .workflows import build_diagnosis_crew
+from rich.prompt import Confirm, Prompt
+from .workflows import PROFILES, task_names
+from .runner import CheckpointStore, run_plan
+from .intake import build_inputs
+from .cache import case_key
+from .report import crew_output_text
+from .store import CaseRecord, get_case_store
+from .similarity import get_similar_case_index, index_record
+from .trace import RunTrace
+from .analytics import (
+    STRING_COLUMNS,
+    date_range,
+    get_analytics_store,
+    imaging_mention_rate,
+    latency_percentiles,
+    record_run,
+    summary,
+    top_values,
+)
 from .utils.logging import get_logger
-from .config import OPENAI_MODEL
+from .config import CREW_PROFILE, OPENAI_MODEL, SPECULATIVE_EXECUTION
 
 logger = get_logger(__name__)
 
 
 def _gather_inputs():
     print("[bold cyan]Healthcare Diagnosis Support (CrewAI Demo)[/bold cyan]")
+    patient_id = Prompt.ask("Enter patient ID (optional)", default="")
     symptoms = Prompt.ask("Enter primary symptoms (comma-separated)")
     demographics = Prompt.ask("Enter demographics (e.g., age 45, male)")
     history = Prompt.ask("Enter brief medical history")
     medications = Prompt.ask("Enter current medications (comma-separated)")
     allergies = Prompt.ask("Enter allergies (comma-separated, leave blank if none)")
 
-    return {
-        "symptoms": symptoms,
-        "demographics": demographics,
-        "history": history,
-        "medications": medications,
-        "allergies": allergies,
-        # placeholders carried forward through tasks
-        "working_differential": "To be generated by Symptom Analyzer",
-        "diagnosis_summary": "To be generated by previous steps",
-        "proposed_medications": medications,
-        "conditions": "From differential/diagnosis",
-        "treatment_plan": "To be generated by Treatment Agent",
-        "referral_plan": "To be generated by Referral Agent",
-        "clinical_summary": "Consolidated output",
-    }
-
-
-def main():
-    crew = build_diagnosis_crew(verbose=True)
-    inputs = _gather_inputs()
+    return build_inputs(symptoms, demographics, history, medications, allergies, patient_id=patient_id)
+
+
+def _run(
+    inputs,
+    key: str,
+    include_imaging: bool = False,
+    speculative: bool = SPECULATIVE_EXECUTION,
+    profile: str = CREW_PROFILE,
+) -> None:
+    store = get_case_store()
+    similar_index = get_similar_case_index()
     print(f"\n[bold yellow]Running diagnosis crew with OpenAI model: {OPENAI_MODEL}...[/bold yellow]")
-    result = crew.kickoff(inputs=inputs)
+    with RunTrace(task_names=task_names(include_imaging, profile)) as trace:
+        try:
+            result = run_plan(
+                inputs,
+                include_imaging=include_imaging,
+                verbose=True,
+                key=key,
+                speculative=speculative,
+                profile=profile,
+            )
+        except Exception as e:
+            print(f"\n[bold red]Run failed: {e}[/bold red]")
+            print(
+                f"[yellow]{len(trace.tasks)} completed step(s) are checkpointed; "
+                "run `python -m health_crew.app --resume` to continue.[/yellow]"
+            )
+            raise SystemExit(1)
+    record_run(
+        trace,
+        include_imaging=include_imaging,
+        profile=profile,
+        partial=bool(result.partial),
+        skipped=len(result.skipped),
+        source="cli",
+    )
+    if result.partial:
+        # Not stored as a finished case; the checkpoint lets a later run complete it
+        print("\n[bold yellow]Partial Result[/bold yellow]")
+        print(result)
+        print(
+            f"\n[yellow]{len(result.partial)} step(s) did not run: {result.partial[0]['reason']}. "
+            "Run `python -m health_crew.app --resume` to complete the case.[/yellow]"
+        )
+        return
+    record = CaseRecord.from_trace(
+        key, inputs, crew_output_text(result), trace, include_imaging=include_imaging, skipped=result.skipped
+    )
+    case_id = store.save(record)
+    index_record(similar_index, record)
     print("\n[bold green]Crew Result[/bold green]")
     print(result)
+    print(
+        f"\n[dim]Saved as case {case_id} ({trace.llm_calls} LLM calls, "
+        f"~{trace.llm_tokens} tokens, {trace.tool_calls_deduplicated}/{trace.tool_calls} tool calls deduplicated, "
+        f"{len(result.skipped)} step(s) skipped)[/dim]"
+    )
+    for attempt in trace.speculation:
+        outcome = "kept" if attempt["hit"] else "discarded"
+        print(f"[dim]Speculative {attempt['target']}: {outcome} ({attempt['reason']}), saved {attempt['saved_s']:.1f}s[/dim]")
+
+
+def _resume(key: str, speculative: bool, profile: str = CREW_PROFILE) -> None:
+    checkpoints = CheckpointStore()
+    if key == "latest":
+        pending = checkpoints.pending()
+        state = pending[0] if pending else None
+    else:
+        state = checkpoints.load(key)
+    if state is None:
+        print("[yellow]No interrupted run to resume.[/yellow]")
+        return
+    print(
+        f"[cyan]Resuming case {state['case_key'][:12]} after {len(state['completed'])}/{len(state['plan'])} "
+        f"completed step(s) (last error: {state.get('error', 'none')})[/cyan]"
+    )
+    _run(state["inputs"], state["case_key"], state.get("include_imaging", False), speculative, state.get("profile", profile))
+
+
+def _analytics(args) -> None:
+    store = get_analytics_store()
+    since, until = date_range(args.days, args.since, args.until)
+    span = f"{since or 'start'} to {until or 'today'}"
+    if args.query == "summary":
+        print(f"[bold cyan]Runs from {span}[/bold cyan]")
+        for name, value in summary(store, since, until).items():
+            print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+    elif args.query == "latency":
+        print(f"[bold cyan]Run latency by {args.by} from {span}[/bold cyan]")
+        for group, stats in latency_percentiles(store, args.by, since=since, until=until).items():
+            print(f"  {group}: {stats['runs']} runs, p50 {stats['p50']:.1f}s, p95 {stats['p95']:.1f}s")
+    elif args.query == "top":
+        print(f"[bold cyan]Most frequent {args.column} from {span}[/bold cyan]")
+        for value, count in top_values(store, args.column, args.limit, since, until):
+            print(f"  {count:>6}  {value}")
+    elif args.query == "imaging":
+        rate = imaging_mention_rate(store, since, until)
+        print(
+            f"[bold cyan]Imaging from {span}[/bold cyan]\n"
+            f"  {rate['mentioned']}/{rate['imaging_runs']} imaging runs mention imaging in the treatment or "
+            f"referral text ({rate['rate']:.0%}); a mention rate, not a plan-change rate"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m health_crew.app", description="Healthcare diagnosis crew")
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        metavar="CASE_KEY",
+        help="Resume an interrupted run (the most recent one if no key is given)",
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        default=SPECULATIVE_EXECUTION,
+        help="Start treatment and drug-safety steps on provisional inputs before their upstream finishes",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILES,
+        default=CREW_PROFILE,
+        help='Crew profile; "fast" answers referral, follow-up and patient communication in one LLM call',
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    analytics = subparsers.add_parser("analytics", help="Aggregate figures over recorded runs")
+    analytics.add_argument("query", choices=("summary", "latency", "top", "imaging"))
+    analytics.add_argument("--days", type=int, help="Only the last N days (including today)")
+    analytics.add_argument("--since", metavar="YYYY-MM-DD", help="First day to include")
+    analytics.add_argument("--until", metavar="YYYY-MM-DD", help="Last day to include")
+    analytics.add_argument(
+        "--by", default="model", choices=STRING_COLUMNS, help="String column to group latency by (default: model)"
+    )
+    analytics.add_argument(
+        "--column",
+        default="top_differential",
+        choices=STRING_COLUMNS,
+        help="String column to rank for `top` (default: top_differential)",
+    )
+    analytics.add_argument("--limit", type=int, default=10, help="Number of values for `top`")
+    args = parser.parse_args(argv)
+    if args.command == "analytics":
+        _analytics(args)
+        return
+    if args.resume:
+        _resume(args.resume, args.speculative, args.profile)
+        return
+
+    inputs = _gather_inputs()
+    key = case_key(inputs)
+    store = get_case_store()
+
+    previous = store.find_by_input_hash(key)
+    if previous is not None and Confirm.ask(
+        f"An identical case was run on {previous.created_at} (case {previous.case_id[:8]}). Reuse its report?",
+        default=True,
+    ):
+        print("\n[bold green]Stored Result[/bold green]")
+        print(previous.report)
+        return
+
+    checkpoint = CheckpointStore().load(key)
+    if checkpoint is not None and checkpoint["completed"]:
+        print(
+            f"[cyan]Resuming an interrupted run of this case after "
+            f"{len(checkpoint['completed'])}/{len(checkpoint['plan'])} completed step(s)[/cyan]"
+        )
+        _run(
+            checkpoint["inputs"],
+            key,
+            checkpoint.get("include_imaging", False),
+            args.speculative,
+            checkpoint.get("profile", args.profile),
+        )
+        return
+
+    similar_index = get_similar_case_index()
+    match = similar_index.query(inputs["symptoms"], inputs["demographics"])
+    if match is not None:
+        similarity, similar = match
+        print(
+            f"[cyan]Similar earlier case {similar['case_id'][:8]} ({similarity:.0%} similar, "
+            f"{similar['created_at']}): {similar['symptoms']} / {similar['demographics']}[/cyan]"
+        )
+        if Confirm.ask("Seed the symptom analysis from it?", default=True):
+            inputs["similar_case_analysis"] = similar["symptom_analysis"]
+
+    _run(inputs, key, speculative=args.speculative, profile=args.profile)
 
 
 if __name__ == "__main__":
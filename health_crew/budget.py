@@ -0,0 +1,63 @@
+"""
+Per-run limits on LLM calls, tokens and wall-clock time
+"""
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+from .config import RUN_MAX_LLM_CALLS, RUN_MAX_SECONDS, RUN_MAX_TOKENS, RUN_SOFT_LIMIT_RATIO
+
+OK, SOFT, HARD = "ok", "soft", "hard"
+
+BREVITY_INSTRUCTION = (
+    "The run is close to its time and cost budget. Do not delegate to other agents. "
+    "Answer directly and concisely in under 150 words, keeping only safety-critical points."
+)
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised instead of an LLM call once a run's hard limit is reached"""
+
+
+@dataclass(frozen=True)
+class RunBudget:
+    """Hard limits for one run; the soft limit is ``soft_ratio`` of each.
+
+    A limit of 0 disables that dimension. Usage is kept on the RunTrace, so
+    one budget covers every agent, delegation and retry within the run.
+    """
+
+    max_llm_calls: int = RUN_MAX_LLM_CALLS
+    max_tokens: int = RUN_MAX_TOKENS
+    max_seconds: float = RUN_MAX_SECONDS
+    soft_ratio: float = RUN_SOFT_LIMIT_RATIO
+
+    def status(self, llm_calls: int, tokens: int, elapsed_s: float) -> Tuple[str, str]:
+        """OK, SOFT or HARD with the dimension that is furthest along"""
+        usage = [
+            (used / limit, f"{label} {used:g}/{limit:g}")
+            for used, limit, label in (
+                (llm_calls, self.max_llm_calls, "LLM calls"),
+                (tokens, self.max_tokens, "tokens"),
+                (round(elapsed_s, 1), self.max_seconds, "seconds"),
+            )
+            if limit
+        ]
+        if not usage:
+            return OK, ""
+        fraction, reason = max(usage)
+        if fraction >= 1:
+            return HARD, reason
+        if fraction >= self.soft_ratio:
+            return SOFT, reason
+        return OK, reason
+
+
+def with_brevity(messages: Any) -> Any:
+    """Messages with the soft-limit instruction appended as a system message"""
+    if isinstance(messages, str):
+        return f"{messages}\n\n{BREVITY_INSTRUCTION}"
+    return [*messages, {"role": "system", "content": BREVITY_INSTRUCTION}]
+
+
+def default_budget() -> Optional[RunBudget]:
+    budget = RunBudget()
+    return budget if (budget.max_llm_calls or budget.max_tokens or budget.max_seconds) else None
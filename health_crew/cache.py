@@ -0,0 +1,61 @@
+"""
+Bounded in-memory cache of completed diagnosis runs
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Inputs that identify a case; placeholders and file paths are excluded. The patient is part
+# of the key so one patient's stored report is never reused for another with the same inputs.
+CASE_FIELDS = ("patient_id", "symptoms", "demographics", "history", "medications", "allergies")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_inputs(inputs: Dict[str, Any]) -> Dict[str, str]:
+    """Case-identifying inputs with case and whitespace differences removed"""
+    return {
+        name: _WHITESPACE_RE.sub(" ", str(inputs.get(name) or "")).strip().casefold()
+        for name in CASE_FIELDS
+    }
+
+
+def case_key(inputs: Dict[str, Any], image_hash: Optional[str] = None) -> str:
+    """Hash of the normalized inputs and the attached image, if any"""
+    payload = json.dumps(
+        {"inputs": normalize_inputs(inputs), "image": image_hash or ""}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache of completed runs keyed by case_key"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,231 @@
+"""
+Local coding of free-text symptoms and history against a terminology file
+"""
+import csv
+import re
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from .config import TERMINOLOGY_PATH
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+CONCEPT, PRE_NEGATION, POST_NEGATION, PSEUDO_NEGATION, TERMINATOR = range(5)
+
+# NegEx-style cues matched by the same automaton as the terminology
+_NEGATION_CUES = {
+    PRE_NEGATION: (
+        "no", "not", "denies", "denied", "denying", "without", "negative for", "free of", "absence of",
+        "no signs of", "no evidence of", "no history of", "never had", "neither", "nor", "resolution of",
+    ),
+    POST_NEGATION: ("absent", "ruled out", "was ruled out", "has resolved", "resolved", "is negative", "unlikely"),
+    # Longer phrases that contain a cue but do not negate what follows, and hedges; both close an open cue
+    PSEUDO_NEGATION: (
+        "no change", "no increase", "not only", "not necessarily", "not certain", "not ruled out",
+        "cannot rule out", "can't rule out", "no improvement", "without improvement", "gram negative",
+        "not sure", "unsure", "possible", "possibly", "probable", "probably", "questionable", "?",
+    ),
+    # A comma alone lists negated items ("no fever, chills"); one before an affirmative verb starts a new clause
+    TERMINATOR: (
+        ".", ";", ":", "!", "\n", "but", "however", "although", "though", "except", "aside from",
+        "apart from", "presents with", "presenting with", "complains of", "c/o", "reports", "now has", "which",
+        "now", ", now", ", has", ", have", ", reports", ", with", ", complains of", ", developed",
+    ),
+}
+# Words after a pre-negation cue (or before a post-negation cue) that it can reach
+NEGATION_WINDOW = 6
+
+_SPACE_RE = re.compile(r"[^\S\n]+")
+_SEPARATOR_RE = re.compile(r"[ \n]")
+
+
+@dataclass(frozen=True)
+class CodedConcept:
+    """One terminology match in the normalized text"""
+
+    code: str
+    concept: str
+    term: str
+    start: int
+    end: int
+    negated: bool
+
+
+@dataclass(frozen=True)
+class _Pattern:
+    term: str
+    kind: int
+    concepts: Tuple[Tuple[str, str], ...]
+    left_boundary: bool
+    right_boundary: bool
+
+
+def normalize_text(text: str) -> str:
+    """Lower-cased text with runs of spaces and tabs collapsed; newlines are kept as clause breaks"""
+    return _SPACE_RE.sub(" ", (text or "").lower())
+
+
+class SymptomCoder:
+    """Aho-Corasick automaton over terminology terms and negation cues.
+
+    The trie's failure links are folded into a transition table, so a scan
+    is one dict lookup per character regardless of how many terms there
+    are. Matches are reduced to leftmost-longest and word-bounded, then a
+    single sweep over them applies NegEx-style negation: a cue negates the
+    concepts within NEGATION_WINDOW words until a terminator, a
+    pseudo-negation or a hedge ("possible", "?") ends the clause.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, str, str]]):
+        concepts: Dict[str, List[Tuple[str, str]]] = {}
+        for code, concept, term in rows:
+            term, entry = normalize_text(term).strip(), (code.strip(), concept.strip())
+            if term and entry not in concepts.setdefault(term, []):
+                concepts[term].append(entry)
+        patterns: Dict[str, _Pattern] = {
+            term: self._pattern(term, CONCEPT, tuple(codes)) for term, codes in concepts.items()
+        }
+        for kind, cues in _NEGATION_CUES.items():
+            for cue in cues:
+                # A cue wins over a same-spelled term ("no" is never a concept)
+                patterns[cue] = self._pattern(cue, kind, ())
+        self.patterns: List[_Pattern] = list(patterns.values())
+        self._build(self.patterns)
+        logger.info("Symptom coder: %d terms, %d automaton states", len(concepts), len(self._delta))
+
+    @staticmethod
+    def _pattern(term: str, kind: int, concepts: Tuple[Tuple[str, str], ...]) -> _Pattern:
+        return _Pattern(term, kind, concepts, term[0].isalnum(), term[-1].isalnum())
+
+    def _build(self, patterns: Sequence[_Pattern]) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        terminal: List[List[int]] = [[]]
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern.term:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto[node][char] = child
+                    goto.append({})
+                    terminal.append([])
+                node = child
+            terminal[node].append(index)
+
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        out: List[Tuple[int, ...]] = [()] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            # Breadth-first order means the failure state is already complete
+            delta[node] = {**delta[fail[node]], **goto[node]}
+            out[node] = tuple(terminal[node]) + out[fail[node]]
+            for char, child in goto[node].items():
+                fail[child] = delta[fail[node]].get(char, 0) if node else 0
+                queue.append(child)
+        self._delta = delta
+        self._out = out
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "SymptomCoder":
+        with open(path or TERMINOLOGY_PATH, newline="", encoding="utf-8") as handle:
+            rows = [(row["code"], row["concept"], row["term"]) for row in csv.DictReader(handle, delimiter="\t")]
+        return cls(rows)
+
+    def _matches(self, text: str) -> List[Tuple[int, int, _Pattern]]:
+        """Leftmost-longest, word-bounded (start, end, pattern) matches in text order"""
+        delta, out, patterns = self._delta, self._out, self.patterns
+        node = 0
+        hits = []
+        for end, char in enumerate(text, 1):
+            node = delta[node].get(char, 0)
+            if out[node]:
+                hits.append((end, node))
+
+        candidates = []
+        for end, node in hits:
+            for index in out[node]:
+                pattern = patterns[index]
+                start = end - len(pattern.term)
+                if pattern.left_boundary and start > 0 and text[start - 1].isalnum():
+                    continue
+                if pattern.right_boundary and end < len(text) and text[end].isalnum():
+                    continue
+                candidates.append((start, -end, index))
+        candidates.sort()
+        matches = []
+        covered = 0
+        for start, negative_end, index in candidates:
+            if start >= covered:
+                matches.append((start, -negative_end, patterns[index]))
+                covered = -negative_end
+        return matches
+
+    def code(self, text: str) -> List[CodedConcept]:
+        """Concepts found in ``text`` in order of appearance, with negation resolved"""
+        text = normalize_text(text)
+        separators = [match.start() for match in _SEPARATOR_RE.finditer(text)]
+        found: List[List[Any]] = []  # [code, concept, term, start, end, negated, word]
+        clause_start = 0  # index into found of the current clause's first concept
+        negated_until = -1  # last word index reached by an open pre-negation cue
+        for start, end, pattern in self._matches(text):
+            word = bisect_right(separators, start)
+            if pattern.kind == CONCEPT:
+                negated = word <= negated_until
+                found.extend([code, concept, pattern.term, start, end, negated, word] for code, concept in pattern.concepts)
+            elif pattern.kind == PRE_NEGATION:
+                negated_until = bisect_right(separators, end) + NEGATION_WINDOW
+            elif pattern.kind == POST_NEGATION:
+                for item in found[clause_start:]:
+                    if word - item[6] <= NEGATION_WINDOW:
+                        item[5] = True
+            elif pattern.kind in (PSEUDO_NEGATION, TERMINATOR):
+                negated_until = -1
+                clause_start = len(found)
+        return [CodedConcept(*item[:6]) for item in found]
+
+
+def format_coded(concepts: Sequence[CodedConcept]) -> str:
+    """One line per concept; a concept affirmed anywhere is reported present"""
+    merged: Dict[str, Tuple[str, bool, List[str]]] = {}
+    for item in concepts:
+        concept, negated, terms = merged.get(item.code, (item.concept, True, []))
+        if item.term not in terms:
+            terms.append(item.term)
+        merged[item.code] = (concept, negated and item.negated, terms)
+    return "\n".join(
+        f"- {'absent' if negated else 'present'}: {concept} [{code}] ({', '.join(map(repr, terms))})"
+        for code, (concept, negated, terms) in merged.items()
+    )
+
+
+def code_case_text(symptoms: str, history: str = "") -> str:
+    """Coded concepts of the symptoms and history inputs, by source.
+
+    The terminology holds symptom (SX-) and condition (DX-) concepts, so a
+    history of "hypertension" codes the condition, not the sign.
+    """
+    coder = get_symptom_coder()
+    sections = []
+    for label, text in (("Symptoms", symptoms), ("History", history)):
+        coded = format_coded(coder.code(text))
+        if coded:
+            sections.append(f"{label}:\n{coded}")
+    return "\n".join(sections) or "No known terms found"
+
+
+def coded_symptom_inputs(inputs: Dict[str, Any], outputs: Dict[str, str]) -> Dict[str, Any]:
+    """Coded symptoms for runs whose inputs predate coding (e.g. resumed checkpoints)"""
+    if "coded_symptoms" in inputs:
+        return {}
+    return {"coded_symptoms": code_case_text(inputs.get("symptoms", ""), inputs.get("history", ""))}
+
+
+@lru_cache(maxsize=1)
+def get_symptom_coder() -> SymptomCoder:
+    """Coder loaded once from TERMINOLOGY_PATH"""
+    return SymptomCoder.load()
@@ -0,0 +1,102 @@
+"""
+Run conditions that let the plan skip steps a case does not need
+"""
+import re
+from typing import Any, Callable, Dict, FrozenSet, Tuple
+
+# "/" is not a separator: it joins the parts of a combination product ("sulfamethoxazole/trimethoprim 800/160 mg")
+_LIST_SPLIT_RE = re.compile(r"[,;\n]|\band\b")
+_NO_MEDICATION = frozenset({"", "none", "nil", "no", "n/a", "na", "nka", "nkda", "-", "none reported", "no medications"})
+_SEVERITY_RE = re.compile(r"\b(?:severity|urgency|acuity|triage)\b\W{0,3}(?:level\W{0,3})?\**\s*([a-z-]+)", re.I)
+_LOW_SEVERITY = frozenset({"low", "mild", "minimal", "minor", "routine", "non-urgent", "nonurgent"})
+_SELF_LIMITING_RE = re.compile(r"self[- ]limit|benign|reassurance|home care|supportive care", re.I)
+_RED_FLAG_RE = re.compile(
+    r"red[- ]flag|emergenc|urgent referral|immediate|911|life[- ]threatening|sepsis|stroke|"
+    r"myocardial|meningitis|pulmonary embol|hospitali[sz]",
+    re.I,
+)
+# A red-flag term preceded in its clause by a negation ("no red flags", "without signs of sepsis")
+_NEGATED_RE = re.compile(r"\b(?:no|not|none|without|denies|negative for|ruled out|absent)\b", re.I)
+# Clause breaks that end a negation's reach ("no fever, but concerning for meningitis")
+_CLAUSE_RE = re.compile(r"[.;:!?]|\b(?:but|however|although|though|yet|except|whereas)\b", re.I)
+# Dose or sig text in a treatment plan, so an unrecognized drug still counts as proposed
+_DOSING_RE = re.compile(
+    r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|units?|iu)\b|\b(?:bid|tid|qid|qd|prn|q\d+h|po|iv|im|sc|subcut)\b", re.I
+)
+
+RunCondition = Callable[[Dict[str, Any], Dict[str, str]], Tuple[bool, str]]
+
+
+def normalize_medications(text: str) -> FrozenSet[str]:
+    """Distinct medication entries with blanks and "none"-style placeholders removed"""
+    items = (item.strip().lower().strip(".") for item in _LIST_SPLIT_RE.split(text or ""))
+    return frozenset(item for item in items if item not in _NO_MEDICATION)
+
+
+def has_red_flags(text: str) -> bool:
+    """Whether any red-flag term is affirmed; a negation only reaches the end of its clause"""
+    for line in (text or "").splitlines():
+        for clause in _CLAUSE_RE.split(line):
+            for match in _RED_FLAG_RE.finditer(clause):
+                if not _NEGATED_RE.search(clause[: match.start()]):
+                    return True
+    return False
+
+
+def is_low_severity(text: str) -> bool:
+    """Self-limiting or explicitly low-severity presentation without red flags"""
+    if has_red_flags(text):
+        return False
+    severities = {match.lower() for match in _SEVERITY_RE.findall(text or "")}
+    if severities:
+        return severities <= _LOW_SEVERITY
+    return bool(_SELF_LIMITING_RE.search(text or ""))
+
+
+def _drug_safety_needed(inputs: Dict[str, Any], outputs: Dict[str, str]) -> Tuple[bool, str]:
+    """Skipped only when nothing suggests a drug is involved; any doubt runs the step"""
+    from .allergy import parse_allergies, proposed_drugs
+
+    if normalize_medications(inputs.get("medications", "")):
+        return True, "current medications listed"
+    if parse_allergies(inputs.get("allergies", "")):
+        return True, "allergies listed"
+    treatment = outputs.get("treatment_recommendation", "")
+    proposed = proposed_drugs(treatment)
+    if proposed:
+        return True, f"treatment proposes {', '.join(proposed)}"
+    if not treatment.strip() or _DOSING_RE.search(treatment):
+        return True, "treatment may propose a drug not in the local vocabulary"
+    return False, "no current medications, no allergies and no drugs proposed"
+
+
+def _assessment_text(outputs: Dict[str, str]) -> str:
+    return "\n".join(outputs.get(name, "") for name in ("symptom_analysis", "imaging_analysis"))
+
+
+def _referral_needed(inputs: Dict[str, Any], outputs: Dict[str, str]) -> Tuple[bool, str]:
+    if is_low_severity(_assessment_text(outputs)):
+        return False, "low severity with no red flags"
+    return True, "severity not low or red flags present"
+
+
+def _follow_up_needed(inputs: Dict[str, Any], outputs: Dict[str, str]) -> Tuple[bool, str]:
+    if is_low_severity(_assessment_text(outputs)) and not has_red_flags(outputs.get("treatment_recommendation", "")):
+        return False, "self-limiting presentation; routine return advice only"
+    return True, "monitoring may be required"
+
+
+# Steps not listed here always run
+RUN_CONDITIONS: Dict[str, RunCondition] = {
+    "referral_assessment": _referral_needed,
+    "drug_safety_check": _drug_safety_needed,
+    "follow_up_scheduling": _follow_up_needed,
+}
+
+
+def should_run(name: str, inputs: Dict[str, Any], outputs: Dict[str, str]) -> Tuple[bool, str]:
+    """Whether step ``name`` is needed given the inputs and earlier outputs, with the reason"""
+    condition = RUN_CONDITIONS.get(name)
+    if condition is None:
+        return True, "always runs"
+    return condition(inputs, outputs)
@@ -11,6 +11,11 @@ load_dotenv(override=False)
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 APP_ENV = os.getenv("APP_ENV", "development")
+# "rich" console for development, "json" lines through a background writer for production
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json" if APP_ENV == "production" else "rich").lower()
+LOG_FILE = os.getenv("LOG_FILE", "")
+# Fraction of records kept per level, e.g. "DEBUG=0.05,INFO=0.5"; WARNING and above are never sampled
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
 
 # External APIs (optional)
 UMLS_API_KEY = os.getenv("UMLS_API_KEY")
@@ -26,3 +31,93 @@ GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro-latest")
 # OpenAI (primary LLM provider)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Imaging near-duplicate detection (perceptual hash Hamming distance, 0-7; -1 disables)
+IMAGE_NEAR_DUP_DISTANCE = int(os.getenv("IMAGE_NEAR_DUP_DISTANCE", "5"))
+# Analysed studies kept for near-duplicate reuse (least recently used evicted first)
+IMAGE_ANALYSIS_CACHE_SIZE = int(os.getenv("IMAGE_ANALYSIS_CACHE_SIZE", "512"))
+
+# Local image-quality gate run before any vision request
+IMAGE_QUALITY_GATE = os.getenv("IMAGE_QUALITY_GATE", "true").lower() == "true"
+IMAGE_MIN_SIDE_PX = int(os.getenv("IMAGE_MIN_SIDE_PX", "256"))
+IMAGE_MIN_BLUR_VARIANCE = float(os.getenv("IMAGE_MIN_BLUR_VARIANCE", "20.0"))
+IMAGE_MAX_CLIPPED_FRACTION = float(os.getenv("IMAGE_MAX_CLIPPED_FRACTION", "0.35"))
+IMAGE_MIN_CONTRAST_STD = float(os.getenv("IMAGE_MIN_CONTRAST_STD", "4.0"))
+
+# Completed runs kept in memory per session for identical resubmissions
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "32"))
+
+# Directory for content-addressed image spills when bytes must leave the process
+IMAGE_SPILL_DIR = os.getenv("IMAGE_SPILL_DIR", "temp_uploads")
+
+# Maximum concurrent per-view vision requests across all studies
+IMAGING_MAX_CONCURRENCY = int(os.getenv("IMAGING_MAX_CONCURRENCY", "4"))
+
+# Provider quotas shared by all crews in this process (0 disables a bucket)
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_LATENCY_TARGET_S = float(os.getenv("LLM_LATENCY_TARGET_S", "30"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+
+# Headless HTTP service (python -m health_crew.server)
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 2)))
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "256"))
+SERVER_JOB_RETENTION_S = float(os.getenv("SERVER_JOB_RETENTION_S", "3600"))
+SERVER_DRAIN_TIMEOUT_S = float(os.getenv("SERVER_DRAIN_TIMEOUT_S", "600"))
+FAKE_LLM_LATENCY_S = float(os.getenv("FAKE_LLM_LATENCY_S", "0.05"))
+
+# Embedded SQLite store of completed runs
+CASE_STORE_PATH = os.getenv("CASE_STORE_PATH", "var/cases.sqlite3")
+CASE_STORE_BATCH_SIZE = int(os.getenv("CASE_STORE_BATCH_SIZE", "16"))
+
+# Semantic near-duplicate lookup of earlier presentations (cosine similarity, 0-1)
+SIMILAR_CASE_THRESHOLD = float(os.getenv("SIMILAR_CASE_THRESHOLD", "0.8"))
+SIMILAR_CASE_WARM_LIMIT = int(os.getenv("SIMILAR_CASE_WARM_LIMIT", "2000"))
+
+# Per-task checkpoints of in-progress runs, used to resume after a failure
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "var/checkpoints")
+
+# Columnar dataset of finished runs (one directory per day) for ops analytics
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() == "true"
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "var/analytics")
+
+# Start selected downstream tasks on provisional inputs while their upstream runs
+SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "false").lower() == "true"
+
+# Skip referral, drug-safety and follow-up steps when a case does not need them
+CONDITIONAL_TASKS = os.getenv("CONDITIONAL_TASKS", "true").lower() == "true"
+
+# Local formulary of dose ranges used by validate_medical_recommendation
+FORMULARY_PATH = os.getenv("FORMULARY_PATH", str(Path(__file__).resolve().parent / "data" / "formulary.csv"))
+
+# Drug-class hierarchy and cross-reactivity edges for allergy screening
+DRUG_CLASSES_PATH = os.getenv("DRUG_CLASSES_PATH", str(Path(__file__).resolve().parent / "data" / "drug_classes.csv"))
+CROSS_REACTIVITY_PATH = os.getenv(
+    "CROSS_REACTIVITY_PATH", str(Path(__file__).resolve().parent / "data" / "cross_reactivity.csv")
+)
+
+# Pairwise drug interactions (drug or drug-class names) for interaction screening
+INTERACTIONS_PATH = os.getenv("INTERACTIONS_PATH", str(Path(__file__).resolve().parent / "data" / "interactions.csv"))
+
+# Terminology (code, concept, term TSV) for coding symptom and history text: SX- symptoms, DX- conditions
+TERMINOLOGY_PATH = os.getenv("TERMINOLOGY_PATH", str(Path(__file__).resolve().parent / "data" / "terminology.tsv"))
+
+# Per-run budget across all agents (0 disables a limit); past the soft ratio
+# delegation is turned off and answers are shortened, at the hard limit the
+# remaining steps get a marked partial result
+RUN_MAX_LLM_CALLS = int(os.getenv("RUN_MAX_LLM_CALLS", "60"))
+RUN_MAX_TOKENS = int(os.getenv("RUN_MAX_TOKENS", "250000"))
+RUN_MAX_SECONDS = float(os.getenv("RUN_MAX_SECONDS", "600"))
+RUN_SOFT_LIMIT_RATIO = float(os.getenv("RUN_SOFT_LIMIT_RATIO", "0.75"))
+
+# Crew profile: "full" runs every step separately, "fast" fuses the light
+# referral, follow-up and patient-communication steps into one LLM call
+CREW_PROFILE = os.getenv("CREW_PROFILE", "full").lower()
+
+# Streamlit image viewer: thumbnail long edge, zoom tile size and per-session tile cache
+VIEWER_THUMBNAIL_SIZE = int(os.getenv("VIEWER_THUMBNAIL_SIZE", "768"))
+VIEWER_TILE_SIZE = int(os.getenv("VIEWER_TILE_SIZE", "512"))
+VIEWER_CACHE_MB = int(os.getenv("VIEWER_CACHE_MB", "48"))
@@ -0,0 +1,381 @@
+"""
+Local formulary of dose ranges and vectorized dose validation
+"""
+import csv
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from .config import FORMULARY_PATH
+
+# Brand and regional names folded onto the formulary ingredient
+_ALIASES = {
+    "paracetamol": "acetaminophen",
+    "tylenol": "acetaminophen",
+    "apap": "acetaminophen",
+    "advil": "ibuprofen",
+    "motrin": "ibuprofen",
+    "aleve": "naproxen",
+    "asa": "aspirin",
+    "amoxil": "amoxicillin",
+    "zithromax": "azithromycin",
+    "cipro": "ciprofloxacin",
+    "macrobid": "nitrofurantoin",
+    "glucophage": "metformin",
+    "zestril": "lisinopril",
+    "lipitor": "atorvastatin",
+    "norvasc": "amlodipine",
+    "prilosec": "omeprazole",
+    "zoloft": "sertraline",
+    "coumadin": "warfarin",
+    "eliquis": "apixaban",
+    "plavix": "clopidogrel",
+    "lasix": "furosemide",
+    "neurontin": "gabapentin",
+    "ultram": "tramadol",
+    "tamiflu": "oseltamivir",
+    "zyrtec": "cetirizine",
+    "zofran": "ondansetron",
+}
+_SALT_RE = re.compile(
+    r"\b(hydrochloride|hcl|sodium|potassium|calcium|besylate|maleate|sulfate|succinate|tartrate|"
+    r"monohydrate|trihydrate|er|xr|sr|ir|dr|ds)\b"
+)
+# Doses per day for common sig abbreviations
+FREQUENCIES = {
+    "once": 1, "daily": 1, "qd": 1, "od": 1, "qam": 1, "qhs": 1, "nightly": 1,
+    "bid": 2, "twice daily": 2, "q12h": 2,
+    "tid": 3, "three times daily": 3, "q8h": 3,
+    "qid": 4, "four times daily": 4, "q6h": 4,
+    "q4h": 6,
+}
+_FREQUENCY_TERM_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(term) for term in sorted(FREQUENCIES, key=len, reverse=True)) + r")\b"
+)
+# "q6h", "q4-6h", "every 4 hours", "every 4 to 6 hrs"
+_INTERVAL_RE = re.compile(r"\b(?:q|every\s+)(\d+)(?:\s*(?:-|to)\s*(\d+))?\s*(?:h|hrs?|hours?)\b")
+# "3 times a day", "2-3 times daily", "4x/day"
+_TIMES_RE = re.compile(r"\b(\d+)(?:\s*(?:-|to)\s*(\d+))?\s*(?:times|x)\s*(?:a |per |/)?\s*(?:day|daily)\b")
+# Sig text that can follow a drug name in a medication list ("ibuprofen 400 mg po tid prn")
+_SIG_RE = re.compile(
+    r"\b(?:"
+    + "|".join(re.escape(term) for term in sorted(FREQUENCIES, key=len, reverse=True))
+    + r"|q\d+h|prn|as needed|po|by mouth|iv|im|sc|subcut|sl|pr|inh|top|at bedtime|hs|"
+    r"tabs?|tablets?|caps?|capsules?|puffs?|drops?|units?|iu|x|times)\b"
+)
+
+# Violation bits, in the order messages are reported
+UNKNOWN_INGREDIENT = 1
+INVALID_DOSE = 2
+CONTRAINDICATED = 4
+ABOVE_MAX_SINGLE = 8
+BELOW_MIN_SINGLE = 16
+ABOVE_MAX_DAILY = 32
+UNVERIFIABLE = 64
+_CODES = {
+    UNKNOWN_INGREDIENT: "unknown_ingredient",
+    INVALID_DOSE: "invalid_dose",
+    CONTRAINDICATED: "contraindicated",
+    ABOVE_MAX_SINGLE: "above_max_single",
+    BELOW_MIN_SINGLE: "below_min_single",
+    ABOVE_MAX_DAILY: "above_max_daily",
+    UNVERIFIABLE: "unverifiable",
+}
+
+
+def normalize_drug_name(name: str) -> str:
+    """Lower-cased generic ingredient name without salts, release forms, strengths or sig"""
+    text = re.sub(r"[\d.]+\s*(mg|mcg|g|ml)\b", " ", (name or "").lower())
+    text = _SALT_RE.sub(" ", re.sub(r"[^a-z ]", " ", _SIG_RE.sub(" ", text)))
+    text = " ".join(text.split())
+    return _ALIASES.get(text, text)
+
+
+def parse_frequency(value: Any) -> float:
+    """Doses per day from a number or a sig such as "BID", "q4-6h prn" or "every 6 hours".
+
+    A range counts at its most frequent ("q4-6h" is 6 a day), as does a sig
+    naming several frequencies. A missing or unrecognized frequency is NaN,
+    never assumed to be once daily.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if value > 0 else float("nan")
+    text = str(value or "").strip().lower()
+    rates = [float(FREQUENCIES[term]) for term in _FREQUENCY_TERM_RE.findall(text)]
+    for low, high in _INTERVAL_RE.findall(text):
+        hours = min(int(low), int(high or low))
+        if hours > 0:
+            rates.append(24.0 / hours)
+    for low, high in _TIMES_RE.findall(text):
+        rates.append(float(max(int(low), int(high or low))))
+    rates = [rate for rate in rates if rate > 0]
+    return max(rates) if rates else float("nan")
+
+
+def _float(value: str, default: float) -> float:
+    return float(value) if value not in (None, "") else default
+
+
+class Formulary:
+    """Dose bands per ingredient held as parallel NumPy arrays.
+
+    Each band applies to an age, weight and CrCl range. Every band that
+    applies to an item constrains it, so the effective limits are the
+    tightest over the matching bands. A band whose age, weight or CrCl
+    range needs a value the caller did not give may or may not apply: a dose
+    above every such band is flagged outright, and one that only some of them
+    reject is flagged unverifiable. Bands are sorted by ingredient and
+    addressed through per-ingredient offsets, so validating N items costs
+    O(N x bands-per-ingredient) array work with no per-item Python loop.
+    """
+
+    def __init__(self, rows: Sequence[Dict[str, str]]):
+        rows = sorted(rows, key=lambda row: normalize_drug_name(row["ingredient"]))
+        self.ingredients: List[str] = []
+        self._index: Dict[str, int] = {}
+        ids = []
+        for row in rows:
+            name = normalize_drug_name(row["ingredient"])
+            if name not in self._index:
+                self._index[name] = len(self.ingredients)
+                self.ingredients.append(name)
+            ids.append(self._index[name])
+        inf = np.inf
+
+        def column(name: str, default: float) -> np.ndarray:
+            return np.array([_float(row.get(name), default) for row in rows], dtype=np.float64)
+
+        self.age_lo, self.age_hi = column("age_min", 0.0), column("age_max", inf)
+        self.weight_lo, self.weight_hi = column("weight_min", 0.0), column("weight_max", inf)
+        self.crcl_lo, self.crcl_hi = column("crcl_min", 0.0), column("crcl_max", inf)
+        self.single_min = column("single_min_mg", 0.0)
+        self.single_max = column("single_max_mg", inf)
+        self.daily_max = column("daily_max_mg", inf)
+        self.single_per_kg = column("single_max_mg_per_kg", inf)
+        self.daily_per_kg = column("daily_max_mg_per_kg", inf)
+        self.notes = [row.get("note") or "" for row in rows]
+        # Bands open in a dimension apply whatever the patient's value is
+        self._age_open = (self.age_lo == 0) & np.isinf(self.age_hi)
+        self._weight_open = (self.weight_lo == 0) & np.isinf(self.weight_hi)
+        self._crcl_open = (self.crcl_lo == 0) & np.isinf(self.crcl_hi)
+        self._per_kg = np.isfinite(self.single_per_kg) | np.isfinite(self.daily_per_kg)
+
+        ids_array = np.array(ids, dtype=np.int64)
+        counts = np.bincount(ids_array, minlength=len(self.ingredients))
+        self._start = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        self._count = counts.astype(np.int64)
+        self._width = int(counts.max()) if len(counts) else 0
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "Formulary":
+        with open(path or FORMULARY_PATH, newline="", encoding="utf-8") as handle:
+            return cls(list(csv.DictReader(handle)))
+
+    def ingredient_id(self, name: str) -> int:
+        """Index of an ingredient, or -1 if it is not in the formulary"""
+        return self._index.get(normalize_drug_name(name), -1)
+
+    def check(
+        self,
+        ingredient_ids: np.ndarray,
+        single_mg: np.ndarray,
+        daily_mg: np.ndarray,
+        age: np.ndarray,
+        weight_kg: np.ndarray,
+        crcl: np.ndarray,
+    ) -> Dict[str, np.ndarray]:
+        """Vectorized core: violation bitmask and effective limits per item.
+
+        All arguments are equal-length arrays; NaN marks an unknown patient
+        value, or in ``daily_mg`` an unknown frequency, and is never assumed.
+        Returns ``flags`` plus the effective ``single_min``, ``single_max``
+        and ``daily_max`` used for each item, the ``limiting_band`` that set
+        the single-dose maximum and which unknown values (``needs_age``,
+        ``needs_weight``, ``needs_crcl``, ``needs_frequency``) an
+        unverifiable item depends on.
+        """
+        n = len(ingredient_ids)
+        known = ingredient_ids >= 0
+        safe_ids = np.where(known, ingredient_ids, 0)
+        # Candidate band index matrix: (items, widest ingredient band count)
+        offsets = np.arange(max(self._width, 1))
+        bands = self._start[safe_ids][:, None] + offsets[None, :]
+        valid = known[:, None] & (offsets[None, :] < self._count[safe_ids][:, None])
+        bands = np.where(valid, bands, 0)
+
+        age, weight, renal = age[:, None], weight_kg[:, None], crcl[:, None]
+        age_unknown, weight_unknown, renal_unknown = np.isnan(age), np.isnan(weight), np.isnan(renal)
+        age_in = (self.age_lo[bands] <= age) & (age < self.age_hi[bands])
+        weight_in = (self.weight_lo[bands] <= weight) & (weight < self.weight_hi[bands])
+        renal_in = (self.crcl_lo[bands] <= renal) & (renal < self.crcl_hi[bands])
+        # Needs a value the caller did not give: the band may or may not apply, or its per-kg limit is unknown
+        needs_age = age_unknown & ~self._age_open[bands]
+        needs_weight = weight_unknown & (~self._weight_open[bands] | self._per_kg[bands])
+        needs_crcl = renal_unknown & ~self._crcl_open[bands]
+        possible = valid & (age_in | age_unknown) & (weight_in | weight_unknown) & (renal_in | renal_unknown)
+        uncertain = possible & (needs_age | needs_weight | needs_crcl)
+        certain = possible & ~uncertain
+
+        weight_or_inf = np.where(weight_unknown, np.inf, weight)
+        band_single_max = np.minimum(self.single_max[bands], self.single_per_kg[bands] * weight_or_inf)
+        band_daily_max = np.minimum(self.daily_max[bands], self.daily_per_kg[bands] * weight_or_inf)
+        # Hard limits come from the bands that surely apply; with none, the most permissive
+        # band that could apply, so a dose above every possible band is still flagged
+        has_certain = certain.any(axis=1)
+        rows = np.arange(n)
+        fallback = uncertain & ~has_certain[:, None]
+        certain_single = np.where(certain, band_single_max, np.inf)
+        fallback_single = np.where(fallback, band_single_max, -np.inf)
+        limiting = np.where(has_certain, certain_single.argmin(axis=1), fallback_single.argmax(axis=1))
+        single_max = np.where(has_certain, certain_single[rows, limiting], fallback_single[rows, limiting])
+        daily_max = np.where(
+            has_certain,
+            np.where(certain, band_daily_max, np.inf).min(axis=1),
+            np.where(fallback, band_daily_max, -np.inf).max(axis=1),
+        )
+        single_min = np.where(
+            has_certain,
+            np.where(certain, self.single_min[bands], 0.0).max(axis=1),
+            np.where(fallback, self.single_min[bands], np.inf).min(axis=1),
+        )
+        unbanded = ~has_certain & ~fallback.any(axis=1)
+        single_max = np.where(unbanded, np.inf, single_max)
+        daily_max = np.where(unbanded, np.inf, daily_max)
+        single_min = np.where(unbanded, 0.0, single_min)
+
+        flags = np.zeros(n, dtype=np.int64)
+        flags |= np.where(~known, UNKNOWN_INGREDIENT, 0)
+        frequency_unknown = np.isnan(daily_mg)
+        invalid = known & (~(single_mg > 0) | (~(daily_mg > 0) & ~frequency_unknown))
+        flags |= np.where(invalid, INVALID_DOSE, 0)
+        checkable = known & ~invalid
+        contraindicated = checkable & (single_max <= 0)
+        flags |= np.where(contraindicated, CONTRAINDICATED, 0)
+        dosed = checkable & ~contraindicated
+        flags |= np.where(dosed & (single_mg > single_max), ABOVE_MAX_SINGLE, 0)
+        flags |= np.where(dosed & (single_mg < single_min), BELOW_MIN_SINGLE, 0)
+        flags |= np.where(dosed & (daily_mg > daily_max), ABOVE_MAX_DAILY, 0)
+        # A band that may apply and would reject the dose (a per-kg band always could) makes it unverifiable
+        strict_single = np.where(weight_unknown & self._per_kg[bands], 0.0, band_single_max)
+        strict_daily = np.where(weight_unknown & self._per_kg[bands], 0.0, band_daily_max)
+        at_risk = uncertain & ((single_mg[:, None] > strict_single) | (daily_mg[:, None] > strict_daily))
+        # An unknown frequency leaves any finite daily maximum unchecked
+        needs_frequency = frequency_unknown & np.isfinite(daily_max)
+        unverifiable = dosed & (flags == 0) & (at_risk.any(axis=1) | needs_frequency)
+        flags |= np.where(unverifiable, UNVERIFIABLE, 0)
+        return {
+            "flags": flags,
+            "single_min": single_min,
+            "single_max": single_max,
+            "daily_max": daily_max,
+            "limiting_band": bands[rows, limiting],
+            "needs_age": (at_risk & needs_age).any(axis=1),
+            "needs_weight": (at_risk & needs_weight).any(axis=1),
+            "needs_crcl": (at_risk & needs_crcl).any(axis=1),
+            "needs_frequency": needs_frequency,
+        }
+
+    def validate(self, items: Iterable[Dict[str, Any]], patient: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Per-item violations for one patient's medication list"""
+        return self.validate_batch([{**(patient or {}), "medications": list(items)}])[0]
+
+    def validate_batch(self, patients: Sequence[Dict[str, Any]]) -> List[List[List[Dict[str, Any]]]]:
+        """Per-patient, per-item violations for many patients in one vectorized pass.
+
+        Each patient is ``{"age", "weight_kg", "crcl_ml_min", "medications": [...]}``
+        and each medication ``{"name", "dose_mg", "frequency" | "daily_dose_mg"}``.
+        """
+        owners, names, ids, single, daily, age, weight, crcl = [], [], [], [], [], [], [], []
+        for owner, patient in enumerate(patients):
+            for med in patient.get("medications") or []:
+                dose = _number(med.get("dose_mg"))
+                daily_dose = _number(med.get("daily_dose_mg"))
+                if np.isnan(daily_dose):
+                    daily_dose = dose * parse_frequency(med.get("frequency_per_day", med.get("frequency")))
+                owners.append(owner)
+                names.append(str(med.get("name", "")))
+                ids.append(self.ingredient_id(names[-1]))
+                single.append(dose)
+                daily.append(daily_dose)
+                age.append(_number(patient.get("age")))
+                weight.append(_number(patient.get("weight_kg")))
+                crcl.append(_number(patient.get("crcl_ml_min")))
+
+        results: List[List[List[Dict[str, Any]]]] = [
+            [[] for _ in patient.get("medications") or []] for patient in patients
+        ]
+        if not owners:
+            return results
+        checked = self.check(
+            np.array(ids, dtype=np.int64),
+            np.array(single, dtype=np.float64),
+            np.array(daily, dtype=np.float64),
+            np.array(age, dtype=np.float64),
+            np.array(weight, dtype=np.float64),
+            np.array(crcl, dtype=np.float64),
+        )
+        flags = checked["flags"]
+        positions = np.zeros(len(patients), dtype=np.int64)
+        item_positions = []
+        for owner in owners:
+            item_positions.append(positions[owner])
+            positions[owner] += 1
+        # Messages are built only for flagged items
+        for i in np.flatnonzero(flags):
+            results[owners[i]][item_positions[i]] = self._describe(
+                int(flags[i]), names[i], single[i], daily[i], checked, i
+            )
+        return results
+
+    def _describe(self, flags: int, name: str, single: float, daily: float, checked, i: int) -> List[Dict[str, Any]]:
+        violations = []
+        for bit, code in _CODES.items():
+            if not flags & bit:
+                continue
+            entry: Dict[str, Any] = {"code": code, "drug": name}
+            if bit == UNKNOWN_INGREDIENT:
+                entry["message"] = f"{name} is not in the local formulary"
+            elif bit == INVALID_DOSE:
+                entry["message"] = f"{name}: dose must be a positive number of mg"
+            elif bit == CONTRAINDICATED:
+                note = self.notes[int(checked["limiting_band"][i])] or "outside the approved population"
+                entry["message"] = f"{name} is not recommended for this patient ({note})"
+            elif bit == ABOVE_MAX_SINGLE:
+                entry.update(value=single, limit=float(checked["single_max"][i]))
+                entry["message"] = f"{name} {single:g} mg exceeds the {entry['limit']:g} mg single-dose maximum"
+            elif bit == BELOW_MIN_SINGLE:
+                entry.update(value=single, limit=float(checked["single_min"][i]))
+                entry["message"] = f"{name} {single:g} mg is below the {entry['limit']:g} mg usual minimum"
+            elif bit == UNVERIFIABLE:
+                needs = [
+                    label
+                    for label, key in (
+                        ("age", "needs_age"),
+                        ("weight", "needs_weight"),
+                        ("CrCl", "needs_crcl"),
+                        ("frequency", "needs_frequency"),
+                    )
+                    if checked[key][i]
+                ]
+                entry["requires"] = needs
+                per_day = "" if np.isnan(daily) else f" ({daily:g} mg/day)"
+                entry["message"] = f"{name} {single:g} mg{per_day} is unverifiable: {'/'.join(needs)} required"
+            elif bit == ABOVE_MAX_DAILY:
+                entry.update(value=daily, limit=float(checked["daily_max"][i]))
+                entry["message"] = f"{name} {daily:g} mg/day exceeds the {entry['limit']:g} mg/day maximum"
+            violations.append(entry)
+        return violations
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+@lru_cache(maxsize=1)
+def get_formulary() -> Formulary:
+    """Formulary loaded once from FORMULARY_PATH"""
+    return Formulary.load()
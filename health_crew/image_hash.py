@@ -0,0 +1,123 @@
+"""
+Perceptual hashing for near-duplicate medical image detection
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+_CHUNK_BITS = 8
+_CHUNKS = HASH_BITS // _CHUNK_BITS
+MAX_SEARCH_DISTANCE = _CHUNKS - 1
+
+
+def dhash(image: Image.Image) -> int:
+    """Compute a 64-bit difference hash of an image.
+
+    The image is reduced to a 9x8 grayscale thumbnail and each bit records
+    whether a pixel is brighter than its right neighbour. Re-exports,
+    recompression and rescaling of the same film land within a few bits.
+    """
+    small = image.convert("L").resize(
+        (HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS, reducing_gap=2.0
+    )
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return (a ^ b).bit_count()
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Per-element bit count of a uint64 array"""
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class PerceptualHashIndex:
+    """Hamming-distance index over 64-bit perceptual hashes.
+
+    Uses multi-index hashing: every hash is split into eight 8-bit substrings
+    with one bucket table per substring. Two hashes within distance r <= 7
+    agree exactly on at least one substring (pigeonhole), so a lookup only
+    verifies the entries sharing a bucket instead of scanning the whole index.
+
+    With ``max_entries`` the index is an LRU: adding past the limit evicts
+    the entry least recently added or matched, and its slot is reused.
+    """
+
+    def __init__(self, capacity: int = 1024, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hashes = np.empty(capacity, dtype=np.uint64)
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(_CHUNKS)]
+        self._payloads: List[Any] = []
+        self._order: "OrderedDict[int, None]" = OrderedDict()
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    @staticmethod
+    def _chunks(value: int) -> List[int]:
+        mask = (1 << _CHUNK_BITS) - 1
+        return [(value >> (i * _CHUNK_BITS)) & mask for i in range(_CHUNKS)]
+
+    def _evict(self, entry_id: int) -> None:
+        for table, chunk in zip(self._tables, self._chunks(int(self._hashes[entry_id]))):
+            bucket = table[chunk]
+            bucket.discard(entry_id)
+            if not bucket:
+                del table[chunk]
+        self._payloads[entry_id] = None
+        self._free.append(entry_id)
+
+    def add(self, value: int, payload: Any) -> int:
+        """Store a hash with its payload and return the entry id"""
+        with self._lock:
+            if self.max_entries is not None and len(self._order) >= self.max_entries:
+                evicted, _ = self._order.popitem(last=False)
+                self._evict(evicted)
+            if self._free:
+                entry_id = self._free.pop()
+                self._payloads[entry_id] = payload
+            else:
+                entry_id = len(self._payloads)
+                if entry_id == len(self._hashes):
+                    self._hashes = np.resize(self._hashes, len(self._hashes) * 2)
+                self._payloads.append(payload)
+            self._hashes[entry_id] = value
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                table.setdefault(chunk, set()).add(entry_id)
+            self._order[entry_id] = None
+            return entry_id
+
+    def query(
+        self, value: int, max_distance: int, accept: Optional[Callable[[Any], bool]] = None
+    ) -> Optional[Tuple[int, Any]]:
+        """Return (distance, payload) of the closest entry within max_distance whose payload ``accept`` allows"""
+        if not 0 <= max_distance <= MAX_SEARCH_DISTANCE:
+            raise ValueError(
+                f"max_distance must be between 0 and {MAX_SEARCH_DISTANCE}, got {max_distance}"
+            )
+        with self._lock:
+            candidates = set()
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                candidates.update(table.get(chunk, ()))
+            if accept is not None:
+                candidates = {entry_id for entry_id in candidates if accept(self._payloads[entry_id])}
+            if not candidates:
+                return None
+            ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            distances = _popcount(self._hashes[ids] ^ np.uint64(value))
+            best = int(np.argmin(distances))
+            if distances[best] > max_distance:
+                return None
+            entry_id = int(ids[best])
+            self._order.move_to_end(entry_id)
+            return int(distances[best]), self._payloads[entry_id]
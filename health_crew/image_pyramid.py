@@ -0,0 +1,173 @@
+"""
+Downsampled thumbnails and tiled zoom levels for viewing large images
+"""
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+from .config import VIEWER_CACHE_MB, VIEWER_THUMBNAIL_SIZE, VIEWER_TILE_SIZE
+from .image_store import ImageHandle
+
+_THUMBNAIL_CACHE_SIZE = 128
+
+
+def _rgb(image: Image.Image) -> Image.Image:
+    return image if image.mode in ("RGB", "L") else image.convert("RGB")
+
+
+def encode_jpeg(image: Image.Image, quality: int = 85) -> bytes:
+    buffer = io.BytesIO()
+    _rgb(image).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+_thumbnails: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+_thumbnails_lock = threading.Lock()
+
+
+def thumbnail_bytes(handle: ImageHandle, max_side: int = VIEWER_THUMBNAIL_SIZE) -> bytes:
+    """JPEG no larger than ``max_side`` on its long edge, cached by image digest.
+
+    JPEG sources are decoded in draft mode at a reduced DCT scale, so the
+    thumbnail never needs the full-resolution pixels.
+    """
+    key = (handle.digest, max_side)
+    with _thumbnails_lock:
+        cached = _thumbnails.get(key)
+        if cached is not None:
+            _thumbnails.move_to_end(key)
+            return cached
+    data = encode_jpeg(handle.decode(max_side))
+    with _thumbnails_lock:
+        _thumbnails[key] = data
+        while len(_thumbnails) > _THUMBNAIL_CACHE_SIZE:
+            _thumbnails.popitem(last=False)
+    return data
+
+
+class TileCache:
+    """LRU of decoded tiles bounded by their total pixel bytes"""
+
+    def __init__(self, max_bytes: int = VIEWER_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles: "OrderedDict[Tuple[str, int, int, int], Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def get(self, key: Tuple[str, int, int, int]) -> Optional[Image.Image]:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key: Tuple[str, int, int, int], tile: Image.Image) -> None:
+        size = _nbytes(tile)
+        with self._lock:
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self.nbytes -= _nbytes(previous)
+            self._tiles[key] = tile
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._tiles) > 1:
+                _, evicted = self._tiles.popitem(last=False)
+                self.nbytes -= _nbytes(evicted)
+
+    def discard(self, digest: str) -> None:
+        """Drop every tile of one image"""
+        with self._lock:
+            for key in [key for key in self._tiles if key[0] == digest]:
+                self.nbytes -= _nbytes(self._tiles.pop(key))
+
+    def stats(self) -> Dict[str, int]:
+        return {"tiles": len(self._tiles), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses}
+
+
+def _nbytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class ImagePyramid:
+    """Zoom levels of one image, served as fixed-size tiles.
+
+    Level 0 is full resolution and each level above halves both sides, up
+    to the first level that fits in one tile. Tiles a view needs are cut
+    from one decode of the source at that level's size, which is not kept,
+    and then held in a shared, byte-bounded TileCache; the only pixels that
+    outlive a render are the cached tiles.
+    """
+
+    def __init__(self, handle: ImageHandle, cache: Optional[TileCache] = None, tile_size: int = VIEWER_TILE_SIZE):
+        self.handle = handle
+        self.cache = cache if cache is not None else TileCache()
+        self.tile_size = tile_size
+        self.width, self.height = handle.size
+        self.levels = 1
+        while max(self.width, self.height) > tile_size << (self.levels - 1):
+            self.levels += 1
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        scale = 1 << level
+        return max(1, -(-self.width // scale)), max(1, -(-self.height // scale))
+
+    def grid(self, level: int) -> Tuple[int, int]:
+        """Tile columns and rows at a level"""
+        width, height = self.level_size(level)
+        return -(-width // self.tile_size), -(-height // self.tile_size)
+
+    def tile(self, level: int, col: int, row: int) -> Image.Image:
+        return self.tiles(level, [(col, row)])[0]
+
+    def tiles(self, level: int, positions: List[Tuple[int, int]]) -> List[Image.Image]:
+        """Tiles at a level; the missing ones are cut from one transient decode of the source"""
+        found = {position: self.cache.get((self.handle.digest, level, *position)) for position in positions}
+        missing = [position for position, tile in found.items() if tile is None]
+        if missing:
+            width, height = self.level_size(level)
+            # Decoded at the level's size (JPEG draft scaling where it applies) and dropped after cutting
+            source = self.handle.decode(max(width, height) if level else None)
+            try:
+                for col, row in missing:
+                    box = (
+                        col * self.tile_size,
+                        row * self.tile_size,
+                        min(width, (col + 1) * self.tile_size),
+                        min(height, (row + 1) * self.tile_size),
+                    )
+                    tile = _rgb(source.crop(box))
+                    self.cache.put((self.handle.digest, level, col, row), tile)
+                    found[(col, row)] = tile
+            finally:
+                source.close()
+        return [found[position] for position in positions]
+
+    def tiles_in_view(self, level: int, box: Tuple[int, int, int, int]) -> List[Tuple[int, int]]:
+        """(col, row) of the tiles overlapping ``box`` given in level pixels"""
+        cols, rows = self.grid(level)
+        left, top, right, bottom = box
+        first_col, last_col = max(0, left // self.tile_size), min(cols - 1, (right - 1) // self.tile_size)
+        first_row, last_row = max(0, top // self.tile_size), min(rows - 1, (bottom - 1) // self.tile_size)
+        return [(col, row) for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)]
+
+    def render(self, level: int, center: Tuple[float, float], viewport: Tuple[int, int]) -> Image.Image:
+        """Viewport-sized image at ``level`` centred on fractional (x, y) coordinates"""
+        level = max(0, min(level, self.levels - 1))
+        width, height = self.level_size(level)
+        view_w, view_h = min(viewport[0], width), min(viewport[1], height)
+        left = int(min(max(center[0] * width - view_w / 2, 0), width - view_w))
+        top = int(min(max(center[1] * height - view_h / 2, 0), height - view_h))
+        box = (left, top, left + view_w, top + view_h)
+        canvas = Image.new("RGB", (view_w, view_h))
+        positions = self.tiles_in_view(level, box)
+        for (col, row), tile in zip(positions, self.tiles(level, positions)):
+            canvas.paste(tile, (col * self.tile_size - left, row * self.tile_size - top))
+        return canvas
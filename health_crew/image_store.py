@@ -0,0 +1,135 @@
+"""
+In-memory image handles passed through the diagnosis pipeline
+"""
+import hashlib
+import io
+import os
+import threading
+import weakref
+from pathlib import Path
+from typing import Optional, Tuple, Union
+from PIL import Image
+from .config import IMAGE_SPILL_DIR
+
+REF_PREFIX = "image://"
+_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+    "BMP": "image/bmp",
+    "TIFF": "image/tiff",
+}
+
+
+class ImageHandle:
+    """Encoded image bytes that readers decode on demand.
+
+    The bytes are held as-is and never re-encoded. Decoded pixels are never
+    kept on the handle, since handles outlive any one reader: ``decode``
+    returns a transient image, and with ``max_side`` JPEGs are decoded in
+    draft mode at a reduced DCT scale, so previews, quality checks and
+    hashing never touch the full-resolution pixels.
+    """
+
+    def __init__(self, data: bytes, name: str = ""):
+        self.data = data
+        self.name = name
+        self.digest = hashlib.sha256(data).hexdigest()
+        self._format: Optional[str] = None
+        self._size: Optional[Tuple[int, int]] = None
+
+    @property
+    def ref(self) -> str:
+        """Reference string that tools resolve back to this handle"""
+        return f"{REF_PREFIX}{self.digest}"
+
+    def _header(self) -> None:
+        with Image.open(io.BytesIO(self.data)) as header:
+            self._format, self._size = header.format, header.size
+
+    def decode(self, max_side: Optional[int] = None) -> Image.Image:
+        """Pixels decoded now and owned by the caller, at most ``max_side`` on the long edge if given"""
+        with Image.open(io.BytesIO(self.data)) as source:
+            self._format, self._size = source.format, source.size
+            if max_side and source.format == "JPEG":
+                source.draft(source.mode, (max_side, max_side))
+            image = source.copy()
+        if max_side:
+            image.thumbnail((max_side, max_side))
+        return image
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Full-resolution (width, height), read from the header"""
+        if self._size is None:
+            self._header()
+        return self._size
+
+    @property
+    def format(self) -> str:
+        if self._format is None:
+            self._header()
+        return self._format or ""
+
+    @property
+    def mime_type(self) -> str:
+        return _MIME_TYPES.get(self.format, "image/jpeg")
+
+    def spill(self, directory: Union[str, Path, None] = None) -> Path:
+        """Write the bytes to a content-addressed file and return its path.
+
+        Names are derived from the digest, so concurrent uploads never
+        overwrite each other and identical images share one file.
+        """
+        target_dir = Path(directory or IMAGE_SPILL_DIR)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        suffix = "." + self.format.lower() if self.format else ""
+        path = target_dir / f"{self.digest}{suffix}"
+        if not path.exists():
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(self.data)
+            os.replace(tmp, path)
+        return path
+
+
+# Handles stay resolvable for as long as a holder (a session, a worker's run) keeps a reference;
+# nothing is evicted while in use, and a dropped handle's bytes are freed with its last reference
+_handles: "weakref.WeakValueDictionary[str, ImageHandle]" = weakref.WeakValueDictionary()
+_handles_lock = threading.Lock()
+
+
+def register_image(data: bytes, name: str = "") -> ImageHandle:
+    """Wrap image bytes in a handle that tools can resolve by reference.
+
+    The registry does not own the handle: the caller must keep it for as
+    long as its ``ref`` may be resolved, e.g. in session state or for the
+    duration of a run. Identical bytes return the handle already held.
+    """
+    handle = ImageHandle(data, name)
+    with _handles_lock:
+        existing = _handles.get(handle.digest)
+        if existing is not None:
+            return existing
+        _handles[handle.digest] = handle
+    return handle
+
+
+def resolve_image(ref: str) -> ImageHandle:
+    """Return the handle for an ``image://`` reference or a file path.
+
+    Raises FileNotFoundError if the reference is unknown (never registered,
+    or no longer held by anyone) or the file does not exist.
+    """
+    ref = ref.strip()
+    if ref.startswith(REF_PREFIX):
+        digest = ref[len(REF_PREFIX):]
+        with _handles_lock:
+            handle = _handles.get(digest)
+        if handle is None:
+            raise FileNotFoundError(f"Image reference not found: {ref}")
+        return handle
+    path = Path(ref)
+    if not path.is_file():
+        raise FileNotFoundError(f"Image file not found: {ref}")
+    return register_image(path.read_bytes(), path.name)
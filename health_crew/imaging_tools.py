@@ -4,15 +4,50 @@ Provides AI-powered analysis of medical images using Gemini Vision
 """
 import os
 import base64
-from typing import Dict, Any, Optional
+import contextvars
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union
 from pathlib import Path
 import google.generativeai as genai
+import numpy as np
 from crewai.tools import tool
+from PIL import Image
+from .image_hash import MAX_SEARCH_DISTANCE, PerceptualHashIndex, dhash
+from .image_store import ImageHandle, resolve_image
+from .rate_limit import estimate_tokens, get_limiter
+from .schemas import IMAGING_FINDINGS_SCHEMA, SEVERITY_LEVELS, parse_imaging_findings
+from .tool_memo import run_memoized
+from .trace import current_trace
 from .utils.logging import get_logger
-from .config import GOOGLE_API_KEY, GEMINI_MODEL
+from .config import (
+    GOOGLE_API_KEY,
+    GEMINI_MODEL,
+    IMAGE_NEAR_DUP_DISTANCE,
+    IMAGE_ANALYSIS_CACHE_SIZE,
+    IMAGE_QUALITY_GATE,
+    IMAGE_MIN_SIDE_PX,
+    IMAGE_MIN_BLUR_VARIANCE,
+    IMAGE_MAX_CLIPPED_FRACTION,
+    IMAGE_MIN_CONTRAST_STD,
+    IMAGING_MAX_CONCURRENCY,
+)
 
 logger = get_logger(__name__)
 
+if not -1 <= IMAGE_NEAR_DUP_DISTANCE <= MAX_SEARCH_DISTANCE:
+    raise ValueError(
+        f"IMAGE_NEAR_DUP_DISTANCE must be -1 (disabled) or 0-{MAX_SEARCH_DISTANCE}, got {IMAGE_NEAR_DUP_DISTANCE}"
+    )
+if IMAGE_ANALYSIS_CACHE_SIZE < 1:
+    raise ValueError(f"IMAGE_ANALYSIS_CACHE_SIZE must be at least 1, got {IMAGE_ANALYSIS_CACHE_SIZE}")
+
+# Process-wide index of analysed studies keyed by perceptual hash, bounded for long-running processes
+_analysis_index = PerceptualHashIndex(max_entries=IMAGE_ANALYSIS_CACHE_SIZE)
+
 
 def _configure_genai():
     """Configure Google Generative AI with API key"""
@@ -27,42 +62,159 @@ def _encode_image(image_path: str) -> str:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
 
-@tool("medical_image_analysis")
-def medical_image_analysis(image_path: str, patient_context: str = "") -> Dict[str, Any]:
+# Side length the quality metrics are measured at, so scores are comparable across uploads
+_QUALITY_ANALYSIS_SIDE = 1024
+
+
+def analysis_preview(handle: ImageHandle) -> Image.Image:
+    """Transient decode at the quality-analysis size, for the gate and the perceptual hash"""
+    return handle.decode(_QUALITY_ANALYSIS_SIDE)
+
+
+def assess_image_quality(image: Image.Image, size: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Score an image locally before paying for vision analysis.
+
+    Measures resolution, Laplacian-variance sharpness, the fraction of
+    clipped (pure black or white) pixels and overall contrast. Too-small and
+    uniform frames are rejected; blur and clipping only produce warnings
+    because some modalities are legitimately smooth or dark.
+
+    ``size`` is the original (width, height) when ``image`` is a reduced
+    preview such as ``analysis_preview``; resolution is judged on it.
+
+    Returns a dict with ``passed``, ``issues``, ``warnings``, ``scores`` and
+    ``thresholds``.
     """
-    Analyze medical images (X-ray, MRI, CT scan) using Gemini Vision AI.
-    
-    Args:
-        image_path: Path to the medical image file
-        patient_context: Optional patient context (symptoms, demographics, history)
-    
-    Returns:
-        Dictionary with analysis results including:
-        - image_type: Modality and anatomical region
-        - findings: Key observations and abnormalities
-        - assessment: Diagnostic assessment with confidence
-        - patient_explanation: Simple language explanation
-        - severity: Normal/Mild/Moderate/Severe
+    width, height = size or image.size
+    gray = image.convert("L")
+    factor = max(1, max(gray.size) // _QUALITY_ANALYSIS_SIDE)
+    if factor > 1:
+        gray = gray.reduce(factor)
+    pixels = np.asarray(gray, dtype=np.float32)
+
+    laplacian = (
+        pixels[1:-1, :-2] + pixels[1:-1, 2:] + pixels[:-2, 1:-1] + pixels[2:, 1:-1]
+        - 4.0 * pixels[1:-1, 1:-1]
+    )
+    histogram = np.bincount(pixels.astype(np.uint8).ravel(), minlength=256)
+    total = max(int(histogram.sum()), 1)
+    scores = {
+        "width": width,
+        "height": height,
+        "blur_variance": round(float(laplacian.var()) if laplacian.size else 0.0, 2),
+        "clipped_dark_fraction": round(float(histogram[:3].sum()) / total, 4),
+        "clipped_bright_fraction": round(float(histogram[-3:].sum()) / total, 4),
+        "contrast_std": round(float(pixels.std()), 2),
+    }
+    thresholds = {
+        "min_side_px": IMAGE_MIN_SIDE_PX,
+        "min_blur_variance": IMAGE_MIN_BLUR_VARIANCE,
+        "max_clipped_fraction": IMAGE_MAX_CLIPPED_FRACTION,
+        "min_contrast_std": IMAGE_MIN_CONTRAST_STD,
+    }
+
+    issues = []
+    warnings = []
+    if min(width, height) < IMAGE_MIN_SIDE_PX:
+        issues.append(f"Resolution {width}x{height} is below the {IMAGE_MIN_SIDE_PX}px minimum")
+    if scores["contrast_std"] < IMAGE_MIN_CONTRAST_STD:
+        issues.append("Image is an almost uniform frame with no visible structure")
+    if scores["blur_variance"] < IMAGE_MIN_BLUR_VARIANCE:
+        warnings.append("Image appears blurred")
+    if scores["clipped_bright_fraction"] > IMAGE_MAX_CLIPPED_FRACTION:
+        warnings.append("Image appears over-exposed")
+    if scores["clipped_dark_fraction"] > IMAGE_MAX_CLIPPED_FRACTION:
+        warnings.append("Image appears under-exposed")
+
+    return {
+        "passed": not issues,
+        "issues": issues,
+        "warnings": warnings,
+        "scores": scores,
+        "thresholds": thresholds,
+    }
+
+
+def image_fingerprint(image: Image.Image) -> str:
+    """Perceptual hash of an image as a 16-digit hex string"""
+    return f"{dhash(image):016x}"
+
+
+def context_key(patient_context: str) -> str:
+    """Hash of the patient context an analysis was generated with, ignoring case and spacing"""
+    normalized = re.sub(r"\s+", " ", patient_context or "").strip().casefold()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def find_near_duplicate(fingerprint: str, patient_context: Optional[str] = "") -> Optional[Dict[str, Any]]:
+    """Return the earlier analysis of a near-identical study with the same patient context, if any.
+
+    Analyses are written with the patient context in the prompt, so one is
+    only reused for the same context; a near-identical image from another
+    patient is analysed afresh. ``patient_context=None`` matches any context
+    and is only for display, never for reuse. The returned dict is a copy of
+    the stored result annotated with ``reused`` and ``hamming_distance``.
     """
-    try:
-        _configure_genai()
-        
-        # Validate image path
-        if not Path(image_path).exists():
-            return {
-                "error": f"Image file not found: {image_path}",
-                "status": "failed"
-            }
-        
-        # Create the model
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        # Prepare the analysis prompt
-        context_section = f"### Patient Context\n{patient_context}\n\n" if patient_context else ""
-        
-        prompt = f"""You are a highly skilled medical imaging expert with extensive knowledge in radiology and diagnostic imaging.
+    if IMAGE_NEAR_DUP_DISTANCE < 0:
+        return None
+    key = context_key(patient_context) if patient_context is not None else None
+    match = _analysis_index.query(
+        int(fingerprint, 16),
+        IMAGE_NEAR_DUP_DISTANCE,
+        accept=None if key is None else lambda entry: entry["context_key"] == key,
+    )
+    if match is None:
+        return None
+    distance, entry = match
+    return {**entry["result"], "reused": True, "hamming_distance": distance}
+
+
+def remember_analysis(fingerprint: str, result: Dict[str, Any], patient_context: str = "") -> None:
+    """Record a successful analysis so near-duplicate uploads with the same context can reuse it"""
+    if result.get("status") == "success":
+        _analysis_index.add(int(fingerprint, 16), {"context_key": context_key(patient_context), "result": dict(result)})
+
+
+# Gemini bills each image as a fixed number of tokens
+_IMAGE_TOKENS = 258
+
+
+def _generate(model, contents: List[Any]) -> Any:
+    """Run generate_content under the shared Gemini rate limiter"""
+    text = " ".join(part for part in contents if isinstance(part, str))
+    images = sum(1 for part in contents if isinstance(part, dict))
+    return get_limiter("gemini").call(
+        model.generate_content,
+        (contents,),
+        tokens=estimate_tokens(text) + _IMAGE_TOKENS * images,
+        usage=lambda response: response.usage_metadata.total_token_count,
+    )
+
 
-Analyze this medical image and provide a structured response:
+def _structured_model():
+    """Gemini model constrained to the ImagingFindings schema"""
+    _configure_genai()
+    return genai.GenerativeModel(
+        GEMINI_MODEL,
+        generation_config=genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=IMAGING_FINDINGS_SCHEMA,
+        ),
+    )
+
+
+def _analysis_prompt(patient_context: str = "", view_count: int = 1) -> str:
+    """Structured analysis prompt for one image or several views of one study"""
+    subject = (
+        "this medical image"
+        if view_count == 1
+        else f"these {view_count} related views of the same imaging study together"
+    )
+    context_section = f"### Patient Context\n{patient_context}\n\n" if patient_context else ""
+    
+    return f"""You are a highly skilled medical imaging expert with extensive knowledge in radiology and diagnostic imaging.
+
+Analyze {subject} and provide a structured response:
 
 ### 1. Image Type & Region
 - Specify imaging modality (X-ray/MRI/CT/Ultrasound/etc.)
@@ -87,38 +239,111 @@ Analyze this medical image and provide a structured response:
 - Avoid medical jargon or provide clear definitions
 - Address common patient concerns
 
-{context_section}Format your response as valid JSON with these keys:
+{context_section}Respond with JSON only, following the provided response schema:
 - image_type: {{modality, region, quality}}
-- findings: [list of observations with severity]
+- findings: [{{observation, severity}}]
 - assessment: {{primary_diagnosis, confidence, differentials, critical_flags}}
 - patient_explanation: string
 - severity: "Normal"/"Mild"/"Moderate"/"Severe"
 """
+
+
+def _parse_response(text: str) -> Dict[str, Any]:
+    """Only compact fields travel downstream; unparseable replies keep the raw text"""
+    try:
+        findings = parse_imaging_findings(text)
+        return {
+            "status": "success",
+            "findings": findings.compact(),
+            "patient_explanation": findings.patient_explanation,
+        }
+    except ValueError as parse_err:
+        logger.warning("Imaging reply did not match schema: %s", parse_err)
+        return {"status": "partial", "analysis": text}
+
+
+def _screen_image(
+    image_path: str,
+) -> Tuple[ImageHandle, Image.Image, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Resolve an image and run the local quality gate on a reduced preview.
+
+    Returns (handle, preview, quality, rejection) where rejection is a result
+    dict if the image must not be sent for analysis. The preview is the
+    caller's to hash and drop; the full-resolution pixels are never decoded.
+    Raises FileNotFoundError for unknown references.
+    """
+    handle = resolve_image(image_path)
+    preview = analysis_preview(handle)
+    quality = assess_image_quality(preview, size=handle.size) if IMAGE_QUALITY_GATE else None
+    if quality is not None and not quality["passed"]:
+        logger.warning("Image rejected by quality gate: %s", "; ".join(quality["issues"]))
+        return handle, preview, quality, {
+            "error": "Image quality inadequate: " + "; ".join(quality["issues"]),
+            "status": "rejected",
+            "image_path": image_path,
+            "quality": quality,
+        }
+    return handle, preview, quality, None
+
+
+def _analyze_image(image_path: str, patient_context: str = "") -> Dict[str, Any]:
+    """Analyze a single image; see medical_image_analysis"""
+    try:
+        # Resolve the in-memory handle (or read the file once) and reject
+        # unusable images before any network call
+        try:
+            handle, preview, quality, rejection = _screen_image(image_path)
+        except FileNotFoundError as e:
+            return {
+                "error": str(e),
+                "status": "failed"
+            }
+        if rejection is not None:
+            return rejection
         
-        # Load and analyze image
-        logger.info(f"Analyzing medical image: {image_path}")
+        fingerprint = image_fingerprint(preview)
+        del preview
         
-        with open(image_path, 'rb') as img_file:
-            image_data = img_file.read()
+        # Reuse the analysis of an earlier near-identical study if there is one
+        previous = find_near_duplicate(fingerprint, patient_context)
+        if previous is not None:
+            logger.info(
+                "Reusing analysis of near-duplicate study %s (distance %d)",
+                previous.get("image_path"), previous["hamming_distance"],
+            )
+            return {
+                **previous,
+                "image_path": image_path,
+                "fingerprint": fingerprint,
+                "quality": quality,
+            }
+        
+        model = _structured_model()
+        prompt = _analysis_prompt(patient_context)
+        
+        # Load and analyze image
+        logger.info("Analyzing medical image: %s", image_path)
         
         # Generate content with image
-        response = model.generate_content([
+        response = _generate(model, [
             prompt,
-            {"mime_type": "image/jpeg", "data": image_data}
+            {"mime_type": handle.mime_type, "data": handle.data}
         ])
         
-        result = {
-            "status": "success",
-            "analysis": response.text,
+        result = _parse_response(response.text)
+        result.update({
             "image_path": image_path,
+            "fingerprint": fingerprint,
+            "quality": quality,
             "model_used": GEMINI_MODEL
-        }
+        })
+        remember_analysis(fingerprint, result, patient_context)
         
         logger.info("Medical image analysis completed successfully")
         return result
         
     except Exception as e:
-        logger.exception(f"Medical image analysis failed: {e}")
+        logger.exception("Medical image analysis failed: %s", e)
         return {
             "error": str(e),
             "status": "failed",
@@ -126,7 +351,174 @@ Analyze this medical image and provide a structured response:
         }
 
 
+@tool("medical_image_analysis")
+@run_memoized
+def medical_image_analysis(image_path: str, patient_context: str = "") -> Dict[str, Any]:
+    """
+    Analyze medical images (X-ray, MRI, CT scan) using Gemini Vision AI.
+    
+    Args:
+        image_path: ``image://`` reference or path to the medical image file
+        patient_context: Optional patient context (symptoms, demographics, history)
+    
+    Returns:
+        Dictionary with analysis results including:
+        - findings: Compact findings (severity, critical_flags,
+          primary_diagnosis, confidence)
+        - patient_explanation: Simple language explanation
+        - quality: Local quality-gate scores and thresholds
+    """
+    return _record_imaging(_analyze_image(image_path, patient_context))
+
+
+def _record_imaging(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach a tool result to the active run trace, if any"""
+    trace = current_trace()
+    if trace is not None:
+        trace.imaging.append(result)
+    return result
+
+
+_study_executor: Optional[ThreadPoolExecutor] = None
+_study_executor_lock = threading.Lock()
+
+
+def _get_study_executor() -> ThreadPoolExecutor:
+    """Process-wide pool capping concurrent per-view vision requests"""
+    global _study_executor
+    with _study_executor_lock:
+        if _study_executor is None:
+            _study_executor = ThreadPoolExecutor(
+                max_workers=IMAGING_MAX_CONCURRENCY, thread_name_prefix="imaging"
+            )
+        return _study_executor
+
+
+def split_image_refs(image_paths: Union[str, List[str]]) -> List[str]:
+    """Accept a list or a comma/newline separated string of image references"""
+    if isinstance(image_paths, str):
+        image_paths = image_paths.replace("\n", ",").split(",")
+    return [ref.strip() for ref in image_paths if ref and ref.strip()]
+
+
+def merge_study_results(views: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-view results into one per-study result.
+
+    Study severity is the worst view severity, critical flags are the
+    ordered union across views and the primary diagnosis comes from the most
+    severe successfully analysed view.
+    """
+    analysed = [view for view in views if view.get("findings")]
+    if not analysed:
+        errors = "; ".join(view.get("error") or view.get("status", "unknown") for view in views)
+        return {"status": "failed", "error": f"No view could be analysed: {errors}", "views": views}
+    
+    rank = {level: i for i, level in enumerate(SEVERITY_LEVELS)}
+    worst = max(analysed, key=lambda view: rank.get(view["findings"].get("severity"), 0))
+    critical_flags: List[str] = []
+    for view in analysed:
+        for flag in view["findings"].get("critical_flags") or []:
+            if flag not in critical_flags:
+                critical_flags.append(flag)
+    
+    return {
+        "status": "success" if len(analysed) == len(views) else "partial",
+        "findings": {
+            "severity": worst["findings"].get("severity", "Normal"),
+            "critical_flags": critical_flags,
+            "primary_diagnosis": worst["findings"].get("primary_diagnosis", ""),
+            "confidence": worst["findings"].get("confidence", ""),
+        },
+        "patient_explanation": worst.get("patient_explanation", ""),
+        "views": [
+            {
+                "image_path": view.get("image_path"),
+                "status": view.get("status"),
+                "findings": view.get("findings"),
+                "error": view.get("error"),
+            }
+            for view in views
+        ],
+        "model_used": GEMINI_MODEL,
+    }
+
+
+def _analyze_views_combined(image_paths: List[str], patient_context: str = "") -> Dict[str, Any]:
+    """Send all usable views of a study in one multi-image request"""
+    handles = []
+    views = []
+    for image_path in image_paths:
+        try:
+            handle, _, quality, rejection = _screen_image(image_path)
+        except FileNotFoundError as e:
+            views.append({"image_path": image_path, "status": "failed", "error": str(e)})
+            continue
+        if rejection is not None:
+            views.append(rejection)
+            continue
+        handles.append(handle)
+        views.append({"image_path": image_path, "status": "sent", "quality": quality})
+    if not handles:
+        return merge_study_results(views)
+    
+    contents: List[Any] = [_analysis_prompt(patient_context, view_count=len(handles))]
+    for i, handle in enumerate(handles, start=1):
+        contents.append(f"View {i}:")
+        contents.append({"mime_type": handle.mime_type, "data": handle.data})
+    
+    logger.info("Analyzing %d views in one combined request", len(handles))
+    response = _generate(_structured_model(), contents)
+    result = _parse_response(response.text)
+    result.update({"views": views, "model_used": GEMINI_MODEL})
+    return result
+
+
+@tool("medical_study_analysis")
+@run_memoized
+def medical_study_analysis(
+    image_paths: List[str],
+    patient_context: str = "",
+    combined: bool = False,
+) -> Dict[str, Any]:
+    """
+    Analyze every view of a multi-image study (e.g. PA and lateral chest, MR sequences).
+    
+    Args:
+        image_paths: ``image://`` references or paths of all views in the study
+        patient_context: Optional patient context (symptoms, demographics, history)
+        combined: Send all views together in one request instead of analysing
+            each view in parallel
+    
+    Returns:
+        One per-study result with merged compact findings and a per-view
+        breakdown under ``views``
+    """
+    started = time.perf_counter()
+    refs = split_image_refs(image_paths)
+    try:
+        if not refs:
+            return {"error": "No images provided", "status": "failed"}
+        if combined and len(refs) > 1:
+            result = _analyze_views_combined(refs, patient_context)
+        else:
+            executor = _get_study_executor()
+            # Each view runs in a copy of this context so logs keep the run and task IDs
+            futures = [
+                executor.submit(contextvars.copy_context().run, _analyze_image, ref, patient_context)
+                for ref in refs
+            ]
+            views = [future.result() for future in futures]
+            result = merge_study_results(views)
+    except Exception as e:
+        logger.exception("Medical study analysis failed: %s", e)
+        result = {"error": str(e), "status": "failed"}
+    result["wall_time_s"] = round(time.perf_counter() - started, 3)
+    logger.info("Study of %d view(s) analysed in %.2fs", len(refs), result["wall_time_s"])
+    return _record_imaging(result)
+
+
 @tool("extract_imaging_findings")
+@run_memoized
 def extract_imaging_findings(analysis_result: Dict[str, Any]) -> str:
     """
     Extract and summarize key findings from imaging analysis result.
@@ -138,17 +530,32 @@ def extract_imaging_findings(analysis_result: Dict[str, Any]) -> str:
         Formatted summary of imaging findings
     """
     try:
-        if analysis_result.get("status") == "failed":
+        if analysis_result.get("status") in ("failed", "rejected"):
             return f"Imaging analysis failed: {analysis_result.get('error', 'Unknown error')}"
         
-        analysis_text = analysis_result.get("analysis", "")
+        findings = analysis_result.get("findings")
+        if findings:
+            critical = ", ".join(findings.get("critical_flags") or []) or "None"
+            analysis_text = (
+                f"**Severity**: {findings.get('severity', 'N/A')}\n"
+                f"**Primary Diagnosis**: {findings.get('primary_diagnosis') or 'N/A'} "
+                f"(confidence: {findings.get('confidence') or 'N/A'})\n"
+                f"**Critical Flags**: {critical}\n\n"
+                f"{analysis_result.get('patient_explanation', '')}"
+            )
+        else:
+            analysis_text = analysis_result.get("analysis", "")
+        quality_warnings = (analysis_result.get("quality") or {}).get("warnings") or []
+        quality_line = (
+            f"**Image Quality Warnings**: {'; '.join(quality_warnings)}\n" if quality_warnings else ""
+        )
         
         summary = f"""
 ### Medical Imaging Summary
 
 **Status**: {analysis_result.get('status', 'unknown')}
 **Model**: {analysis_result.get('model_used', 'N/A')}
-
+{quality_line}
 {analysis_text}
 
 ---
@@ -157,11 +564,12 @@ def extract_imaging_findings(analysis_result: Dict[str, Any]) -> str:
         return summary.strip()
         
     except Exception as e:
-        logger.exception(f"Failed to extract imaging findings: {e}")
+        logger.exception("Failed to extract imaging findings: %s", e)
         return f"Error extracting findings: {e}"
 
 
 @tool("compare_imaging_timeline")
+@run_memoized
 def compare_imaging_timeline(
     current_image_path: str,
     previous_image_path: Optional[str] = None,
@@ -171,8 +579,8 @@ def compare_imaging_timeline(
     Compare current medical image with previous imaging to track disease progression.
     
     Args:
-        current_image_path: Path to current medical image
-        previous_image_path: Optional path to previous image for comparison
+        current_image_path: ``image://`` reference or path to current medical image
+        previous_image_path: Optional reference or path to previous image for comparison
         patient_context: Patient context and history
     
     Returns:
@@ -183,7 +591,7 @@ def compare_imaging_timeline(
         
         if not previous_image_path:
             # Just analyze current image
-            return medical_image_analysis(current_image_path, patient_context)
+            return _analyze_image(current_image_path, patient_context)
         
         model = genai.GenerativeModel(GEMINI_MODEL)
         
@@ -209,19 +617,18 @@ Analyze these images chronologically and provide:
 
 {context_section}"""
         
-        logger.info(f"Comparing images: {previous_image_path} → {current_image_path}")
+        logger.info("Comparing images: %s → %s", previous_image_path, current_image_path)
         
-        # Load both images
-        with open(previous_image_path, 'rb') as prev_file, open(current_image_path, 'rb') as curr_file:
-            prev_data = prev_file.read()
-            curr_data = curr_file.read()
+        # Resolve both images
+        previous = resolve_image(previous_image_path)
+        current = resolve_image(current_image_path)
         
-        response = model.generate_content([
+        response = _generate(model, [
             prompt,
             "Previous Image:",
-            {"mime_type": "image/jpeg", "data": prev_data},
+            {"mime_type": previous.mime_type, "data": previous.data},
             "Current Image:",
-            {"mime_type": "image/jpeg", "data": curr_data}
+            {"mime_type": current.mime_type, "data": current.data}
         ])
         
         return {
@@ -233,7 +640,7 @@ Analyze these images chronologically and provide:
         }
         
     except Exception as e:
-        logger.exception(f"Image comparison failed: {e}")
+        logger.exception("Image comparison failed: %s", e)
         return {
             "error": str(e),
             "status": "failed"
@@ -0,0 +1,40 @@
+"""
+Crew input construction shared by the CLI, Streamlit and HTTP entry points
+"""
+from typing import Any, Dict, List, Optional
+from .coding import code_case_text
+
+
+def build_inputs(
+    symptoms: str,
+    demographics: str,
+    history: str = "",
+    medications: str = "",
+    allergies: str = "",
+    image_refs: Optional[List[str]] = None,
+    imaging_combined: bool = False,
+    patient_id: str = "",
+    similar_case_analysis: str = "",
+) -> Dict[str, Any]:
+    """Crew kickoff inputs, including the placeholders carried forward through tasks"""
+    return {
+        "patient_id": (patient_id or "").strip(),
+        "symptoms": symptoms or "",
+        "demographics": demographics or "",
+        "history": history or "",
+        "medications": medications or "",
+        "allergies": allergies or "",
+        "coded_symptoms": code_case_text(symptoms, history),
+        # placeholders carried forward through tasks
+        "working_differential": "To be generated by Symptom Analyzer",
+        "diagnosis_summary": "To be generated by previous steps",
+        "proposed_medications": medications or "",
+        "conditions": "From differential/diagnosis",
+        "allergy_screen": "Not screened yet",
+        "treatment_plan": "To be generated by Treatment Agent",
+        "referral_plan": "To be generated by Referral Agent",
+        "clinical_summary": "Consolidated output",
+        "medical_image_path": ", ".join(image_refs) if image_refs else "No image provided",
+        "imaging_combined": str(imaging_combined).lower(),
+        "similar_case_analysis": similar_case_analysis or "No similar earlier case",
+    }
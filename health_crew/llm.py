@@ -1,17 +1,45 @@
 from functools import lru_cache
 from typing import Optional
 from crewai import LLM
+from .budget import HARD, SOFT, BudgetExceeded, with_brevity
 from .config import OPENAI_API_KEY, OPENAI_MODEL
+from .rate_limit import estimate_tokens, get_limiter
+from .trace import current_trace
 from .utils.logging import get_logger
 
 logger = get_logger(__name__)
 
 
+class RateLimitedLLM(LLM):
+    """CrewAI LLM whose calls go through the process-wide OpenAI limiter"""
+
+    def call(self, messages, *args, **kwargs):
+        trace = current_trace()
+        if trace is not None:
+            level, reason = trace.budget_status()
+            if level == HARD:
+                raise BudgetExceeded(f"run budget exhausted ({reason})")
+            if level == SOFT:
+                messages = with_brevity(messages)
+        if isinstance(messages, str):
+            prompt = messages
+        else:
+            prompt = " ".join(str(message.get("content", "")) for message in messages)
+        tokens = estimate_tokens(prompt)
+        if trace is not None:
+            trace.count_llm_call(tokens)
+        response = get_limiter("openai").call(super().call, (messages, *args), kwargs, tokens=tokens)
+        if trace is not None:
+            trace.count_llm_tokens(estimate_tokens(str(response)))
+        return response
+
+
 @lru_cache(maxsize=1)
 def get_llm(model: Optional[str] = None) -> LLM:
     """Return a shared OpenAI LLM (CrewAI wrapper) for all agents.
 
-    Uses LiteLLM via provider-qualified model 'openai/<model>'.
+    Uses LiteLLM via provider-qualified model 'openai/<model>'. Calls are
+    throttled by the shared provider limiter in ``rate_limit``.
     """
     if not OPENAI_API_KEY:
         logger.warning(
@@ -19,7 +47,7 @@ def get_llm(model: Optional[str] = None) -> LLM:
         )
     base_model = model or OPENAI_MODEL
     logger.info("Initializing OpenAI LLM: %s", base_model)
-    return LLM(
+    return RateLimitedLLM(
         model=base_model,
         api_key=OPENAI_API_KEY,
         temperature=0.2,
@@ -0,0 +1,252 @@
+"""
+Process-wide, provider-aware rate limiting for LLM and vision API calls
+"""
+import email.utils
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from .config import (
+    OPENAI_RPM,
+    OPENAI_TPM,
+    GEMINI_RPM,
+    GEMINI_TPM,
+    LLM_MAX_CONCURRENCY,
+    LLM_LATENCY_TARGET_S,
+    LLM_RATE_LIMIT_RETRIES,
+)
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Fallback pause after a 429 without a usable Retry-After header
+_DEFAULT_BACKOFF_S = 5.0
+
+
+class RateLimitError(RuntimeError):
+    """Raised when a provider keeps throttling after all retries"""
+
+
+class TokenBucket:
+    """Per-minute quota refilled continuously; not thread-safe on its own"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` is available (0 if available now)"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= amount
+
+
+class ProviderLimiter:
+    """Request/token buckets plus AIMD adaptive concurrency for one provider.
+
+    Calls wait until both buckets have quota, no Retry-After pause is active
+    and the number of in-flight calls is below the adaptive limit. The limit
+    grows additively while calls succeed within the latency target and is
+    cut multiplicatively on 429s or latency spikes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+        latency_target_s: float,
+        min_concurrency: int = 1,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.latency_target_s = latency_target_s
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._stats = {"calls": 0, "throttled": 0, "wait_s_total": 0.0, "wait_s_max": 0.0}
+
+    @contextmanager
+    def acquire(self, tokens: int = 0) -> Iterator[None]:
+        """Hold one concurrency slot and reserve request/token quota"""
+        started = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now < self._blocked_until:
+                        delay = self._blocked_until - now
+                    elif self._in_flight >= int(self._limit):
+                        delay = None
+                    else:
+                        delay = max(
+                            self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now)
+                        )
+                        if delay == 0.0:
+                            break
+                    self._cond.wait(timeout=delay)
+            finally:
+                self._waiting -= 1
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+            waited = time.monotonic() - started
+            self._stats["calls"] += 1
+            self._stats["wait_s_total"] += waited
+            self._stats["wait_s_max"] = max(self._stats["wait_s_max"], waited)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def record_success(self, latency_s: float, reserved_tokens: int = 0, used_tokens: Optional[int] = None) -> None:
+        with self._cond:
+            if used_tokens is not None:
+                # Settle the estimate against the provider-reported usage
+                self._tokens.take(used_tokens - reserved_tokens)
+            if latency_s > self.latency_target_s:
+                self._limit = max(self.min_concurrency, self._limit * 0.75)
+            else:
+                self._limit = min(self.max_concurrency, self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def record_throttle(self, retry_after_s: Optional[float]) -> float:
+        """Halve the concurrency limit and pause the provider; returns the pause"""
+        pause = retry_after_s if retry_after_s is not None else _DEFAULT_BACKOFF_S
+        with self._cond:
+            self._stats["throttled"] += 1
+            self._limit = max(self.min_concurrency, self._limit / 2.0)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+            self._cond.notify_all()
+        logger.warning(
+            "%s rate limited; pausing %.1fs, concurrency limit now %d",
+            self.name, pause, int(self._limit),
+        )
+        return pause
+
+    def call(
+        self,
+        fn: Callable[..., Any],
+        args: Tuple = (),
+        kwargs: Optional[Dict[str, Any]] = None,
+        tokens: int = 0,
+        usage: Optional[Callable[[Any], Optional[int]]] = None,
+        retries: int = LLM_RATE_LIMIT_RETRIES,
+    ) -> Any:
+        """Run ``fn`` under the limiter, retrying on provider 429s.
+
+        ``tokens`` is the estimated token cost reserved up front and
+        ``usage`` optionally extracts the real cost from the response.
+        """
+        kwargs = kwargs or {}
+        for attempt in range(retries + 1):
+            with self.acquire(tokens):
+                started = time.monotonic()
+                try:
+                    response = fn(*args, **kwargs)
+                except Exception as e:
+                    throttled, retry_after = rate_limit_details(e)
+                    if not throttled:
+                        raise
+                    self.record_throttle(retry_after)
+                    if attempt == retries:
+                        raise RateLimitError(f"{self.name} still rate limited after {retries} retries") from e
+                    continue
+            used = None
+            if usage is not None:
+                try:
+                    used = usage(response)
+                except Exception:
+                    used = None
+            self.record_success(time.monotonic() - started, tokens, used)
+            return response
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            calls = self._stats["calls"]
+            return {
+                "queue_depth": self._waiting,
+                "in_flight": self._in_flight,
+                "concurrency_limit": int(self._limit),
+                "calls": calls,
+                "throttled": self._stats["throttled"],
+                "wait_s_avg": round(self._stats["wait_s_total"] / calls, 4) if calls else 0.0,
+                "wait_s_max": round(self._stats["wait_s_max"], 4),
+            }
+
+
+def rate_limit_details(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """Return (is_rate_limit, retry_after_seconds) for a provider exception"""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    name = type(error).__name__
+    throttled = status == 429 or "RateLimit" in name or "ResourceExhausted" in name or " 429" in str(error)
+    if not throttled:
+        return False, None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return True, None
+    try:
+        return True, max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return True, None
+    return True, max(0.0, retry_at - time.time())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+_PROVIDER_QUOTAS = {
+    "openai": (OPENAI_RPM, OPENAI_TPM),
+    "gemini": (GEMINI_RPM, GEMINI_TPM),
+}
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    """Shared limiter for a provider ("openai" or "gemini")"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            rpm, tpm = _PROVIDER_QUOTAS[provider]
+            limiter = ProviderLimiter(
+                provider, rpm, tpm, LLM_MAX_CONCURRENCY, LLM_LATENCY_TARGET_S
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def limiter_metrics() -> Dict[str, Dict[str, Any]]:
+    """Queue depth, wait time and concurrency metrics per provider"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.metrics() for name, limiter in limiters.items()}
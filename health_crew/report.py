@@ -0,0 +1,110 @@
+"""
+Structured model of the diagnosis crew's final report
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# Report sections in display order with their icons
+SECTIONS: Dict[str, str] = {
+    "Symptom Analysis": "🔍",
+    "Medical History": "📋",
+    "Imaging Analysis": "🩻",
+    "Treatment Recommendations": "💊",
+    "Referral Assessment": "👨‍⚕️",
+    "Drug Safety": "⚠️",
+    "Follow-up Plan": "📅",
+    "Patient Instructions": "👤",
+    "Skipped Steps": "⏭️",
+    "Partial Result": "⏳",
+}
+
+SUMMARY_LINES = 10
+
+# Any line mentioning a section name; header-ness is confirmed per match
+_SECTION_LINE_RE = re.compile(
+    r"^.*?(" + "|".join(re.escape(name) for name in SECTIONS) + r").*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_CANONICAL = {name.lower(): name for name in SECTIONS}
+
+
+def crew_output_text(result) -> str:
+    """Final text of a crew kickoff result"""
+    if hasattr(result, "raw"):
+        return result.raw
+    if hasattr(result, "output"):
+        return result.output
+    return result if isinstance(result, str) else str(result)
+
+
+def report_digest(text: str) -> str:
+    """Stable cache key for a report's text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Report:
+    """Crew output parsed once into summary and section views"""
+
+    text: str
+    digest: str
+    summary: str
+    sections: Dict[str, str] = field(default_factory=dict)
+
+    def ordered_sections(self) -> List[Tuple[str, str, str]]:
+        """(name, icon, content) for the sections present, in display order"""
+        return [
+            (name, icon, self.sections[name]) for name, icon in SECTIONS.items() if name in self.sections
+        ]
+
+
+class ReportParser:
+    """Incremental section indexer for (possibly streamed) crew output.
+
+    Text can be fed in arbitrary chunks; only complete lines that have not
+    been scanned yet are searched, so parsing streamed output stays linear
+    in the total report length.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._text = ""
+        self._scanned = 0
+        self._headers: List[Tuple[str, int, int]] = []  # (section, header start, body start)
+
+    def feed(self, chunk: str) -> "ReportParser":
+        self._chunks.append(chunk)
+        return self
+
+    def _scan(self, final: bool) -> None:
+        if self._chunks:
+            self._text += "".join(self._chunks)
+            self._chunks.clear()
+        end = len(self._text) if final else self._text.rfind("\n", self._scanned) + 1
+        if end <= self._scanned:
+            return
+        for match in _SECTION_LINE_RE.finditer(self._text, self._scanned, end):
+            line = match.group(0)
+            if line.startswith("#") or line.isupper():
+                self._headers.append((_CANONICAL[match.group(1).lower()], match.start(), match.end() + 1))
+        self._scanned = end
+
+    def report(self, final: bool = True) -> Report:
+        """Build a Report from everything fed so far"""
+        self._scan(final)
+        text = self._text
+        sections: Dict[str, str] = {}
+        for i, (name, _, body_start) in enumerate(self._headers):
+            body_end = self._headers[i + 1][1] if i + 1 < len(self._headers) else len(text)
+            # A repeated header restarts its section, matching the original line-by-line parse
+            sections[name] = text[body_start:body_end].rstrip("\n")
+        head = text.split("\n", SUMMARY_LINES)[:SUMMARY_LINES]
+        summary = "\n".join(line for line in head if line.strip())
+        return Report(text=text, digest=report_digest(text), summary=summary, sections=sections)
+
+
+def parse_report(text: str) -> Report:
+    """Parse a complete crew output into a Report"""
+    return ReportParser().feed(text).report()
@@ -0,0 +1,537 @@
+"""
+Step-by-step execution of the diagnosis plan with per-task checkpoints
+"""
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from crewai import Crew, Process, Task
+from crewai.tasks.task_output import TaskOutput
+from .allergy import allergy_screen_inputs
+from .coding import coded_symptom_inputs
+from .budget import HARD, OK, SOFT, BudgetExceeded
+from .conditions import should_run
+from .config import CHECKPOINT_DIR, CONDITIONAL_TASKS, CREW_PROFILE, SPECULATIVE_EXECUTION
+from .speculation import SpeculationSpec, launchable, speculation_stats
+from .templates import clone_agents
+from .trace import TaskRecord, current_trace, on_task_completed
+from .utils.logging import get_logger
+from .workflows import diagnosis_plan, fuse_tasks, fusion_group, split_fused_output
+
+logger = get_logger(__name__)
+
+
+class CheckpointStore:
+    """One JSON file per in-progress case, rewritten atomically after each task"""
+
+    def __init__(self, directory: str = CHECKPOINT_DIR):
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._path(key).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable checkpoint %s: %s", key, e)
+            return None
+
+    def save(self, key: str, state: Dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        path = self._path(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def discard(self, key: str) -> None:
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Interrupted runs, most recently updated first"""
+        states = []
+        for path in self.directory.glob("*.json"):
+            state = self.load(path.stem)
+            if state is not None:
+                states.append(state)
+        return sorted(states, key=lambda state: state.get("updated_at", ""), reverse=True)
+
+
+@dataclass
+class PlanResult:
+    """Outputs of a completed plan; ``raw`` is the final task's output like CrewOutput.
+
+    ``partial`` lists the steps that did not run because the run budget ran
+    out; their outputs are marked placeholders.
+    """
+
+    raw: str
+    tasks_output: List[TaskOutput] = field(default_factory=list)
+    resumed_from: int = 0
+    skipped: List[Dict[str, str]] = field(default_factory=list)
+    partial: List[Dict[str, str]] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return self.raw
+
+
+def _dump_output(name: str, output: TaskOutput, duration_s: float, skipped: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "agent": str(output.agent),
+        "description": output.description,
+        "expected_output": output.expected_output,
+        "raw": output.raw,
+        "duration_s": duration_s,
+        "skipped": skipped,
+    }
+
+
+def _load_output(data: Dict[str, Any]) -> TaskOutput:
+    return TaskOutput(
+        description=data["description"],
+        expected_output=data.get("expected_output"),
+        agent=data["agent"],
+        raw=data["raw"],
+    )
+
+
+def _skipped_output(task: Task, name: str, reason: str) -> TaskOutput:
+    """Placeholder output so downstream steps see why a step did not run"""
+    return TaskOutput(
+        description=task.description,
+        expected_output=task.expected_output,
+        agent=str(getattr(task.agent, "role", "")),
+        raw=f"{name.replace('_', ' ').capitalize()} skipped: {reason}.",
+    )
+
+
+def _with_skipped_section(text: str, skipped: List[Dict[str, str]]) -> str:
+    if not skipped:
+        return text
+    lines = "\n".join(f"- {item['name'].replace('_', ' ').capitalize()}: {item['reason']}" for item in skipped)
+    return f"{text}\n\n## Skipped Steps\n{lines}\n"
+
+
+def _partial_output(task: Task, name: str, reason: str) -> TaskOutput:
+    """Marked placeholder for a step the run budget did not leave room for"""
+    return TaskOutput(
+        description=task.description,
+        expected_output=task.expected_output,
+        agent=str(getattr(task.agent, "role", "")),
+        raw=f"[PARTIAL] {name.replace('_', ' ').capitalize()} not completed: {reason}.",
+    )
+
+
+def _with_partial_section(text: str, partial: List[Dict[str, str]]) -> str:
+    if not partial:
+        return text
+    lines = "\n".join(f"- {item['name'].replace('_', ' ').capitalize()}" for item in partial)
+    return (
+        f"{text}\n\n## Partial Result\n"
+        f"This report is incomplete: {partial[0]['reason']}. Steps not completed:\n{lines}\n"
+    )
+
+
+def _budget_status() -> Tuple[str, str]:
+    trace = current_trace()
+    return trace.budget_status() if trace is not None else (OK, "")
+
+
+def _context_shell(task: Task, output: TaskOutput) -> Task:
+    """Copy of a finished task carrying only its output, for downstream context"""
+    return task.model_copy(update={"output": output})
+
+
+def _run_step(
+    task: Task,
+    shells: List[Task],
+    agents: list,
+    inputs: Dict[str, Any],
+    verbose: bool,
+    task_callback: Optional[Callable[[Any], None]] = on_task_completed,
+    delegation: bool = True,
+) -> Tuple[TaskOutput, float]:
+    """Run one task as a single-task crew; returns its output and duration.
+
+    The crew gets its own agent clones, so steps running concurrently
+    (speculation) never share an agent's executor.
+    """
+    clones = clone_agents([*agents, task.agent], **({} if delegation else {"allow_delegation": False}))
+    update: Dict[str, Any] = {"agent": clones[id(task.agent)]}
+    if shells:
+        update["context"] = list(shells)
+    step = task.model_copy(update=update)
+    crew = Crew(
+        agents=[clones[id(agent)] for agent in agents],
+        tasks=[step],
+        process=Process.sequential,
+        verbose=verbose,
+        task_callback=task_callback,
+    )
+    started = time.perf_counter()
+    output = crew.kickoff(inputs=inputs).tasks_output[0]
+    return output, time.perf_counter() - started
+
+
+# Deterministic inputs computed from earlier outputs just before a step runs
+_STEP_INPUTS: Dict[str, Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]]] = {
+    "symptom_analysis": coded_symptom_inputs,
+    "drug_safety_check": allergy_screen_inputs,
+}
+
+
+def _step_inputs(name: str, inputs: Dict[str, Any], outputs: Dict[str, str]) -> Dict[str, Any]:
+    hook = _STEP_INPUTS.get(name)
+    return {**inputs, **hook(inputs, outputs)} if hook else inputs
+
+
+_speculation_executor: Optional[ThreadPoolExecutor] = None
+_speculation_executor_lock = threading.Lock()
+
+
+def _get_speculation_executor() -> ThreadPoolExecutor:
+    global _speculation_executor
+    with _speculation_executor_lock:
+        if _speculation_executor is None:
+            _speculation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculate")
+        return _speculation_executor
+
+
+def _settle_speculation(
+    spec: SpeculationSpec,
+    future: Future,
+    upstream_text: str,
+    inputs: Dict[str, Any],
+) -> Optional[TaskOutput]:
+    """Wait for a speculative step and keep it only if it survives validation"""
+    waited_from = time.perf_counter()
+    try:
+        output, elapsed = future.result()
+    except Exception as e:
+        output, elapsed, hit, reason = None, 0.0, False, f"speculative run failed: {e}"
+    else:
+        hit, reason = spec.validate(upstream_text, output.raw, inputs)
+    wait_s = time.perf_counter() - waited_from
+    # A hit hides the step's runtime except for the final wait; a miss costs the wait
+    saved_s = elapsed - wait_s if hit else -wait_s
+    speculation_stats.record(hit, saved_s)
+    trace = current_trace()
+    if trace is not None:
+        trace.speculation.append(
+            {"target": spec.target, "hit": hit, "reason": reason, "saved_s": round(saved_s, 3)}
+        )
+    logger.info(
+        "Speculative %s %s (%s); saved %.2fs",
+        spec.target, "kept" if hit else "discarded", reason, saved_s,
+    )
+    return output if hit else None
+
+
+def _run_fused(
+    steps: List[Tuple[str, Any, Task]],
+    shells: List[Task],
+    agents: list,
+    inputs: Dict[str, Any],
+    verbose: bool,
+    delegation: bool,
+) -> Dict[str, TaskOutput]:
+    """Run several light steps as one fused task and split the answer per step.
+
+    A step whose section is missing from the answer is rerun on its own, so
+    every step still gets a real output.
+    """
+    fused = fuse_tasks(steps)
+    output, elapsed = _run_step(fused, shells, [*agents, fused.agent], inputs, verbose, None, delegation=delegation)
+    sections = split_fused_output(output.raw, [name for name, _, _ in steps])
+    logger.info("Fused %s in %.2fs", ", ".join(name for name, _, _ in steps), elapsed)
+    results: Dict[str, TaskOutput] = {}
+    shells = list(shells)
+    for name, agent, task in steps:
+        if name in sections:
+            results[name] = TaskOutput(
+                description=task.description,
+                expected_output=task.expected_output,
+                agent=str(getattr(agent, "role", "")),
+                raw=sections[name],
+            )
+        else:
+            logger.warning("Fused answer had no %s section; running it separately", name)
+            results[name], _ = _run_step(task, shells, agents, inputs, verbose, None, delegation=delegation)
+        shells.append(_context_shell(task, results[name]))
+    return results
+
+
+def _record_failure(
+    checkpoints: CheckpointStore,
+    key: Optional[str],
+    state: Dict[str, Any],
+    error: BaseException,
+    name: str,
+    position: int,
+    total: int,
+    checkpointed: int,
+) -> None:
+    if not key:
+        return
+    state["status"] = "failed"
+    state["failed_step"] = name
+    state["error"] = f"{type(error).__name__}: {error}"
+    checkpoints.save(key, state)
+    logger.warning(
+        "Case %s stopped at step %d/%d (%s); %d step(s) checkpointed",
+        key, position + 1, total, name, checkpointed,
+    )
+
+
+def run_plan(
+    inputs: Dict[str, Any],
+    include_imaging: bool = False,
+    verbose: bool = False,
+    key: Optional[str] = None,
+    checkpoints: Optional[CheckpointStore] = None,
+    speculative: bool = SPECULATIVE_EXECUTION,
+    conditional: bool = CONDITIONAL_TASKS,
+    profile: str = CREW_PROFILE,
+) -> PlanResult:
+    """Run the diagnosis plan one task at a time, checkpointing each output.
+
+    Each step is a single-task crew whose context is the earlier outputs,
+    which is what the sequential crew passes anyway. With a ``key`` the
+    outputs are checkpointed as they complete; a later call with the same
+    key resumes at the first unfinished task and exceptions leave the
+    checkpoint in place.
+
+    With ``speculative`` a downstream task listed in SPECULATIONS starts
+    alongside its upstream task on provisional inputs, and its output is
+    used only if it validates against the real upstream output.
+
+    With ``conditional`` steps whose RUN_CONDITIONS are not met are skipped;
+    they leave a short placeholder output and are listed under "Skipped
+    Steps" at the end of the report.
+
+    The active RunTrace's budget applies across all steps: past its soft
+    limit steps run without delegation, and once the hard limit is hit the
+    remaining steps get marked partial outputs instead of running. The
+    checkpoint of the finished steps is kept so the case can be resumed.
+
+    ``profile`` selects the plan; under "fast" the steps of a FUSED_STEPS
+    group that need to run are answered by one fused task whose sections
+    become the steps' individual outputs.
+    """
+    plan = diagnosis_plan(include_imaging, profile)
+    names = [name for name, _, _ in plan]
+    agents = [agent for _, agent, _ in plan]
+    checkpoints = checkpoints or CheckpointStore()
+
+    state = checkpoints.load(key) if key else None
+    if state is None or state.get("plan") != names:
+        state = {
+            "case_key": key,
+            "plan": names,
+            "inputs": inputs,
+            "include_imaging": include_imaging,
+            "profile": profile,
+            "completed": [],
+            "status": "running",
+        }
+    completed = [_load_output(data) for data in state["completed"]]
+    skipped = [{"name": data["name"], "reason": data["skipped"]} for data in state["completed"] if data.get("skipped")]
+    resumed_from = len(completed)
+    if resumed_from:
+        logger.info("Resuming case %s at step %d/%d (%s)", key, resumed_from + 1, len(plan), names[resumed_from])
+        trace = current_trace()
+        if trace is not None:
+            trace.restore_tasks(
+                [TaskRecord(data["name"], data["agent"], data["raw"], data["duration_s"]) for data in state["completed"]]
+            )
+    trace = current_trace()
+    if trace is not None:
+        trace.task_names = names
+    shells = [_context_shell(task, output) for (_, _, task), output in zip(plan, completed)]
+
+    in_flight: Dict[str, Tuple[SpeculationSpec, Future]] = {}
+    partial_from: Optional[int] = None
+    budget_reason = ""
+    position = resumed_from
+    while position < len(plan):
+        name, _, task = plan[position]
+        level, budget_reason = _budget_status()
+        if level == HARD:
+            partial_from = position
+            break
+        spec = launchable(names, position) if speculative and level == OK else None
+        if spec is not None and spec.target not in in_flight:
+            outputs = {step_name: output.raw for step_name, output in zip(names, completed)}
+            overrides = spec.provisional(inputs, outputs)
+            target_inputs = _step_inputs(spec.target, {**inputs, **overrides}, outputs)
+            target_task = plan[names.index(spec.target)][2]
+            # Outside the trace's task order, so no task_callback; recorded if kept
+            future = _get_speculation_executor().submit(
+                contextvars.copy_context().run,
+                _run_step, target_task, list(shells), agents, target_inputs, verbose, None,
+            )
+            in_flight[spec.target] = (spec, future)
+
+        started = time.perf_counter()
+        outputs = {step_name: output.raw for step_name, output in zip(names, completed)}
+        group = plan[position : position + max(1, len(fusion_group(profile, names, position)))]
+        reasons: Dict[str, str] = {}
+        for step_name, _, _ in group:
+            needed, reason = should_run(step_name, inputs, outputs) if conditional else (True, "")
+            if not needed:
+                reasons[step_name] = reason
+                in_flight.pop(step_name, None)
+        to_run = [step for step in group if step[0] not in reasons]
+        # Steps whose output the crew's task_callback has already recorded
+        recorded = set()
+        results: Dict[str, TaskOutput] = {}
+        try:
+            if len(to_run) > 1:
+                results = _run_fused(
+                    to_run, shells, agents, _step_inputs(name, inputs, outputs), verbose, delegation=level != SOFT
+                )
+            elif to_run:
+                run_name, _, run_task = to_run[0]
+                output = None
+                if run_name in in_flight:
+                    spec, future = in_flight.pop(run_name)
+                    upstream_text = completed[names.index(spec.upstream)].raw
+                    output = _settle_speculation(spec, future, upstream_text, inputs)
+                if output is None:
+                    output, _ = _run_step(
+                        run_task,
+                        shells,
+                        agents,
+                        _step_inputs(run_name, inputs, outputs),
+                        verbose,
+                        delegation=level != SOFT,
+                    )
+                    recorded.add(run_name)
+                results[run_name] = output
+        except BudgetExceeded as e:
+            partial_from, budget_reason = position, str(e)
+            break
+        except Exception as e:
+            # Agent executors may wrap the BudgetExceeded raised inside a step
+            if _budget_status()[0] != HARD:
+                _record_failure(checkpoints, key, state, e, name, position, len(plan), len(completed))
+                raise
+            partial_from, budget_reason = position, _budget_status()[1]
+            break
+        except BaseException as e:
+            _record_failure(checkpoints, key, state, e, name, position, len(plan), len(completed))
+            raise
+
+        for step_name, _, step_task in group:
+            reason = reasons.get(step_name)
+            if reason is not None:
+                output = _skipped_output(step_task, step_name, reason)
+                skipped.append({"name": step_name, "reason": reason})
+                logger.info("Skipping %s: %s", step_name, reason)
+            else:
+                output = results[step_name]
+            if step_name not in recorded:
+                on_task_completed(output)
+            completed.append(output)
+            shells.append(_context_shell(step_task, output))
+            if key:
+                finished = time.perf_counter()
+                state["completed"].append(
+                    _dump_output(step_name, output, 0.0 if reason else round(finished - started, 3), skipped=reason)
+                )
+                started = finished
+                state["status"] = "running"
+        if key:
+            checkpoints.save(key, state)
+        position += len(group)
+
+    partial: List[Dict[str, str]] = []
+    if partial_from is not None:
+        reason = budget_reason if budget_reason.startswith("run budget") else f"run budget exhausted ({budget_reason})"
+        final_text = completed[-1].raw if completed else ""
+        for name, _, task in plan[partial_from:]:
+            output = _partial_output(task, name, reason)
+            on_task_completed(output)
+            completed.append(output)
+            partial.append({"name": name, "reason": reason})
+        logger.warning("Run stopped at step %d/%d (%s): %s", partial_from + 1, len(plan), names[partial_from], reason)
+        if key:
+            state["status"] = "budget_exhausted"
+            state["failed_step"] = names[partial_from]
+            state["error"] = reason
+            checkpoints.save(key, state)
+    else:
+        final_text = completed[-1].raw
+        if key:
+            checkpoints.discard(key)
+    return PlanResult(
+        raw=_with_skipped_section(_with_partial_section(final_text, partial), skipped),
+        tasks_output=completed,
+        resumed_from=resumed_from,
+        skipped=skipped,
+        partial=partial,
+    )
+
+
+_BENCH_CASES = (
+    ("sore throat and mild fever for two days", "age 24, female", "", "", ""),
+    ("chest tightness on exertion, short of breath", "age 61, male", "hypertension, smoker", "lisinopril", ""),
+    ("burning urination and frequency", "age 35, female", "", "", "penicillin"),
+)
+
+
+def bench_profiles(cases: int = 3, profiles: Tuple[str, ...] = ("full", "fast")) -> Dict[str, Dict[str, float]]:
+    """Latency, LLM calls and estimated tokens per case for each crew profile (real LLM calls)"""
+    from .intake import build_inputs
+    from .trace import RunTrace
+
+    results = {}
+    for profile in profiles:
+        durations, calls, tokens = [], [], []
+        for index in range(cases):
+            inputs = build_inputs(*_BENCH_CASES[index % len(_BENCH_CASES)])
+            with RunTrace() as trace:
+                run_plan(inputs, profile=profile, speculative=False)
+            durations.append(trace.duration_s)
+            calls.append(trace.llm_calls)
+            tokens.append(trace.llm_tokens)
+        results[profile] = {
+            "cases": cases,
+            "mean_s": round(sum(durations) / cases, 2),
+            "max_s": round(max(durations), 2),
+            "mean_llm_calls": round(sum(calls) / cases, 2),
+            "mean_tokens": round(sum(tokens) / cases),
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m health_crew.runner")
+    commands = parser.add_subparsers(dest="command")
+    bench_cmd = commands.add_parser("bench", help="Compare crew profiles for latency and tokens")
+    bench_cmd.add_argument("--cases", type=int, default=3)
+    bench_cmd.add_argument("--profiles", nargs="+", default=["full", "fast"])
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(bench_profiles(args.cases, tuple(args.profiles)), indent=2))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,47 @@
 from typing import Dict, Any
 from crewai.tools import tool
+from .formulary import get_formulary
+from .tool_memo import run_memoized
 from .utils.logging import get_logger
 
 logger = get_logger(__name__)
 
 
 @tool("validate_medical_recommendation")
-def validate_medical_recommendation(recommendation: Dict[str, Any]) -> bool:
-    """Validate medical recommendations against safety protocols.
-    Checks include:
-    - Contraindications
-    - Dosage limits
-    - Interaction warnings
-    - Clinical guideline compliance
-
-    Returns True if passes basic validation; False otherwise.
+@run_memoized
+def validate_medical_recommendation(recommendation: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate recommended medication doses against the local formulary.
+
+    Input: {"medications": [{"name", "dose_mg", "frequency" (e.g. "BID",
+    "q6h" or doses per day) or "daily_dose_mg"}], "patient": {"age",
+    "weight_kg", "crcl_ml_min"}}. Unknown patient values are never assumed:
+    a dose above every band that could apply is flagged, and one that an
+    age-, weight- or renal-specific band could reject is flagged
+    "unverifiable" with the values it requires. Frequency ranges ("q4-6h")
+    count at their most frequent; a missing or unrecognized frequency makes
+    the daily maximum unverifiable rather than assuming once daily.
+
+    Checks single-dose and daily maximums, usual minimums and
+    population contraindications (age, weight and renal bands).
+
+    Returns {"passed", "checked", "violations"} where each violation names
+    the drug, a code and a message; if validation itself fails the result
+    also carries "status": "error".
     """
     try:
-        meds = recommendation.get("medications", [])
-        for med in meds:
-            dose = med.get("dose_mg")
-            if dose and dose < 0:
-                logger.warning("Invalid negative dosage detected: %s", med)
-                return False
-        # Stub: Always pass basic validation in demo
-        return True
+        meds = recommendation.get("medications", []) or []
+        results = get_formulary().validate(meds, recommendation.get("patient") or {})
+        violations = [violation for item in results for violation in item]
+        if violations:
+            logger.warning("Dose validation flagged %d issue(s): %s", len(violations), [v["code"] for v in violations])
+        return {"passed": not violations, "checked": len(meds), "violations": violations}
     except Exception as e:
         logger.exception("Validation error: %s", e)
-        return False
+        return {"status": "error", "passed": False, "checked": 0, "violations": [{"code": "error", "message": str(e)}]}
 
 
 @tool("emergency_alert_system")
+@run_memoized
 def emergency_alert_system(condition: str) -> str:
     """Alert human physicians for emergency conditions (stub).
     In production, integrate with paging/alerting systems.
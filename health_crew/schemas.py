@@ -0,0 +1,159 @@
+"""
+Typed structured outputs exchanged between tools and agents
+"""
+import json
+import re
+from typing import Any, Dict, List, Literal
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+Severity = Literal["Normal", "Mild", "Moderate", "Severe"]
+SEVERITY_LEVELS = ("Normal", "Mild", "Moderate", "Severe")
+
+
+# Other wordings models use, folded onto SEVERITY_LEVELS
+_SEVERITY_SYNONYMS = {
+    "none": "Normal",
+    "unremarkable": "Normal",
+    "negative": "Normal",
+    "low": "Mild",
+    "minor": "Mild",
+    "minimal": "Mild",
+    "medium": "Moderate",
+    "intermediate": "Moderate",
+    "high": "Severe",
+    "critical": "Severe",
+    "urgent": "Severe",
+    "emergent": "Severe",
+    "life-threatening": "Severe",
+}
+
+
+def _normalize_severity(value: Any) -> str:
+    """Severity level for a model's wording; anything unrecognized is treated as Severe, never downgraded"""
+    text = str(value or "").strip().lower()
+    for level in SEVERITY_LEVELS:
+        if text == level.lower():
+            return level
+    if text in _SEVERITY_SYNONYMS:
+        return _SEVERITY_SYNONYMS[text]
+    logger.warning("Unrecognized severity %r treated as Severe", value)
+    return "Severe"
+
+
+class ImageType(BaseModel):
+    modality: str = ""
+    region: str = ""
+    quality: str = ""
+
+
+class Finding(BaseModel):
+    observation: str
+    severity: Severity = "Normal"
+
+    @field_validator("severity", mode="before")
+    @classmethod
+    def _coerce_severity(cls, value: Any) -> str:
+        return _normalize_severity(value)
+
+
+class Assessment(BaseModel):
+    primary_diagnosis: str = ""
+    confidence: str = ""
+    differentials: List[str] = Field(default_factory=list)
+    critical_flags: List[str] = Field(default_factory=list)
+
+
+class ImagingFindings(BaseModel):
+    """Structured result of a single medical image analysis"""
+
+    image_type: ImageType = Field(default_factory=ImageType)
+    findings: List[Finding] = Field(default_factory=list)
+    assessment: Assessment = Field(default_factory=Assessment)
+    patient_explanation: str = ""
+    severity: Severity = "Normal"
+
+    @field_validator("severity", mode="before")
+    @classmethod
+    def _coerce_severity(cls, value: Any) -> str:
+        return _normalize_severity(value)
+
+    def compact(self) -> Dict[str, Any]:
+        """Fields passed on to downstream agents"""
+        return {
+            "severity": self.severity,
+            "critical_flags": list(self.assessment.critical_flags),
+            "primary_diagnosis": self.assessment.primary_diagnosis,
+            "confidence": self.assessment.confidence,
+        }
+
+
+# Gemini response schema (OpenAPI subset) mirroring ImagingFindings
+_STRING = {"type": "STRING"}
+_SEVERITY = {"type": "STRING", "enum": list(SEVERITY_LEVELS)}
+IMAGING_FINDINGS_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "image_type": {
+            "type": "OBJECT",
+            "properties": {"modality": _STRING, "region": _STRING, "quality": _STRING},
+        },
+        "findings": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"observation": _STRING, "severity": _SEVERITY},
+                "required": ["observation", "severity"],
+            },
+        },
+        "assessment": {
+            "type": "OBJECT",
+            "properties": {
+                "primary_diagnosis": _STRING,
+                "confidence": {"type": "STRING", "enum": ["Low", "Medium", "High"]},
+                "differentials": {"type": "ARRAY", "items": _STRING},
+                "critical_flags": {"type": "ARRAY", "items": _STRING},
+            },
+            "required": ["primary_diagnosis", "confidence", "critical_flags"],
+        },
+        "patient_explanation": _STRING,
+        "severity": _SEVERITY,
+    },
+    "required": ["image_type", "findings", "assessment", "severity"],
+}
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _repair_json(text: str) -> Any:
+    """Best-effort recovery of a JSON object from a model reply"""
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON object found in model reply")
+    candidate = text[start:end + 1].translate(_SMART_QUOTES)
+    candidate = _TRAILING_COMMA_RE.sub(r"\1", candidate)
+    return json.loads(candidate)
+
+
+def parse_imaging_findings(text: str) -> ImagingFindings:
+    """Parse a model reply into ImagingFindings.
+
+    Schema-constrained replies validate in a single pass; fenced or slightly
+    malformed JSON goes through a repair step first. Raises ValueError if the
+    reply cannot be recovered.
+    """
+    try:
+        return ImagingFindings.model_validate_json(text)
+    except ValidationError:
+        pass
+    try:
+        return ImagingFindings.model_validate(_repair_json(text))
+    except (ValidationError, json.JSONDecodeError) as e:
+        raise ValueError(f"Unparseable imaging findings: {e}") from e
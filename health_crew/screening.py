@@ -0,0 +1,292 @@
+"""
+Batch drug-interaction screening of many medication lists with bitsets
+
+    python -m health_crew.screening screen ward.csv [--json] [--min-severity moderate]
+    python -m health_crew.screening bench --patients 10000
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .allergy import SEVERITY_RANK, AllergyIndex, get_allergy_index
+from .conditions import normalize_medications
+from .config import INTERACTIONS_PATH
+from .formulary import get_formulary, normalize_drug_name
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Distinct medication strings whose vocabulary position is remembered per matrix
+_RESOLVE_CACHE_SIZE = 65536
+
+
+@dataclass(frozen=True)
+class InteractionHit:
+    """An interacting pair of drugs on one medication list"""
+
+    drug_a: str
+    drug_b: str
+    severity: str
+    note: str
+
+
+@dataclass
+class PatientScreen:
+    patient_id: str
+    medications: List[str]
+    unrecognized: List[str] = field(default_factory=list)
+    hits: List[InteractionHit] = field(default_factory=list)
+
+    @property
+    def severity(self) -> str:
+        return self.hits[0].severity if self.hits else "none"
+
+
+class InteractionMatrix:
+    """Pairwise interactions over a fixed drug vocabulary, as a packed bitmatrix.
+
+    Rows of interactions.csv may name drugs or drug classes from the
+    allergy hierarchy; a class expands to every drug under it. Only the
+    upper triangle (a < b) is set, so each pair is found once. A medication
+    list becomes a bitset over the vocabulary, and screening a batch is a
+    pass over the vocabulary, each step one AND of every patient's bitset
+    with that drug's row.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Iterable[str],
+        interactions: Sequence[Dict[str, str]],
+        hierarchy: Optional[AllergyIndex] = None,
+    ):
+        self.hierarchy = hierarchy
+        names = set(vocabulary)
+        expanded: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        rows = [(row, self._expand(row["drug_a"]), self._expand(row["drug_b"])) for row in interactions]
+        # Broad class rows first, so a drug-specific row's note wins at equal severity
+        rows.sort(key=lambda item: -len(item[1]) * len(item[2]))
+        for row, drugs_a, drugs_b in rows:
+            severity, note = row["severity"].strip().lower(), (row.get("note") or "").strip()
+            for drug_a in drugs_a:
+                for drug_b in drugs_b:
+                    if drug_a == drug_b:
+                        continue
+                    pair = (min(drug_a, drug_b), max(drug_a, drug_b))
+                    current = expanded.get(pair)
+                    if current is None or SEVERITY_RANK[severity] >= SEVERITY_RANK[current[0]]:
+                        expanded[pair] = (severity, note)
+                    names.update(pair)
+        self.vocabulary: List[str] = sorted(names)
+        self.index: Dict[str, int] = {name: position for position, name in enumerate(self.vocabulary)}
+        size = len(self.vocabulary)
+        adjacency = np.zeros((size, size), dtype=bool)
+        self._details: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        for (drug_a, drug_b), details in expanded.items():
+            first, second = sorted((self.index[drug_a], self.index[drug_b]))
+            adjacency[first, second] = True
+            self._details[(first, second)] = details
+        self.adjacency = np.packbits(adjacency, axis=1)
+        # Drugs with at least one partner; the screen only visits these rows
+        self._active = np.flatnonzero(adjacency.any(axis=1))
+        # Bounded, since ward lists carry free-text entries without limit
+        self.resolve = lru_cache(maxsize=_RESOLVE_CACHE_SIZE)(self._resolve)
+        self.positions = lru_cache(maxsize=_RESOLVE_CACHE_SIZE)(self._positions)
+
+    def _expand(self, name: str) -> Tuple[str, ...]:
+        key = normalize_drug_name(name)
+        if self.hierarchy is not None:
+            node = self.hierarchy.resolve(name)
+            if node is not None:
+                return self.hierarchy.members(node)
+        return (key,)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, hierarchy: Optional[AllergyIndex] = None) -> "InteractionMatrix":
+        hierarchy = hierarchy or get_allergy_index()
+        with open(path or INTERACTIONS_PATH, newline="", encoding="utf-8") as handle:
+            interactions = list(csv.DictReader(handle))
+        vocabulary = {node for node in hierarchy.nodes if hierarchy.members(node) == (node,)}
+        vocabulary.update(get_formulary().ingredients)
+        matrix = cls(vocabulary, interactions, hierarchy)
+        logger.info(
+            "Interaction matrix: %d drugs, %d interacting pairs", len(matrix.vocabulary), len(matrix._details)
+        )
+        return matrix
+
+    def _resolve(self, medication: str) -> Optional[int]:
+        """Vocabulary position of a free-text medication, or None"""
+        # Dose, unit and sig are stripped by normalize_drug_name; any trailing free text
+        # ("warfarin for af") falls back to the longest leading words that name a drug
+        words = normalize_drug_name(medication).split()
+        position = None
+        for size in range(len(words), 0, -1):
+            position = self._lookup(" ".join(words[:size]))
+            if position is not None:
+                break
+        return position
+
+    def _positions(self, medication: str) -> Tuple[int, ...]:
+        """Vocabulary positions of one entry; "a/b" is a combination product if it is named, else two drugs"""
+        if "/" in medication:
+            combination = self._lookup(normalize_drug_name(medication))
+            if combination is not None:
+                return (combination,)
+            parts = (self.resolve(part) for part in medication.split("/"))
+            return tuple(dict.fromkeys(position for position in parts if position is not None))
+        position = self.resolve(medication)
+        return () if position is None else (position,)
+
+    def _lookup(self, name: str) -> Optional[int]:
+        position = self.index.get(name)
+        if position is None and self.hierarchy is not None:
+            # Brand names ("Bactrim DS") resolve through the hierarchy's aliases
+            node = self.hierarchy.resolve(name)
+            position = self.index.get(node) if node is not None else None
+        return position
+
+    def encode(self, medication_lists: Sequence[Iterable[str]]) -> Tuple[np.ndarray, List[List[str]]]:
+        """Packed (patients x vocabulary) bitsets and each list's unrecognized entries"""
+        bits = np.zeros((len(medication_lists), len(self.vocabulary)), dtype=bool)
+        unrecognized: List[List[str]] = []
+        for row, medications in enumerate(medication_lists):
+            unknown = []
+            for medication in medications:
+                positions = self.positions(medication)
+                if not positions:
+                    unknown.append(medication)
+                for position in positions:
+                    bits[row, position] = True
+            unrecognized.append(unknown)
+        return np.packbits(bits, axis=1), unrecognized
+
+    def screen_bitsets(self, bitsets: np.ndarray) -> List[List[InteractionHit]]:
+        """Interaction hits for each packed bitset, most severe first"""
+        hits: List[List[InteractionHit]] = [[] for _ in range(len(bitsets))]
+        if not len(bitsets):
+            return hits
+        # Only drugs someone in the batch takes; for a single list that is a handful of rows
+        taken = np.unpackbits(np.bitwise_or.reduce(bitsets, axis=0), count=len(self.vocabulary)).astype(bool)
+        for drug in self._active[taken[self._active]]:
+            # Patients on this drug, then their other drugs that interact with it
+            holders = np.flatnonzero(bitsets[:, drug >> 3] & (0x80 >> (drug & 7)))
+            if not len(holders):
+                continue
+            overlap = bitsets[holders] & self.adjacency[drug]
+            flagged = np.flatnonzero(overlap.any(axis=1))
+            if not len(flagged):
+                continue
+            partners = np.unpackbits(overlap[flagged], axis=1, count=len(self.vocabulary))
+            for row, partner in zip(*np.nonzero(partners)):
+                severity, note = self._details[(int(drug), int(partner))]
+                hits[holders[flagged[row]]].append(
+                    InteractionHit(self.vocabulary[drug], self.vocabulary[partner], severity, note)
+                )
+        for patient_hits in hits:
+            patient_hits.sort(key=lambda hit: -SEVERITY_RANK[hit.severity])
+        return hits
+
+    def screen(self, medication_lists: Sequence[Iterable[str]]) -> List[List[InteractionHit]]:
+        bitsets, _ = self.encode(medication_lists)
+        return self.screen_bitsets(bitsets)
+
+    def check(self, medications: Iterable[str]) -> List[InteractionHit]:
+        """Hits for a single medication list"""
+        return self.screen([list(medications)])[0]
+
+
+def screen_ward(
+    patients: Sequence[Tuple[str, str]], matrix: Optional[InteractionMatrix] = None
+) -> List[PatientScreen]:
+    """Screen (patient_id, medications text) pairs in one batch"""
+    matrix = matrix or get_interaction_matrix()
+    medication_lists = [sorted(normalize_medications(text)) for _, text in patients]
+    bitsets, unrecognized = matrix.encode(medication_lists)
+    hits = matrix.screen_bitsets(bitsets)
+    return [
+        PatientScreen(patient_id, medications, unknown, patient_hits)
+        for (patient_id, _), medications, unknown, patient_hits in zip(patients, medication_lists, unrecognized, hits)
+    ]
+
+
+def read_ward(path: str) -> List[Tuple[str, str]]:
+    """(patient_id, medications) rows from a CSV with those columns; "-" reads stdin"""
+    handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        return [(row["patient_id"], row.get("medications") or "") for row in csv.DictReader(handle)]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+@lru_cache(maxsize=1)
+def get_interaction_matrix() -> InteractionMatrix:
+    """Matrix loaded once from INTERACTIONS_PATH over the drug-class and formulary vocabulary"""
+    return InteractionMatrix.load()
+
+
+def bench(patients: int = 10000, medications: int = 8, seed: int = 0) -> Dict[str, float]:
+    """Time encoding and screening a synthetic ward of random medication lists with sigs"""
+    matrix = get_interaction_matrix()
+    rng = np.random.default_rng(seed)
+    names = np.array(matrix.vocabulary)
+    sigs = np.array(["daily", "BID", "TID", "q6h prn", "qhs"])
+    doses = np.array([5, 10, 25, 50, 81, 100, 250, 400, 500])
+
+    def entry() -> str:
+        # Ward lists carry a dose and sig on every line
+        return ", ".join(
+            f"{name} {rng.choice(doses)} mg {rng.choice(sigs)}"
+            for name in names[rng.choice(len(names), size=medications, replace=False)]
+        )
+
+    ward = [(f"P{index:06d}", entry()) for index in range(patients)]
+    started = time.perf_counter()
+    results = screen_ward(ward, matrix)
+    elapsed = time.perf_counter() - started
+    return {
+        "patients": patients,
+        "medications_per_patient": medications,
+        "vocabulary": len(matrix.vocabulary),
+        "seconds": round(elapsed, 3),
+        "patients_with_hits": sum(1 for result in results if result.hits),
+        "hits": sum(len(result.hits) for result in results),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m health_crew.screening")
+    commands = parser.add_subparsers(dest="command")
+    screen_cmd = commands.add_parser("screen", help="Screen a ward CSV (patient_id, medications)")
+    screen_cmd.add_argument("path", help='CSV file, or "-" for stdin')
+    screen_cmd.add_argument("--json", action="store_true", help="One JSON object per patient")
+    screen_cmd.add_argument("--min-severity", choices=tuple(SEVERITY_RANK), default="low")
+    bench_cmd = commands.add_parser("bench", help="Screen a synthetic ward and report the time")
+    bench_cmd.add_argument("--patients", type=int, default=10000)
+    bench_cmd.add_argument("--medications", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(bench(args.patients, args.medications), indent=2))
+    elif args.command == "screen":
+        threshold = SEVERITY_RANK[args.min_severity]
+        for result in screen_ward(read_ward(args.path)):
+            result.hits = [hit for hit in result.hits if SEVERITY_RANK[hit.severity] >= threshold]
+            if args.json:
+                print(json.dumps({**asdict(result), "severity": result.severity}))
+                continue
+            print(f"{result.patient_id}: {result.severity} ({len(result.hits)} interaction(s))")
+            for hit in result.hits:
+                print(f"  - {hit.severity.upper()}: {hit.drug_a} + {hit.drug_b} ({hit.note})")
+            if result.unrecognized:
+                print(f"  ? not in vocabulary: {', '.join(result.unrecognized)}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""
+Headless HTTP service running diagnosis crews on a pool of worker processes
+
+    python -m health_crew.server serve --port 8080 --workers 4
+    python -m health_crew.server bench --cases 64 --workers 4
+
+Endpoints:
+    POST /cases            submit a case (JSON); ``?wait=true[&timeout=s]`` blocks for the result
+    GET  /jobs/<id>        job status and result
+    GET  /healthz          liveness
+    GET  /readyz           readiness (503 while draining or saturated)
+    GET  /metrics          Prometheus text metrics
+"""
+import argparse
+import base64
+import json
+import os
+import signal
+import statistics
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from .config import (
+    SERVER_WORKERS,
+    SERVER_MAX_QUEUE,
+    SERVER_JOB_RETENTION_S,
+    SERVER_DRAIN_TIMEOUT_S,
+    FAKE_LLM_LATENCY_S,
+)
+from .analytics import record_rows
+from .intake import build_inputs
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_MAX_BODY_BYTES = 64 * 1024 * 1024
+_SYNC_WAIT_TIMEOUT_S = 900.0
+
+# ---------------------------------------------------------------------------
+# Worker process side
+# ---------------------------------------------------------------------------
+
+_worker_fake_llm = False
+
+
+def _init_worker(fake_llm: bool) -> None:
+    global _worker_fake_llm
+    _worker_fake_llm = fake_llm
+    # Let the parent handle SIGINT/SIGTERM and drain the pool in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _fake_kickoff(inputs: Dict[str, Any], include_imaging: bool) -> str:
+    """Stand-in for crew.kickoff that costs FAKE_LLM_LATENCY_S per task"""
+    tasks = 8 if include_imaging else 7
+    time.sleep(FAKE_LLM_LATENCY_S * tasks)
+    return (
+        f"## Symptom Analysis\nFake analysis of: {inputs['symptoms']}\n"
+        f"## Patient Instructions\nFake guidance for {inputs['demographics']}\n"
+    )
+
+
+def _run_case(inputs: Dict[str, Any], images: List[bytes]) -> Dict[str, Any]:
+    """Run one case inside a worker process"""
+    started = time.perf_counter()
+    include_imaging = bool(images)
+    if images:
+        from .image_store import register_image
+
+        # Held until the run returns so the tools can resolve every reference
+        handles = [register_image(data) for data in images]
+        inputs = {**inputs, "medical_image_path": ", ".join(handle.ref for handle in handles)}
+
+    row = None
+    if _worker_fake_llm:
+        text = _fake_kickoff(inputs, include_imaging)
+    else:
+        from .analytics import run_row
+        from .report import crew_output_text
+        from .runner import run_plan
+        from .trace import RunTrace
+        from .workflows import task_names
+
+        # Same plan runner as the app: per-step input hooks (coded symptoms, allergy screen),
+        # fresh template clones per case, and a budget that ends in a partial result
+        with RunTrace(task_names=task_names(include_imaging, profile="full")) as trace:
+            result = run_plan(inputs, include_imaging=include_imaging, profile="full")
+            text = crew_output_text(result)
+        row = run_row(
+            trace,
+            include_imaging=include_imaging,
+            partial=bool(result.partial),
+            skipped=len(result.skipped),
+            source="server",
+        )
+
+    return {
+        "result": text,
+        "include_imaging": include_imaging,
+        "duration_s": round(time.perf_counter() - started, 3),
+        "worker_pid": os.getpid(),
+        # Recorded by the parent, the dataset's single writer; not part of the job result
+        "analytics": row,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Parent process side
+# ---------------------------------------------------------------------------
+
+
+class BadRequest(ValueError):
+    """Client error in a submitted case"""
+
+
+def parse_wait(query: Dict[str, List[str]]) -> Optional[float]:
+    """Seconds ``?wait=true`` blocks for, or None to return 202 at once; checked before a job exists"""
+    if query.get("wait", ["false"])[0].lower() != "true":
+        return None
+    raw = query.get("timeout", [str(_SYNC_WAIT_TIMEOUT_S)])[0]
+    try:
+        timeout = float(raw)
+    except ValueError:
+        raise BadRequest(f"Invalid timeout: {raw!r}") from None
+    # Also rejects nan and inf, which compare false either way
+    if not 0 <= timeout <= _SYNC_WAIT_TIMEOUT_S:
+        raise BadRequest(f"'timeout' must be between 0 and {_SYNC_WAIT_TIMEOUT_S:g} seconds")
+    return timeout
+
+
+@dataclass
+class Job:
+    id: str
+    future: Future
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        if self.future.cancelled():
+            return "cancelled"
+        return "failed" if self.future.exception() is not None else "completed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+        if self.future.done() and not self.future.cancelled():
+            error = self.future.exception()
+            if error is not None:
+                body["error"] = str(error)
+            else:
+                body.update(self.future.result())
+        return body
+
+
+class CaseService:
+    """Job queue in front of a process pool running diagnosis crews"""
+
+    def __init__(self, workers: int = SERVER_WORKERS, fake_llm: bool = False, max_queue: int = SERVER_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.draining = False
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(fake_llm,)
+        )
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._durations: List[float] = []
+        self._duration_sum = 0.0
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def ready(self) -> bool:
+        return not self.draining and self.pending() < self.max_queue
+
+    @staticmethod
+    def parse_case(payload: Dict[str, Any]) -> Tuple[Dict[str, Any], List[bytes]]:
+        if not isinstance(payload, dict):
+            raise BadRequest("Body must be a JSON object")
+        if not payload.get("symptoms") or not payload.get("demographics"):
+            raise BadRequest("'symptoms' and 'demographics' are required")
+        try:
+            images = [base64.b64decode(data, validate=True) for data in payload.get("images") or []]
+        except (TypeError, ValueError) as e:
+            raise BadRequest(f"Invalid base64 image: {e}") from e
+        inputs = build_inputs(
+            str(payload["symptoms"]),
+            str(payload["demographics"]),
+            str(payload.get("history") or ""),
+            str(payload.get("medications") or ""),
+            str(payload.get("allergies") or ""),
+            imaging_combined=bool(payload.get("imaging_combined")),
+        )
+        return inputs, images
+
+    def submit(self, payload: Dict[str, Any]) -> Optional[Job]:
+        """Queue a case; returns None if the service cannot accept it"""
+        inputs, images = self.parse_case(payload)
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.future.done())
+            if self.draining or pending >= self.max_queue:
+                self._counters["rejected"] += 1
+                return None
+            job = Job(id=uuid.uuid4().hex, future=self._executor.submit(_run_case, inputs, images))
+            self._jobs[job.id] = job
+            self._counters["submitted"] += 1
+        job.future.add_done_callback(lambda _future, job=job: self._finished(job))
+        return job
+
+    def _finished(self, job: Job) -> None:
+        job.finished_at = time.time()
+        row = None
+        with self._lock:
+            if job.future.cancelled():
+                self._counters["failed"] += 1
+            elif job.future.exception() is None:
+                row = job.future.result().pop("analytics", None)
+                self._counters["completed"] += 1
+                duration = job.finished_at - job.submitted_at
+                self._duration_sum += duration
+                self._durations.append(duration)
+                del self._durations[:-1000]
+            else:
+                self._counters["failed"] += 1
+                logger.error("Job %s failed: %s", job.id, job.future.exception())
+            self._prune(job.finished_at)
+        if row is not None:
+            record_rows([row])
+
+    def _prune(self, now: float) -> None:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > SERVER_JOB_RETENTION_S
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def metrics_text(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            durations = sorted(self._durations)
+            duration_sum = self._duration_sum
+            jobs = list(self._jobs.values())
+        states = {"queued": 0, "running": 0}
+        for job in jobs:
+            status = job.status
+            if status in states:
+                states[status] += 1
+        lines = [
+            "# TYPE health_crew_jobs_total counter",
+            *(f'health_crew_jobs_total{{outcome="{name}"}} {value}' for name, value in counters.items()),
+            "# TYPE health_crew_jobs gauge",
+            *(f'health_crew_jobs{{state="{name}"}} {value}' for name, value in states.items()),
+            "# TYPE health_crew_workers gauge",
+            f"health_crew_workers {self.workers}",
+            "# TYPE health_crew_draining gauge",
+            f"health_crew_draining {int(self.draining)}",
+            "# TYPE health_crew_job_duration_seconds summary",
+        ]
+        for quantile in (0.5, 0.95, 0.99):
+            value = durations[min(len(durations) - 1, int(quantile * len(durations)))] if durations else 0.0
+            lines.append(f'health_crew_job_duration_seconds{{quantile="{quantile}"}} {value:.4f}')
+        lines.append(f"health_crew_job_duration_seconds_sum {duration_sum:.4f}")
+        lines.append(f"health_crew_job_duration_seconds_count {counters['completed']}")
+        return "\n".join(lines) + "\n"
+
+    def drain(self, timeout: float = SERVER_DRAIN_TIMEOUT_S) -> None:
+        """Stop accepting cases and wait for queued and running ones to finish"""
+        self.draining = True
+        logger.info("Draining: waiting up to %.0fs for %d job(s)", timeout, self.pending())
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self._executor.shutdown(wait=not self.pending(), cancel_futures=True)
+
+
+class CaseRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HealthCrew/1.0"
+
+    @property
+    def service(self) -> CaseService:
+        return self.server.service
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, body: Any, content_type: str = "application/json", headers: Optional[Dict[str, str]] = None) -> None:
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path.rstrip("/")
+        if path == "/healthz":
+            self._send(HTTPStatus.OK, {"status": "ok"})
+        elif path == "/readyz":
+            ready = self.service.ready()
+            self._send(
+                HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE,
+                {"ready": ready, "draining": self.service.draining, "pending": self.service.pending()},
+            )
+        elif path == "/metrics":
+            self._send(HTTPStatus.OK, self.service.metrics_text(), "text/plain; version=0.0.4")
+        elif path.startswith("/jobs/"):
+            job = self.service.get(path[len("/jobs/"):])
+            if job is None:
+                self._send(HTTPStatus.NOT_FOUND, {"error": "Unknown job"})
+            else:
+                self._send(HTTPStatus.OK, job.to_dict())
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/cases":
+            self._send(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > _MAX_BODY_BYTES:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": "Missing or oversized body"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+            timeout = parse_wait(parse_qs(url.query))
+            job = self.service.submit(payload)
+        except json.JSONDecodeError as e:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {e}"})
+            return
+        except BadRequest as e:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        if job is None:
+            self._send(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                {"error": "Service is draining or at capacity"},
+                headers={"Retry-After": "5"},
+            )
+            return
+
+        if timeout is not None:
+            try:
+                job.future.result(timeout=timeout)
+            except FutureTimeout:
+                pass
+            except Exception:
+                # Failures are reported in the job body below
+                pass
+            if job.future.done():
+                self._send(HTTPStatus.OK, job.to_dict())
+                return
+        job_url = f"/jobs/{job.id}"
+        self._send(
+            HTTPStatus.ACCEPTED,
+            {"job_id": job.id, "status": job.status, "job_url": job_url},
+            headers={"Location": job_url},
+        )
+
+
+def make_server(host: str, port: int, service: CaseService) -> ThreadingHTTPServer:
+    httpd = ThreadingHTTPServer((host, port), CaseRequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    return httpd
+
+
+def serve(host: str, port: int, workers: int, fake_llm: bool) -> None:
+    service = CaseService(workers=workers, fake_llm=fake_llm)
+    httpd = make_server(host, port, service)
+
+    def _shutdown(signum, _frame):
+        logger.info("Received signal %s, draining", signum)
+
+        def _drain_then_stop():
+            service.drain()
+            httpd.shutdown()
+
+        threading.Thread(target=_drain_then_stop, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    logger.info("Serving on http://%s:%d with %d worker process(es)%s", host, port, workers,
+                " (fake LLM)" if fake_llm else "")
+    httpd.serve_forever()
+    httpd.server_close()
+    logger.info("Server stopped")
+
+
+def bench(cases: int, concurrency: int, workers: int) -> Dict[str, float]:
+    """Benchmark the worker pool end to end over HTTP with the LLM faked"""
+    service = CaseService(workers=workers, fake_llm=True, max_queue=max(cases, SERVER_MAX_QUEUE))
+    httpd = make_server("127.0.0.1", 0, service)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/cases?wait=true"
+    body = json.dumps({"symptoms": "fever, cough", "demographics": "age 45, male"}).encode("utf-8")
+
+    def _one(_: int) -> float:
+        started = time.perf_counter()
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - started
+
+    _one(0)  # warm up the worker processes
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(_one, range(cases)))
+    elapsed = time.perf_counter() - started
+    httpd.shutdown()
+    service.drain(timeout=5)
+    return {
+        "cases": cases,
+        "workers": workers,
+        "fake_case_s": FAKE_LLM_LATENCY_S * 7,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_cases_per_s": round(cases / elapsed, 2),
+        "p50_s": round(statistics.median(latencies), 3),
+        "p95_s": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m health_crew.server")
+    commands = parser.add_subparsers(dest="command")
+    serve_cmd = commands.add_parser("serve", help="Run the HTTP service")
+    serve_cmd.add_argument("--host", default="0.0.0.0")
+    serve_cmd.add_argument("--port", type=int, default=8080)
+    serve_cmd.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    serve_cmd.add_argument("--fake-llm", action="store_true", help="Replace crew runs with a fixed delay")
+    bench_cmd = commands.add_parser("bench", help="Benchmark the worker pool with a fake LLM")
+    bench_cmd.add_argument("--cases", type=int, default=64)
+    bench_cmd.add_argument("--concurrency", type=int, default=16)
+    bench_cmd.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(bench(args.cases, args.concurrency, args.workers), indent=2))
+    elif args.command == "serve":
+        serve(args.host, args.port, args.workers, args.fake_llm)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
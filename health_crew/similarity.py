@@ -0,0 +1,292 @@
+"""
+Local embedding and nearest-neighbour lookup of earlier presentations
+"""
+import re
+import threading
+import zlib
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .coding import get_symptom_coder, normalize_text
+from .config import SIMILAR_CASE_THRESHOLD, SIMILAR_CASE_WARM_LIMIT
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Hashed feature space; 2**11 keeps collisions rare for short symptom lists
+DIMENSIONS = 1 << 11
+# Weight of demographic features relative to symptom features
+_DEMOGRAPHICS_WEIGHT = 0.35
+# Weight of a coded concept's present/absent feature
+_CONCEPT_WEIGHT = 1.5
+# Lower bounds of the age bands a match must share: infant, toddler, child, adolescent, adult, older adult
+_AGE_BANDS = (0, 1, 5, 12, 18, 65)
+_SEXES = {"male": 0, "boy": 0, "female": 1, "girl": 1}
+# Compact forms such as "45M" or "3 F"
+_AGE_SEX_RE = re.compile(r"\b(\d{1,3})\s*([mf])\b")
+UNKNOWN = -1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and the of with without for in on at to from or no not has have had patient pt "
+    "c/o complains complaining presents presenting since very mild some slight".split()
+)
+# Lay terms and abbreviations folded onto one clinical term
+_SYNONYMS = {
+    "tired": "fatigue",
+    "tiredness": "fatigue",
+    "exhausted": "fatigue",
+    "exhaustion": "fatigue",
+    "lethargic": "fatigue",
+    "lethargy": "fatigue",
+    "weary": "fatigue",
+    "feverish": "fever",
+    "pyrexia": "fever",
+    "febrile": "fever",
+    "temperature": "fever",
+    "coughing": "cough",
+    "sob": "dyspnea",
+    "breathless": "dyspnea",
+    "breathlessness": "dyspnea",
+    "dyspnoea": "dyspnea",
+    "headaches": "headache",
+    "cephalgia": "headache",
+    "nauseous": "nausea",
+    "nauseated": "nausea",
+    "vomiting": "vomit",
+    "emesis": "vomit",
+    "dizzy": "dizziness",
+    "lightheaded": "dizziness",
+    "vertigo": "dizziness",
+    "achy": "ache",
+    "aches": "ache",
+    "aching": "ache",
+    "painful": "pain",
+    "sore": "pain",
+    "diarrhoea": "diarrhea",
+    "runny": "rhinorrhea",
+    "m": "male",
+    "man": "male",
+    "f": "female",
+    "woman": "female",
+    "yo": "years",
+    "y": "years",
+    "yrs": "years",
+}
+# Multi-word lay phrases rewritten before tokenizing
+_PHRASES = {
+    "shortness of breath": "dyspnea",
+    "short of breath": "dyspnea",
+    "difficulty breathing": "dyspnea",
+    "trouble breathing": "dyspnea",
+    "high temperature": "fever",
+    "runny nose": "rhinorrhea",
+    "throwing up": "vomit",
+    "feeling sick": "nausea",
+    "light headed": "dizziness",
+}
+_PHRASE_RE = re.compile("|".join(re.escape(phrase) for phrase in sorted(_PHRASES, key=len, reverse=True)))
+_AGE_RE = re.compile(r"\b(?:age[d]?\s*)?(\d{1,3})\s*(?:y(?:ears?|rs?|o)?\b|-year)|\bage[d]?\s*(\d{1,3})\b")
+
+
+def _stem(token: str) -> str:
+    token = _SYNONYMS.get(token, token)
+    for suffix in ("ness", "ing", "es", "s"):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            token = token[: -len(suffix)]
+            break
+    return _SYNONYMS.get(token, token)
+
+
+def normalize_terms(text: str) -> List[str]:
+    """Lower-cased, synonym-folded, lightly stemmed tokens without stopwords"""
+    text = _PHRASE_RE.sub(lambda match: _PHRASES[match.group(0)], (text or "").lower())
+    return [
+        _stem(token)
+        for token in _TOKEN_RE.findall(text)
+        if token not in _STOPWORDS
+    ]
+
+
+def _add_feature(vector: np.ndarray, feature: str, weight: float) -> None:
+    h = zlib.crc32(feature.encode("utf-8"))
+    # The top bit picks the sign so collisions tend to cancel out
+    vector[h % DIMENSIONS] += weight if h & 0x80000000 == 0 else -weight
+
+
+def _symptom_features(vector: np.ndarray, text: str) -> None:
+    text = normalize_text(text)
+    coded = get_symptom_coder().code(text)
+    # Negated findings only count as absent concepts, so "no fever" shares nothing with "fever"
+    for start, end in sorted({(item.start, item.end) for item in coded if item.negated}, reverse=True):
+        text = text[:start] + " " * (end - start) + text[end:]
+    for item in coded:
+        _add_feature(vector, f"x:{item.code}:{'absent' if item.negated else 'present'}", _CONCEPT_WEIGHT)
+    terms = normalize_terms(text)
+    # Unigrams are order-free; sorted bigrams make "chest pain" match "pain in chest"
+    for term in terms:
+        _add_feature(vector, "s:" + term, 1.0)
+        for i in range(len(term) - 2):
+            _add_feature(vector, "c:" + term[i : i + 3], 0.2)
+    for first, second in zip(terms, terms[1:]):
+        _add_feature(vector, "b:" + "|".join(sorted((first, second))), 0.5)
+
+
+def demographic_key(text: str) -> Tuple[int, int]:
+    """(age band, sex) parsed from demographics text, UNKNOWN where not stated"""
+    lowered = (text or "").lower()
+    match = _AGE_RE.search(lowered)
+    compact = _AGE_SEX_RE.search(lowered)
+    age = match.group(1) or match.group(2) if match else compact.group(1) if compact else None
+    band = bisect_right(_AGE_BANDS, int(age)) - 1 if age is not None else UNKNOWN
+    sexes = {_SEXES[term] for term in normalize_terms(lowered) if term in _SEXES}
+    if compact:
+        sexes.add(_SEXES["male" if compact.group(2) == "m" else "female"])
+    sex = sexes.pop() if len(sexes) == 1 else UNKNOWN
+    return band, sex
+
+
+def _demographic_features(vector: np.ndarray, text: str) -> None:
+    lowered = (text or "").lower()
+    match = _AGE_RE.search(lowered)
+    if match:
+        age = int(match.group(1) or match.group(2))
+        # Neighbouring decades share a bucket feature so 44 and 47 still overlap
+        _add_feature(vector, f"age:{age // 10}", _DEMOGRAPHICS_WEIGHT)
+        _add_feature(vector, f"age5:{(age + 5) // 10}", _DEMOGRAPHICS_WEIGHT)
+    for term in normalize_terms(lowered):
+        if not term.isdigit() and term != "years" and term != "age":
+            _add_feature(vector, "d:" + term, _DEMOGRAPHICS_WEIGHT)
+
+
+def embed_case(symptoms: str, demographics: str = "") -> np.ndarray:
+    """Unit-length hashed bag-of-terms vector of a presentation"""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    _symptom_features(vector, symptoms)
+    _demographic_features(vector, demographics)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class SimilarCaseIndex:
+    """Embeddings of earlier presentations in one growable NumPy matrix.
+
+    A query is a single matrix-vector product; cosine similarity equals the
+    dot product because every row is unit length. Only cases with the same
+    age band and sex (both unknown counts as the same) are candidates, so an
+    analysis is never seeded from a different patient population.
+    """
+
+    def __init__(self, threshold: float = SIMILAR_CASE_THRESHOLD, capacity: int = 256):
+        self.threshold = threshold
+        self._matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self._keys = np.full((capacity, 2), UNKNOWN, dtype=np.int8)
+        self._payloads: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def add(self, symptoms: str, demographics: str, payload: Dict[str, Any]) -> None:
+        vector = embed_case(symptoms, demographics)
+        if not vector.any():
+            return
+        with self._lock:
+            size = len(self._payloads)
+            if size == self._matrix.shape[0]:
+                grown = np.zeros((size * 2, DIMENSIONS), dtype=np.float32)
+                grown[:size] = self._matrix
+                self._matrix = grown
+                keys = np.full((size * 2, 2), UNKNOWN, dtype=np.int8)
+                keys[:size] = self._keys
+                self._keys = keys
+            self._matrix[size] = vector
+            self._keys[size] = demographic_key(demographics)
+            self._payloads.append(payload)
+
+    def query(
+        self, symptoms: str, demographics: str = "", threshold: Optional[float] = None
+    ) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Most similar earlier case at or above the threshold, as (similarity, payload)"""
+        threshold = self.threshold if threshold is None else threshold
+        vector = embed_case(symptoms, demographics)
+        key = np.array(demographic_key(demographics), dtype=np.int8)
+        with self._lock:
+            self.queries += 1
+            size = len(self._payloads)
+            if size == 0 or not vector.any():
+                return None
+            scores = self._matrix[:size] @ vector
+            scores[(self._keys[:size] != key).any(axis=1)] = -np.inf
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if not np.isfinite(similarity):
+                logger.info("No earlier case in the same age band and sex; hit rate %d/%d", self.hits, self.queries)
+                return None
+            if similarity < threshold:
+                logger.info(
+                    "No similar case (best %.3f < %.2f); hit rate %d/%d",
+                    similarity, threshold, self.hits, self.queries,
+                )
+                return None
+            self.hits += 1
+            payload = self._payloads[best]
+        logger.info(
+            "Similar case %s matched at %.3f; hit rate %d/%d",
+            payload.get("case_id", "?"), similarity, self.hits, self.queries,
+        )
+        return similarity, payload
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cases": len(self._payloads),
+                "queries": self.queries,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.queries, 3) if self.queries else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+def similar_case_payload(record) -> Optional[Dict[str, Any]]:
+    """Index payload for a stored CaseRecord, or None without a symptom analysis"""
+    analysis = next((task.output for task in record.tasks if task.name == "symptom_analysis"), "")
+    if not analysis:
+        return None
+    return {
+        "case_id": record.case_id,
+        "created_at": record.created_at,
+        "symptoms": record.inputs.get("symptoms", ""),
+        "demographics": record.inputs.get("demographics", ""),
+        "symptom_analysis": analysis,
+    }
+
+
+def index_record(index: SimilarCaseIndex, record) -> None:
+    payload = similar_case_payload(record)
+    if payload is not None:
+        index.add(payload["symptoms"], payload["demographics"], payload)
+
+
+_index: Optional[SimilarCaseIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_similar_case_index() -> SimilarCaseIndex:
+    """Process-wide index, warmed from the most recent runs in the case store"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            from .store import get_case_store
+
+            index = SimilarCaseIndex()
+            try:
+                for record in reversed(get_case_store().recent(SIMILAR_CASE_WARM_LIMIT)):
+                    index_record(index, record)
+            except Exception as e:
+                logger.warning("Could not warm similar-case index from the case store: %s", e)
+            logger.info("Similar-case index warmed with %d case(s)", len(index))
+            _index = index
+        return _index
@@ -0,0 +1,184 @@
+"""
+Speculative execution of downstream tasks on provisional upstream results
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+# Common generic names; anything else is caught by the class suffixes below
+_KNOWN_DRUGS = frozenset(
+    """
+    acetaminophen paracetamol aspirin ibuprofen naproxen diclofenac celecoxib morphine oxycodone tramadol
+    codeine metformin insulin glipizide sitagliptin warfarin heparin apixaban rivaroxaban clopidogrel
+    digoxin amiodarone furosemide hydrochlorothiazide spironolactone prednisone prednisolone
+    dexamethasone hydrocortisone levothyroxine albuterol salbutamol montelukast amoxicillin penicillin
+    azithromycin doxycycline cephalexin ceftriaxone nitrofurantoin trimethoprim sulfamethoxazole
+    metronidazole vancomycin oseltamivir acyclovir valacyclovir sertraline fluoxetine citalopram
+    escitalopram bupropion trazodone lithium gabapentin pregabalin phenytoin carbamazepine valproate
+    levetiracetam lorazepam diazepam alprazolam haloperidol quetiapine olanzapine risperidone
+    ondansetron metoclopramide loratadine cetirizine diphenhydramine allopurinol colchicine
+    methotrexate sumatriptan nitroglycerin
+    """.split()
+)
+_DRUG_SUFFIX_RE = re.compile(
+    r"\b[a-z]{3,}(?:pril|sartan|olol|statin|dipine|prazole|tidine|floxacin|mycin|cillin|cycline|"
+    r"azole|vir|mab|nib|parin|gliptin|glitazone|triptan|setron|profen|oxacin)\b"
+)
+_WORD_RE = re.compile(r"[a-z]+")
+_CAUTION_LINE_RE = re.compile(r"^.*(?:contraindicat|avoid|allerg|intoleran|do not use|not recommended).*$", re.I | re.M)
+_LIST_ITEM_RE = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+(.+)$", re.M)
+# History findings that change drug choice or dose; a speculative plan that never mentions one did not account for it
+_TREATMENT_FACTORS = {
+    "renal impairment": re.compile(
+        r"\b(?:renal|kidney|ckd|egfr|crcl|creatinine clearance|dialysis|nephropathy)\b", re.I
+    ),
+    "hepatic impairment": re.compile(r"\b(?:hepatic|liver|cirrhosis|hepatitis)\b", re.I),
+    "pregnancy or lactation": re.compile(r"\b(?:pregnan\w*|trimester|breast-?feeding|lactat\w*)\b", re.I),
+    "QT prolongation": re.compile(r"\b(?:qtc?|long qt|torsades?)\b", re.I),
+    "bleeding risk": re.compile(r"\b(?:bleed\w*|haemorrhag\w*|hemorrhag\w*|anticoagula\w*)\b", re.I),
+}
+
+
+def extract_drug_names(text: str) -> FrozenSet[str]:
+    """Generic drug names mentioned in free text"""
+    lowered = (text or "").lower()
+    names = {word for word in _WORD_RE.findall(lowered) if word in _KNOWN_DRUGS}
+    names.update(_DRUG_SUFFIX_RE.findall(lowered))
+    return frozenset(names)
+
+
+def contraindicated_drugs(text: str) -> FrozenSet[str]:
+    """Drugs named on lines that flag a contraindication, allergy or caution"""
+    return extract_drug_names("\n".join(_CAUTION_LINE_RE.findall(text or "")))
+
+
+def differential_candidates(text: str, limit: int = 3) -> List[str]:
+    """First list items of a symptom analysis, taken as the leading differential"""
+    candidates = []
+    for item in _LIST_ITEM_RE.findall(text or ""):
+        name = re.split(r"[:(–—]| - ", item.replace("*", "").strip(), maxsplit=1)[0].strip()
+        if name and len(name) <= 80:
+            candidates.append(name)
+        if len(candidates) == limit:
+            break
+    return candidates
+
+
+@dataclass(frozen=True)
+class SpeculationSpec:
+    """Start ``target`` as soon as the steps before ``upstream`` are done.
+
+    ``provisional`` returns input overrides for the speculative run, built
+    from the outputs available at launch; ``validate`` decides once the
+    upstream output arrives whether the speculative output still holds.
+    """
+
+    target: str
+    upstream: str
+    provisional: Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]]
+    validate: Callable[[str, str, Dict[str, Any]], Tuple[bool, str]]
+
+
+def _treatment_provisional(inputs: Dict[str, Any], outputs: Dict[str, str]) -> Dict[str, Any]:
+    candidates = differential_candidates(outputs.get("symptom_analysis", ""))
+    return {"working_differential": "; ".join(candidates)} if candidates else {}
+
+
+def _treatment_validate(history: str, speculative: str, inputs: Dict[str, Any]) -> Tuple[bool, str]:
+    """Keep the plan only if the history review adds nothing it was drafted without.
+
+    The speculative run saw the differential but not the history review, so
+    a cautioned drug or class in the plan, any medication the plan does not
+    mention, or a dosing factor (renal, hepatic, pregnancy, ...) it does not
+    address each discard it.
+    """
+    from .allergy import get_allergy_index, proposed_drugs
+
+    planned = proposed_drugs(speculative)
+    cautioned = proposed_drugs("\n".join(_CAUTION_LINE_RE.findall(history or "")))
+    conflicts = {conflict.drug for conflict in get_allergy_index().screen(cautioned, planned)}
+    conflicts |= contraindicated_drugs(history) & extract_drug_names(speculative)
+    if conflicts:
+        return False, f"history flags {', '.join(sorted(conflicts))}"
+    unaccounted = set(proposed_drugs(history)) - set(planned) - set(cautioned)
+    if unaccounted:
+        return False, f"history lists {', '.join(sorted(unaccounted))}, not considered in the plan"
+    factors = [
+        factor
+        for factor, pattern in _TREATMENT_FACTORS.items()
+        if pattern.search(history or "") and not pattern.search(speculative or "")
+    ]
+    if factors:
+        return False, f"history raises {', '.join(factors)}, not addressed in the plan"
+    return True, "history adds no contraindication, medication or dosing factor the plan missed"
+
+
+def _safety_provisional(inputs: Dict[str, Any], outputs: Dict[str, str]) -> Dict[str, Any]:
+    return {"proposed_medications": inputs.get("medications", "")}
+
+
+def _safety_validate(treatment: str, speculative: str, inputs: Dict[str, Any]) -> Tuple[bool, str]:
+    """Keep the check only if it already covered every drug the treatment proposes.
+
+    The speculative run screened the current medications alone, so any
+    proposed drug outside them, or an allergy screen that changes once the
+    real treatment is included, discards it.
+    """
+    from .allergy import allergy_screen_inputs, proposed_drugs
+
+    new_drugs = set(proposed_drugs(treatment)) - set(proposed_drugs(inputs.get("medications", "")))
+    if new_drugs:
+        return False, f"treatment proposes {', '.join(sorted(new_drugs))}"
+    # The provisional run had no treatment output, so its screen was computed without one
+    screened = allergy_screen_inputs(inputs, {})
+    if allergy_screen_inputs(inputs, {"treatment_recommendation": treatment}) != screened:
+        return False, "allergy screen changes with the treatment"
+    return True, "treatment proposes no drug beyond the current medications"
+
+
+SPECULATIONS: Dict[str, SpeculationSpec] = {
+    spec.target: spec
+    for spec in (
+        # Treatment on the leading differential while history review runs
+        SpeculationSpec("treatment_recommendation", "history_review", _treatment_provisional, _treatment_validate),
+        # Drug safety on the current medication list while treatment runs
+        SpeculationSpec("drug_safety_check", "treatment_recommendation", _safety_provisional, _safety_validate),
+    )
+}
+
+
+class SpeculationStats:
+    """Process-wide speculation hit rate and latency saved"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.saved_s = 0.0
+
+    def record(self, hit: bool, saved_s: float) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.hits += int(hit)
+            self.saved_s += saved_s
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else 0.0,
+                "latency_saved_s": round(self.saved_s, 3),
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+def launchable(names: List[str], position: int) -> Optional[SpeculationSpec]:
+    """Spec whose upstream is the step at ``position`` and whose target comes later"""
+    for spec in SPECULATIONS.values():
+        if spec.upstream == names[position] and spec.target in names[position + 1 :]:
+            return spec
+    return None
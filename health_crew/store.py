@@ -0,0 +1,380 @@
+"""
+Embedded SQLite store of completed diagnosis runs
+"""
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from .config import CASE_STORE_PATH, CASE_STORE_BATCH_SIZE, GEMINI_MODEL, OPENAI_MODEL
+from .trace import RunTrace, TaskRecord
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY,
+    input_hash TEXT NOT NULL,
+    patient TEXT,
+    created_at TEXT NOT NULL,
+    include_imaging INTEGER NOT NULL DEFAULT 0,
+    inputs TEXT NOT NULL,
+    report TEXT NOT NULL,
+    imaging TEXT,
+    duration_s REAL,
+    model TEXT,
+    vision_model TEXT,
+    llm_calls INTEGER,
+    skipped TEXT
+);
+CREATE TABLE IF NOT EXISTS case_tasks (
+    case_id TEXT NOT NULL REFERENCES cases(case_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    agent TEXT,
+    output TEXT,
+    duration_s REAL,
+    PRIMARY KEY (case_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cases_input_hash ON cases(input_hash, created_at);
+CREATE INDEX IF NOT EXISTS idx_cases_patient ON cases(patient, created_at);
+CREATE INDEX IF NOT EXISTS idx_cases_created_at ON cases(created_at);
+"""
+
+# Columns added after the first release, applied to existing databases on open
+_ADDED_COLUMNS = (("llm_calls", "INTEGER"), ("skipped", "TEXT"))
+
+_CASE_COLUMNS = (
+    "case_id, input_hash, patient, created_at, include_imaging, inputs, report, "
+    "imaging, duration_s, model, vision_model, llm_calls, skipped"
+)
+
+
+@dataclass
+class CaseRecord:
+    """One completed run: inputs, final report, per-task outputs and timings"""
+
+    input_hash: str
+    inputs: Dict[str, Any]
+    report: str
+    patient: Optional[str] = None
+    include_imaging: bool = False
+    tasks: List[TaskRecord] = field(default_factory=list)
+    imaging: List[Dict[str, Any]] = field(default_factory=list)
+    duration_s: Optional[float] = None
+    model: str = OPENAI_MODEL
+    vision_model: Optional[str] = None
+    llm_calls: Optional[int] = None
+    skipped: List[Dict[str, str]] = field(default_factory=list)
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+    case_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @classmethod
+    def from_trace(
+        cls,
+        input_hash: str,
+        inputs: Dict[str, Any],
+        report: str,
+        trace: RunTrace,
+        include_imaging: bool = False,
+        skipped: Optional[List[Dict[str, str]]] = None,
+    ) -> "CaseRecord":
+        return cls(
+            input_hash=input_hash,
+            inputs=dict(inputs),
+            report=report,
+            patient=(inputs.get("patient_id") or "").strip() or None,
+            include_imaging=include_imaging,
+            tasks=list(trace.tasks),
+            imaging=list(trace.imaging),
+            duration_s=round(trace.duration_s, 3),
+            vision_model=GEMINI_MODEL if include_imaging else None,
+            llm_calls=trace.llm_calls,
+            skipped=list(skipped or []),
+        )
+
+    def _case_row(self) -> tuple:
+        return (
+            self.case_id,
+            self.input_hash,
+            self.patient,
+            self.created_at,
+            int(self.include_imaging),
+            json.dumps(self.inputs),
+            self.report,
+            json.dumps(self.imaging, default=str) if self.imaging else None,
+            self.duration_s,
+            self.model,
+            self.vision_model,
+            self.llm_calls,
+            json.dumps(self.skipped) if self.skipped else None,
+        )
+
+    def _task_rows(self) -> List[tuple]:
+        return [
+            (self.case_id, position, task.name, task.agent, task.output, task.duration_s)
+            for position, task in enumerate(self.tasks)
+        ]
+
+
+class CaseStore:
+    """SQLite case store in WAL mode with a batching background writer.
+
+    ``save`` only enqueues; the writer thread commits whatever has queued
+    up (up to ``batch_size`` records) in one transaction. Lookups see
+    queued records immediately, so a case is findable as soon as it is saved.
+    """
+
+    def __init__(self, path: str = CASE_STORE_PATH, batch_size: int = CASE_STORE_BATCH_SIZE):
+        self.path = str(path)
+        self.batch_size = max(1, batch_size)
+        self._memory_uri: Optional[str] = None
+        self._keepalive: Optional[sqlite3.Connection] = None
+        if self.path == ":memory:":
+            # Every connection (writer, per-thread readers) must see the same in-memory database
+            self._memory_uri = f"file:case-store-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._pending: Dict[str, CaseRecord] = {}
+        self._pending_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[CaseRecord]]" = queue.Queue()
+        conn = self._connect()
+        if self._memory_uri:
+            # A shared in-memory database lives only while a connection to it is open
+            self._keepalive = conn
+        with conn:
+            conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(cases)")}
+            for column, kind in _ADDED_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE cases ADD COLUMN {column} {kind}")
+        self._writer = threading.Thread(target=self._write_loop, name="case-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._memory_uri:
+            conn = sqlite3.connect(self._memory_uri, uri=True, timeout=30, check_same_thread=False)
+            # Shared-cache readers would otherwise fail with "table is locked" while the writer commits
+            conn.execute("PRAGMA read_uncommitted=1")
+        else:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread read connection; WAL lets readers run alongside the writer"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    # -- writes -------------------------------------------------------------
+
+    def save(self, record: CaseRecord) -> str:
+        """Queue a record for the next batch; returns its case_id"""
+        with self._pending_lock:
+            self._pending[record.case_id] = record
+        self._queue.put(record)
+        return record.case_id
+
+    def flush(self) -> None:
+        """Block until every queued record has been committed"""
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        if self._keepalive is not None:
+            self._keepalive.close()
+            self._keepalive = None
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        while True:
+            record = self._queue.get()
+            if record is None:
+                self._queue.task_done()
+                break
+            batch = [record]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(conn, batch)
+            except sqlite3.Error:
+                logger.exception("Failed to write %d case(s) to %s", len(batch), self.path)
+            finally:
+                with self._pending_lock:
+                    for item in batch:
+                        self._pending.pop(item.case_id, None)
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                break
+        conn.close()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: List[CaseRecord]) -> None:
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO cases ({_CASE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [record._case_row() for record in batch],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO case_tasks (case_id, position, name, agent, output, duration_s) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [row for record in batch for row in record._task_rows()],
+            )
+
+    # -- reads --------------------------------------------------------------
+
+    def _queued(self, predicate) -> List[CaseRecord]:
+        with self._pending_lock:
+            return [record for record in self._pending.values() if predicate(record)]
+
+    def _query(self, where: str, params: tuple, limit: int) -> List[CaseRecord]:
+        conn = self._reader()
+        rows = conn.execute(
+            f"SELECT {_CASE_COLUMNS} FROM cases WHERE {where} ORDER BY created_at DESC LIMIT ?",
+            params + (limit,),
+        ).fetchall()
+        if not rows:
+            return []
+        ids = [row["case_id"] for row in rows]
+        tasks: Dict[str, List[TaskRecord]] = {case_id: [] for case_id in ids}
+        placeholders = ", ".join("?" * len(ids))
+        for task in conn.execute(
+            f"SELECT case_id, name, agent, output, duration_s FROM case_tasks "
+            f"WHERE case_id IN ({placeholders}) ORDER BY case_id, position",
+            ids,
+        ):
+            tasks[task["case_id"]].append(
+                TaskRecord(task["name"], task["agent"] or "", task["output"] or "", task["duration_s"] or 0.0)
+            )
+        return [
+            CaseRecord(
+                case_id=row["case_id"],
+                input_hash=row["input_hash"],
+                patient=row["patient"],
+                created_at=row["created_at"],
+                include_imaging=bool(row["include_imaging"]),
+                inputs=json.loads(row["inputs"]),
+                report=row["report"],
+                imaging=json.loads(row["imaging"]) if row["imaging"] else [],
+                duration_s=row["duration_s"],
+                model=row["model"],
+                vision_model=row["vision_model"],
+                llm_calls=row["llm_calls"],
+                skipped=json.loads(row["skipped"]) if row["skipped"] else [],
+                tasks=tasks[row["case_id"]],
+            )
+            for row in rows
+        ]
+
+    def _merged(self, queued: List[CaseRecord], stored: List[CaseRecord], limit: int) -> List[CaseRecord]:
+        seen = {record.case_id for record in queued}
+        merged = queued + [record for record in stored if record.case_id not in seen]
+        merged.sort(key=lambda record: record.created_at, reverse=True)
+        return merged[:limit]
+
+    def get(self, case_id: str) -> Optional[CaseRecord]:
+        found = self._queued(lambda record: record.case_id == case_id) or self._query("case_id = ?", (case_id,), 1)
+        return found[0] if found else None
+
+    def find_by_input_hash(self, input_hash: str) -> Optional[CaseRecord]:
+        """Latest run with identical normalized inputs and images"""
+        found = self._merged(
+            self._queued(lambda record: record.input_hash == input_hash),
+            self._query("input_hash = ?", (input_hash,), 1),
+            1,
+        )
+        return found[0] if found else None
+
+    def llm_call_stats(self, since: str = "") -> Dict[str, Any]:
+        """Average LLM calls and skipped steps per case created at or after ``since``.
+
+        Reads committed rows plus the writer's queue without flushing it, so
+        a dashboard refresh never forces a synchronous commit.
+        """
+        queued = self._queued(lambda record: record.created_at >= since and record.llm_calls is not None)
+        excluded = ", ".join("?" * len(queued))
+        row = self._reader().execute(
+            "SELECT COUNT(*) AS cases, SUM(llm_calls) AS llm_calls, "
+            "SUM(json_array_length(COALESCE(skipped, '[]'))) AS skipped "
+            "FROM cases WHERE created_at >= ? AND llm_calls IS NOT NULL"
+            + (f" AND case_id NOT IN ({excluded})" if queued else ""),
+            (since, *(record.case_id for record in queued)),
+        ).fetchone()
+        cases = row["cases"] + len(queued)
+        llm_calls = (row["llm_calls"] or 0) + sum(record.llm_calls for record in queued)
+        skipped = (row["skipped"] or 0) + sum(len(record.skipped) for record in queued)
+        return {
+            "cases": cases,
+            "avg_llm_calls": round(llm_calls / cases, 2) if cases else 0.0,
+            "avg_skipped_steps": round(skipped / cases, 2) if cases else 0.0,
+        }
+
+    def recent(self, limit: int = 100) -> List[CaseRecord]:
+        """Most recent runs, newest first"""
+        return self._merged(self._queued(lambda record: True), self._query("1 = 1", (), limit), limit)
+
+    def for_patient(self, patient: str, limit: int = 20) -> List[CaseRecord]:
+        """Most recent runs for a patient identifier"""
+        return self._merged(
+            self._queued(lambda record: record.patient == patient),
+            self._query("patient = ?", (patient,), limit),
+            limit,
+        )
+
+    def between(self, start: str, end: str, limit: int = 100) -> List[CaseRecord]:
+        """Runs created in [start, end), as ISO-8601 dates or timestamps"""
+        return self._merged(
+            self._queued(lambda record: start <= record.created_at < end),
+            self._query("created_at >= ? AND created_at < ?", (start, end), limit),
+            limit,
+        )
+
+
+_store: Optional[CaseStore] = None
+_store_lock = threading.Lock()
+
+
+def get_case_store() -> CaseStore:
+    """Process-wide store at CASE_STORE_PATH, flushed on interpreter exit"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CaseStore()
+            atexit.register(_store.close)
+        return _store
+
+
+def record_summary(record: CaseRecord) -> Dict[str, Any]:
+    """Small JSON-friendly view of a record for display"""
+    summary = asdict(record)
+    summary.pop("inputs")
+    summary.pop("report")
+    summary["tasks"] = [
+        {"name": task.name, "agent": task.agent, "duration_s": task.duration_s} for task in record.tasks
+    ]
+    return summary
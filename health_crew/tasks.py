@@ -19,7 +19,11 @@ symptom_analysis_task = Task(
         "- Identify potential conditions\n"
         "- Flag any emergency conditions\n\n"
         "Patient Symptoms: {symptoms}\n"
-        "Demographics: {demographics}\n"
+        "Demographics: {demographics}\n\n"
+        "Coded findings from symptoms and history (local terminology; 'absent' means negated in the text):\n"
+        "{coded_symptoms}\n\n"
+        "Analysis of a similar earlier case (a starting point only; keep what still fits "
+        "this patient and revise anything that does not):\n{similar_case_analysis}\n"
     ),
     agent=symptom_analyzer,
     expected_output="Structured symptom analysis with differential diagnosis list",
@@ -73,6 +77,7 @@ drug_safety_check_task = Task(
         "Perform drug interaction and contraindication checks for the proposed plan.\n"
         "Proposed Medications: {proposed_medications}\n"
         "Allergies: {allergies}\n"
+        "Allergy cross-reactivity screen (local drug-class index):\n{allergy_screen}\n"
         "Conditions: {conditions}\n"
     ),
     agent=interaction_checker,
@@ -113,8 +118,10 @@ imaging_analysis_task = Task(
         "- Assess severity and clinical significance\n"
         "- Provide diagnostic assessment with confidence level\n"
         "- Include patient-friendly explanation\n"
-        "- Integrate findings with patient symptoms and history\n\n"
-        "Medical Image Path: {medical_image_path}\n"
+        "- Integrate findings with patient symptoms and history\n"
+        "- For several views, call medical_study_analysis once with all references "
+        "(combined={imaging_combined})\n\n"
+        "Medical Image(s) (pass these references to the imaging tools unchanged): {medical_image_path}\n"
         "Patient Context: Symptoms: {symptoms}, Demographics: {demographics}, History: {history}\n"
     ),
     agent=imaging_analyst,
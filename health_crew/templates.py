@@ -0,0 +1,55 @@
+"""
+Per-run copies of the agent and task templates defined in agents.py and tasks.py
+"""
+import copy
+from typing import Any, Dict, List, Tuple
+from crewai import Agent, Task
+
+
+def _fresh_containers(model: Any, skip: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Shallow copies of a model's list, dict and set fields.
+
+    crewai appends to some of these while running (tool results, processed
+    agents), so a clone must not share them with its template.
+    """
+    return {
+        name: copy.copy(value)
+        for name, value in vars(model).items()
+        if name not in skip and isinstance(value, (list, dict, set))
+    }
+
+
+def clone_agent(agent: Agent, **overrides: Any) -> Agent:
+    """Copy of an agent sharing its LLM and tool objects, without re-running validation"""
+    return agent.model_copy(update={**_fresh_containers(agent), **overrides})
+
+
+def clone_agents(agents: List[Agent], **overrides: Any) -> Dict[int, Agent]:
+    """One clone per distinct agent, keyed by ``id()`` of the original"""
+    clones: Dict[int, Agent] = {}
+    for agent in agents:
+        if id(agent) not in clones:
+            clones[id(agent)] = clone_agent(agent, **overrides)
+    return clones
+
+
+def clone_plan(plan: List[Tuple[str, Agent, Task]]) -> List[Tuple[str, Agent, Task]]:
+    """Independent copy of a (step name, agent, task) plan for one run.
+
+    Each task clone points at the cloned agents and at cloned copies of any
+    context tasks in the plan, and starts without an output. The module-level
+    agents and tasks are only ever used as templates, so concurrent runs never
+    share an executor, an output or a tool-result list.
+    """
+    agents = clone_agents([agent for _, agent, task in plan for agent in (agent, task.agent) if agent is not None])
+    tasks: Dict[int, Task] = {}
+    for _, _, task in plan:
+        update = _fresh_containers(task, skip=("context",))
+        update["output"] = None
+        if task.agent is not None:
+            update["agent"] = agents[id(task.agent)]
+        tasks[id(task)] = task.model_copy(update=update)
+    for clone in tasks.values():
+        if isinstance(clone.context, list):
+            clone.context = [tasks.get(id(context), context) for context in clone.context]
+    return [(name, agents[id(agent)], tasks[id(task)]) for name, agent, task in plan]
@@ -0,0 +1,89 @@
+"""
+Run-scoped memoization of tool calls
+"""
+import copy
+import functools
+import inspect
+import json
+from typing import Any, Callable, Optional, Tuple
+from .trace import current_trace
+from .utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Tools that report failure in their result rather than by raising
+_FAILED_STATUSES = frozenset({"failed", "error"})
+
+
+def _canonical(value: Any, case_insensitive: bool) -> Any:
+    """JSON-ready form where equivalent arguments compare equal"""
+    if isinstance(value, str):
+        text = " ".join(value.split())
+        return text.casefold() if case_insensitive else text
+    if isinstance(value, dict):
+        return {str(key): _canonical(item, case_insensitive) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item, case_insensitive) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def memo_key(
+    name: str, signature: inspect.Signature, args: Tuple, kwargs: dict, case_insensitive: bool = False
+) -> str:
+    """Canonical key for a call: bound arguments with defaults applied, keys sorted"""
+    try:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+    except TypeError:
+        arguments = {"args": list(args), "kwargs": kwargs}
+    canonical = _canonical(arguments, case_insensitive)
+    return f"{name}:" + json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+
+def _failed(result: Any) -> bool:
+    return isinstance(result, dict) and str(result.get("status", "")).lower() in _FAILED_STATUSES
+
+
+def run_memoized(fn: Optional[Callable] = None, *, case_insensitive: bool = False) -> Callable:
+    """Return the first result for repeat calls with the same arguments within a run.
+
+    Place it under ``@tool`` so the tool's name, docstring and signature are
+    unchanged. The memo lives on the active RunTrace and is dropped with it;
+    outside a run the tool executes every time. Concurrent identical calls
+    (speculative steps) wait on the first one. Failures, raised or returned
+    as a ``{"status": "failed" | "error"}`` dict, are not cached, so a later
+    call retries. Every caller gets its own copy of a result.
+    """
+    if fn is None:
+        return functools.partial(run_memoized, case_insensitive=case_insensitive)
+
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = current_trace()
+        if trace is None:
+            return fn(*args, **kwargs)
+        key = memo_key(name, signature, args, kwargs, case_insensitive)
+        future, owner = trace.tool_future(key)
+        if not owner:
+            logger.debug("Reusing %s result from earlier in this run", fn.__name__)
+            return copy.deepcopy(future.result())
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            trace.forget_tool_call(key)
+            future.set_exception(e)
+            raise
+        if _failed(result):
+            # Callers already waiting share this attempt; later calls run the tool again
+            trace.forget_tool_call(key)
+        future.set_result(copy.deepcopy(result))
+        return result
+
+    return wrapper
+
@@ -1,7 +1,11 @@
 import os
+from dataclasses import asdict
 from typing import Dict, List, Optional
 import requests
 from crewai.tools import tool
+from .allergy import SEVERITY_RANK, get_allergy_index
+from .screening import get_interaction_matrix
+from .tool_memo import run_memoized
 from .utils.logging import get_logger
 from .config import GUIDELINES_API_URL, GUIDELINES_API_KEY
 logger = get_logger(__name__)
@@ -9,6 +13,7 @@ logger = get_logger(__name__)
 
 # Medical knowledge tools
 @tool("medical_knowledge_search")
+@run_memoized(case_insensitive=True)
 def medical_knowledge_search(query: str = "", **kwargs) -> str:
     """Search medical knowledge databases for conditions and treatments (stub, resilient).
 
@@ -36,22 +41,33 @@ def medical_knowledge_search(query: str = "", **kwargs) -> str:
 
 # Drug interaction tool
 @tool("drug_interaction_check")
-def drug_interaction_check(medications: List[str]) -> Dict:
-    """Check for drug interactions and contraindications (stub)."""
+@run_memoized
+def drug_interaction_check(medications: List[str], allergies: Optional[List[str]] = None) -> Dict:
+    """Check for drug interactions and contraindications.
+
+    Pairs are screened against the local interaction matrix (drugs and
+    drug classes from interactions.csv); ``interactions`` lists each pair
+    with its severity. With ``allergies`` each medication is also screened
+    against the local drug-class hierarchy; ``allergy_conflicts`` lists the
+    offending class and severity for every cross-reactive pair.
+    """
     logger.info("Checking drug interactions for: %s", medications)
-    warnings = []
-    if (
-        len(medications) >= 2
-        and "ibuprofen" in [m.lower() for m in medications]
-        and "aspirin" in [m.lower() for m in medications]
-    ):
-        warnings.append(
-            "Caution combining ibuprofen and aspirin due to antiplatelet effect interference."
-        )
-    return {"warnings": warnings, "severity": "low" if not warnings else "moderate"}
+    hits = get_interaction_matrix().check(medications)
+    warnings = [f"{hit.severity.capitalize()}: {hit.drug_a} + {hit.drug_b}: {hit.note}." for hit in hits]
+    conflicts = get_allergy_index().screen(allergies or [], medications) if allergies else []
+    severity = hits[0].severity if hits else "low"
+    if conflicts:
+        severity = max((severity, conflicts[0].severity), key=SEVERITY_RANK.get)
+    return {
+        "warnings": warnings,
+        "interactions": [asdict(hit) for hit in hits],
+        "allergy_conflicts": [asdict(conflict) for conflict in conflicts],
+        "severity": severity,
+    }
 
 
 @tool("clinical_guidelines_search")
+@run_memoized(case_insensitive=True)
 def clinical_guidelines_search(condition: str = "", **kwargs) -> str:
     """Retrieve clinical guidelines for specific conditions (stub, resilient).
 
@@ -104,6 +120,7 @@ def clinical_guidelines_search(condition: str = "", **kwargs) -> str:
 
 # Healthcare system integration
 @tool("electronic_health_record_access")
+@run_memoized
 def electronic_health_record_access(patient_id: str) -> Dict:
     """Access patient EHR data (with proper authorization) (stub)."""
     logger.info("Accessing EHR for patient: %s", patient_id)
@@ -117,6 +134,7 @@ def electronic_health_record_access(patient_id: str) -> Dict:
 
 
 @tool("appointment_scheduling")
+@run_memoized
 def appointment_scheduling(specialty: str, urgency: str) -> Dict:
     """Schedule appointments with healthcare providers (stub)."""
     logger.info("Scheduling appointment for specialty=%s urgency=%s", specialty, urgency)
@@ -0,0 +1,140 @@
+"""
+Per-run trace collected while a crew executes
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from .budget import OK, RunBudget, default_budget
+
+
+@dataclass
+class TaskRecord:
+    name: str
+    agent: str
+    output: str
+    duration_s: float
+
+
+@dataclass
+class RunTrace:
+    """Timings and side results of one crew run.
+
+    Activate it with ``with trace:`` around ``crew.kickoff``; the crew's
+    ``task_callback`` (``on_task_completed``) and the tools record into the
+    active trace.
+    """
+
+    task_names: List[str] = field(default_factory=list)
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    tasks: List[TaskRecord] = field(default_factory=list)
+    imaging: List[Dict[str, Any]] = field(default_factory=list)
+    speculation: List[Dict[str, Any]] = field(default_factory=list)
+    llm_calls: int = 0
+    llm_tokens: int = 0
+    budget: Optional[RunBudget] = field(default_factory=default_budget)
+    budget_level: str = OK
+    tool_calls: int = 0
+    tool_calls_deduplicated: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    _last_mark: float = field(default_factory=time.perf_counter, repr=False)
+    _token: Any = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _tool_memo: Dict[str, Future] = field(default_factory=dict, repr=False)
+
+    def __enter__(self) -> "RunTrace":
+        self.started_at = time.time()
+        self._last_mark = time.perf_counter()
+        self._token = _active_trace.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.finished_at = time.time()
+        _active_trace.reset(self._token)
+
+    @property
+    def duration_s(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def current_task(self) -> Optional[str]:
+        """Name of the step now executing, used as the log correlation ID"""
+        position = len(self.tasks)
+        if position < len(self.task_names):
+            return self.task_names[position]
+        return f"task_{position + 1}" if self.finished_at is None else None
+
+    def count_llm_call(self, tokens: int = 0) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_tokens += tokens
+
+    def count_llm_tokens(self, tokens: int) -> None:
+        with self._lock:
+            self.llm_tokens += tokens
+
+    def budget_status(self) -> Tuple[str, str]:
+        """Budget level (ok, soft or hard) of the run so far, with the binding dimension"""
+        if self.budget is None:
+            return OK, ""
+        level, reason = self.budget.status(self.llm_calls, self.llm_tokens, time.time() - self.started_at)
+        if level != self.budget_level:
+            self.budget_level = level
+            # utils.logging imports this module for log correlation
+            from .utils.logging import get_logger
+
+            get_logger(__name__).warning("Run %s reached its %s budget limit (%s)", self.run_id, level, reason)
+        return level, reason
+
+    def tool_future(self, key: str) -> Tuple[Future, bool]:
+        """Memo slot for a tool call; the flag is True if the caller must fill it"""
+        with self._lock:
+            self.tool_calls += 1
+            future = self._tool_memo.get(key)
+            if future is not None:
+                self.tool_calls_deduplicated += 1
+                return future, False
+            future = self._tool_memo[key] = Future()
+            return future, True
+
+    def forget_tool_call(self, key: str) -> None:
+        with self._lock:
+            self._tool_memo.pop(key, None)
+
+    def restore_tasks(self, records: List[TaskRecord]) -> None:
+        """Add steps completed by an earlier, interrupted attempt"""
+        self.tasks.extend(records)
+        self._last_mark = time.perf_counter()
+
+    def task_completed(self, output: Any) -> None:
+        now = time.perf_counter()
+        position = len(self.tasks)
+        name = self.task_names[position] if position < len(self.task_names) else ""
+        self.tasks.append(
+            TaskRecord(
+                name=name or getattr(output, "name", None) or f"task_{position + 1}",
+                agent=str(getattr(output, "agent", "")),
+                output=getattr(output, "raw", None) or str(output),
+                duration_s=round(now - self._last_mark, 3),
+            )
+        )
+        self._last_mark = now
+
+
+_active_trace: ContextVar[Optional[RunTrace]] = ContextVar("health_crew_run_trace", default=None)
+
+
+def current_trace() -> Optional[RunTrace]:
+    """The trace of the run executing in this context, if any"""
+    return _active_trace.get()
+
+
+def on_task_completed(output: Any) -> None:
+    """Crew ``task_callback`` that records into the active trace"""
+    trace = current_trace()
+    if trace is not None:
+        trace.task_completed(output)
@@ -1,18 +1,160 @@
 from rich.console import Console
 from rich.logging import RichHandler
+import atexit
+import json
 import logging
-from ..config import LOG_LEVEL
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional
+from ..config import LOG_LEVEL, LOG_FORMAT, LOG_FILE, LOG_SAMPLE_RATES
+from ..trace import current_trace
 
 _console = Console()
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(spec: str) -> Dict[int, float]:
+    """Parse "DEBUG=0.05,INFO=0.5" into {level: keep probability}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if isinstance(level, int):
+            rates[level] = min(1.0, max(0.0, float(value)))
+    return rates
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the active run and task IDs on the calling thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = current_trace()
+        record.run_id = trace.run_id if trace is not None else None
+        record.task_id = trace.current_task if trace is not None else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random fraction of records per level; WARNING and above always pass"""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records unformatted; the listener thread does all formatting.
+
+    The stock QueueHandler merges ``msg % args`` and renders tracebacks on
+    the caller's thread. Here the caller pays only for the record itself.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "task_id": getattr(record, "task_id", None),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _json_handlers() -> logging.Handler:
+    """Queue handler on the caller side; the listener writes JSON lines"""
+    global _listener
+    target = logging.FileHandler(LOG_FILE, encoding="utf-8") if LOG_FILE else logging.StreamHandler(sys.stderr)
+    target.setFormatter(JsonFormatter())
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    handler.addFilter(CorrelationFilter())
+    return handler
+
+
+def configure_logging(fmt: str = LOG_FORMAT, level: str = LOG_LEVEL) -> None:
+    """Install the root handler once: rich console (dev) or JSON lines via a queue"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        if fmt == "json":
+            handler = _json_handlers()
+            logging.basicConfig(level=level, handlers=[handler], force=True)
+        else:
+            logging.basicConfig(
+                level=level,
+                format="%(message)s",
+                datefmt="%Y-%m-%d %H:%M:%S",
+                handlers=[RichHandler(console=_console, rich_tracebacks=True)],
+            )
+        _configured = True
 
 
 def get_logger(name: str) -> logging.Logger:
-    logging.basicConfig(
-        level=LOG_LEVEL,
-        format="%(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[RichHandler(console=_console, rich_tracebacks=True)],
-    )
+    configure_logging()
     logger = logging.getLogger(name)
     logger.setLevel(LOG_LEVEL)
     return logger
+
+
+def benchmark(calls: int = 20000) -> Dict[str, float]:
+    """Caller-side cost in microseconds of one INFO record per handler setup"""
+    import io
+
+    results = {}
+    for mode, rates in (("rich", None), ("json", {}), ("json_info_sampled_10pct", {logging.INFO: 0.1})):
+        listener = None
+        if rates is None:
+            handler: logging.Handler = RichHandler(console=Console(file=io.StringIO()), rich_tracebacks=True)
+        else:
+            sink = logging.StreamHandler(io.StringIO())
+            sink.setFormatter(JsonFormatter())
+            log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, sink)
+            listener.start()
+            handler = LazyQueueHandler(log_queue)
+            handler.addFilter(SamplingFilter(rates))
+            handler.addFilter(CorrelationFilter())
+        bench_logger = logging.getLogger(f"health_crew.bench.{mode}")
+        bench_logger.handlers = [handler]
+        bench_logger.propagate = False
+        bench_logger.setLevel(logging.INFO)
+        started = time.perf_counter()
+        for i in range(calls):
+            bench_logger.info("Analysed view %d of %s in %.2fs", i, "image://abc", 0.5)
+        results[mode] = round((time.perf_counter() - started) / calls * 1e6, 2)
+        if listener is not None:
+            listener.stop()
+    return results
+
+
+if __name__ == "__main__":
+    # python -m health_crew.utils.logging
+    print(benchmark())
@@ -1,4 +1,6 @@
-from crewai import Crew, Process
+import re
+from typing import Dict, List, Tuple
+from crewai import Agent, Crew, Process, Task
 from .agents import (
     symptom_analyzer,
     history_reviewer,
@@ -19,39 +21,150 @@ from .tasks import (
     patient_communication_task,
     imaging_analysis_task,
 )
+from .config import CREW_PROFILE
+from .templates import clone_agent, clone_plan
+from .trace import on_task_completed
+
+
+# Sequential plan: (step name, agent, task). These are templates; runs use clones
+_CORE_PLAN = [
+    ("symptom_analysis", symptom_analyzer, symptom_analysis_task),
+    ("history_review", history_reviewer, history_review_task),
+    ("treatment_recommendation", treatment_agent, treatment_recommendation_task),
+    ("referral_assessment", referral_agent, referral_assessment_task),
+    ("drug_safety_check", interaction_checker, drug_safety_check_task),
+    ("follow_up_scheduling", scheduler_agent, follow_up_scheduling_task),
+    ("patient_communication", communication_agent, patient_communication_task),
+]
+_IMAGING_STEP = ("imaging_analysis", imaging_analyst, imaging_analysis_task)
+
+PROFILES = ("full", "fast")
+
+# Light steps answered together in one LLM call; members must be adjacent in the plan
+FUSED_STEPS: Dict[str, List[Tuple[str, ...]]] = {
+    "full": [],
+    "fast": [("referral_assessment", "follow_up_scheduling", "patient_communication")],
+}
+_MARKER_RE = re.compile(r"^[\s*#>`]*=+\s*([a-z_]+)\s*=+[\s*`]*$", re.IGNORECASE | re.MULTILINE)
+
+
+def _template_plan(include_imaging: bool, profile: str) -> List[Tuple[str, Agent, Task]]:
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown crew profile {profile!r}; expected one of {PROFILES}")
+    plan = list(_CORE_PLAN)
+    fused = [name for group in FUSED_STEPS[profile] for name in group]
+    if fused:
+        plan = [step for step in plan if step[0] not in fused] + [
+            step for name in fused for step in plan if step[0] == name
+        ]
+    if include_imaging:
+        plan.insert(1, _IMAGING_STEP)  # Run imaging early for context
+    return plan
+
+
+def diagnosis_plan(include_imaging: bool = False, profile: str = CREW_PROFILE) -> List[Tuple[str, Agent, Task]]:
+    """Ordered (step name, agent, task) triples for one diagnosis run.
+
+    The agents and tasks are fresh clones of the module-level templates, so
+    each call can be run alongside others. The "fast" profile moves its
+    fused steps after the others so each group is contiguous; the runner
+    then answers a group with one fused task.
+    """
+    return clone_plan(_template_plan(include_imaging, profile))
+
+
+def task_names(include_imaging: bool = False, profile: str = CREW_PROFILE) -> List[str]:
+    """Step names in execution order, matching the crew's task outputs"""
+    return [name for name, _, _ in _template_plan(include_imaging, profile)]
+
+
+def fusion_group(profile: str, names: List[str], position: int) -> List[str]:
+    """Remaining members of the fused group starting at ``position`` (empty if unfused)"""
+    for group in FUSED_STEPS.get(profile, []):
+        if names[position] in group:
+            members = []
+            for name in names[position:]:
+                if name not in group:
+                    break
+                members.append(name)
+            return members
+    return []
+
+
+def section_marker(name: str) -> str:
+    return f"=== {name} ==="
+
+
+def fuse_agents(agents: List[Agent]) -> Agent:
+    """One agent holding every member's tools, with their roles, goals and backstories combined"""
+    members = list({id(agent): agent for agent in agents}.values())
+    if len(members) == 1:
+        return members[0]
+    tools = list({tool.name: tool for agent in members for tool in agent.tools or []}.values())
+
+    def combined(field: str, separator: str) -> str:
+        return separator.join(dict.fromkeys(str(getattr(agent, field)).strip() for agent in members))
+
+    return clone_agent(
+        members[0],
+        role=combined("role", " / "),
+        goal=combined("goal", " "),
+        backstory=combined("backstory", " "),
+        tools=tools,
+    )
+
+
+def fuse_tasks(steps: List[Tuple[str, Agent, Task]]) -> Task:
+    """One task whose answer holds each step's output under its section marker.
+
+    Its agent is the union of the member agents, so no step loses the tools
+    (e.g. appointment_scheduling) or the specialist framing it would have had.
+    """
+    parts = [
+        f"{section_marker(name)}\n{task.description.strip()}\nExpected output: {task.expected_output}"
+        for name, _, task in steps
+    ]
+    return Task(
+        description=(
+            f"Complete the following {len(steps)} parts in one response. Begin each part with its "
+            "marker line exactly as shown, on a line by itself, and write nothing before the first marker.\n\n"
+            + "\n\n".join(parts)
+        ),
+        agent=fuse_agents([agent for _, agent, _ in steps]),
+        expected_output="Sections " + ", ".join(section_marker(name) for name, _, _ in steps) + " in that order",
+    )
+
+
+def split_fused_output(text: str, names: List[str]) -> Dict[str, str]:
+    """Per-step text of a fused answer; steps whose marker is missing are left out"""
+    wanted = set(names)
+    matches = [match for match in _MARKER_RE.finditer(text or "") if match.group(1).lower() in wanted]
+    sections: Dict[str, str] = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following is not None else len(text)
+        body = text[match.end() : end].strip()
+        if body:
+            sections.setdefault(match.group(1).lower(), body)
+    return sections
 
 
 def build_diagnosis_crew(verbose: bool = True, include_imaging: bool = False) -> Crew:
     """
     Build diagnosis crew with optional imaging analysis.
-    
+
+    Always the "full" profile: fused steps need ``runner.run_plan`` to split
+    their output back into per-step results.
+
     Args:
         verbose: Enable verbose output
         include_imaging: Include imaging analysis agent and task
     """
-    agents = [
-        symptom_analyzer,
-        history_reviewer,
-        treatment_agent,
-        referral_agent,
-        interaction_checker,
-        scheduler_agent,
-        communication_agent,
-    ]
-    tasks = [
-        symptom_analysis_task,
-        history_review_task,
-        treatment_recommendation_task,
-        referral_assessment_task,
-        drug_safety_check_task,
-        follow_up_scheduling_task,
-        patient_communication_task,
-    ]
-    
-    # Add imaging analysis if requested and image provided
-    if include_imaging:
-        agents.insert(1, imaging_analyst)  # Add after symptom analyzer
-        tasks.insert(1, imaging_analysis_task)  # Run imaging early for context
-    
-    crew = Crew(agents=agents, tasks=tasks, process=Process.sequential, verbose=verbose)
+    plan = diagnosis_plan(include_imaging, profile="full")
+    crew = Crew(
+        agents=[agent for _, agent, _ in plan],
+        tasks=[task for _, _, task in plan],
+        process=Process.sequential,
+        verbose=verbose,
+        task_callback=on_task_completed,
+    )
     return crew
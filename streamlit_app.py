@@ -1,10 +1,20 @@
 import os
-from datetime import datetime
 import streamlit as st
-from pathlib import Path
-from PIL import Image as PILImage
-from health_crew.workflows import build_diagnosis_crew
-from health_crew.config import OPENAI_MODEL, GOOGLE_API_KEY
+from health_crew.workflows import PROFILES, task_names
+from health_crew.runner import CheckpointStore, run_plan
+from health_crew.speculation import speculation_stats
+from health_crew.imaging_tools import analysis_preview, assess_image_quality, find_near_duplicate, image_fingerprint
+from health_crew.report import Report, crew_output_text, parse_report, report_digest
+from health_crew.cache import ResultCache, case_key
+from health_crew.intake import build_inputs
+from health_crew.image_pyramid import ImagePyramid, TileCache, encode_jpeg, thumbnail_bytes
+from health_crew.image_store import ImageHandle, register_image
+from health_crew.rate_limit import limiter_metrics
+from health_crew.store import CaseRecord, CaseStore, get_case_store
+from health_crew.trace import RunTrace
+from health_crew.analytics import record_run
+from health_crew.similarity import SimilarCaseIndex, get_similar_case_index, index_record
+from health_crew.config import OPENAI_MODEL, GOOGLE_API_KEY, RESULT_CACHE_SIZE, SPECULATIVE_EXECUTION, CREW_PROFILE
 
 st.set_page_config(
     page_title="Healthcare Diagnosis Support", 
@@ -12,6 +22,174 @@ st.set_page_config(
     page_icon="🏥"
 )
 
+
+def get_result_cache() -> ResultCache:
+    """This session's completed runs keyed by patient, normalized inputs and image hash.
+
+    Held in session state rather than st.cache_resource, so one session's
+    report is never served to another that submits the same inputs.
+    """
+    return st.session_state.setdefault("result_cache", ResultCache(max_entries=RESULT_CACHE_SIZE))
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_report(digest: str, _text: str) -> Report:
+    """Parse crew output once per distinct result; reruns hit the cache by digest"""
+    return parse_report(_text)
+
+
+@st.cache_resource
+def get_store() -> CaseStore:
+    """SQLite case store shared by all sessions"""
+    return get_case_store()
+
+
+@st.cache_resource
+def get_similar_index() -> SimilarCaseIndex:
+    """Embeddings of earlier presentations shared by all sessions"""
+    return get_similar_case_index()
+
+
+def case_entry(record: CaseRecord, verbose: bool) -> dict:
+    """Render-ready entry for a completed run"""
+    inputs = record.inputs
+    return {
+        "case_id": record.case_id,
+        "result_text": record.report,
+        "raw_output": record.report,
+        "report_date": record.created_at.replace("T", " "),
+        "symptoms": inputs.get("symptoms", ""),
+        "demographics": inputs.get("demographics", ""),
+        "medications": inputs.get("medications", ""),
+        "allergies": inputs.get("allergies", ""),
+        "include_imaging": record.include_imaging,
+        "verbose": verbose,
+        "task_timings": {task.name: task.duration_s for task in record.tasks},
+        "skipped": record.skipped,
+    }
+
+
+def run_case(
+    inputs: dict,
+    key: str,
+    include_imaging: bool,
+    verbose: bool,
+    speculative: bool = False,
+    profile: str = CREW_PROFILE,
+) -> dict:
+    """Run the plan with per-task checkpoints and record the completed case"""
+    with RunTrace(task_names=task_names(include_imaging, profile)) as trace:
+        try:
+            result = run_plan(
+                inputs,
+                include_imaging=include_imaging,
+                verbose=verbose,
+                key=key,
+                speculative=speculative,
+                profile=profile,
+            )
+        except Exception:
+            st.session_state.interrupted = {
+                "inputs": inputs,
+                "key": key,
+                "include_imaging": include_imaging,
+                "profile": profile,
+                "completed": len(trace.tasks),
+                "total": len(trace.task_names),
+            }
+            raise
+    record = CaseRecord.from_trace(
+        key, inputs, crew_output_text(result), trace, include_imaging=include_imaging, skipped=result.skipped
+    )
+    record_run(
+        trace,
+        include_imaging=include_imaging,
+        profile=profile,
+        partial=bool(result.partial),
+        skipped=len(result.skipped),
+        source="streamlit",
+    )
+    if result.partial:
+        # Shown but not stored or cached; the checkpoint lets Resume complete it
+        st.session_state.interrupted = {
+            "inputs": inputs,
+            "key": key,
+            "include_imaging": include_imaging,
+            "profile": profile,
+            "completed": len(trace.tasks) - len(result.partial),
+            "total": len(trace.task_names),
+        }
+    else:
+        st.session_state.interrupted = None
+        get_store().save(record)
+        index_record(get_similar_index(), record)
+    entry = case_entry(record, verbose)
+    entry["raw_output"] = str(result)
+    entry["speculation"] = trace.speculation
+    entry["tool_calls"] = {"total": trace.tool_calls, "deduplicated": trace.tool_calls_deduplicated}
+    entry["budget"] = {"llm_calls": trace.llm_calls, "tokens": trace.llm_tokens, "level": trace.budget_level}
+    entry["partial"] = result.partial
+    if not result.partial:
+        get_result_cache().put(key, entry)
+    return entry
+
+
+def get_upload_handles(uploaded_files) -> list:
+    """Register uploads once and reuse their in-memory handles across reruns.
+
+    Session state holds the handles, which keeps their ``image://`` refs
+    resolvable for every run this session starts, however many other
+    sessions upload images meanwhile.
+    """
+    cached = st.session_state.get("upload_handles", {})
+    handles = {}
+    for uploaded_file in uploaded_files:
+        handle = cached.get(uploaded_file.file_id)
+        if handle is None:
+            handle = register_image(uploaded_file.getvalue(), uploaded_file.name)
+        handles[uploaded_file.file_id] = handle
+    st.session_state.upload_handles = handles
+    # Drop zoom tiles of images that are no longer uploaded
+    digests = {handle.digest for handle in handles.values()}
+    pyramids = st.session_state.get("pyramids", {})
+    for digest in [digest for digest in pyramids if digest not in digests]:
+        pyramids.pop(digest).cache.discard(digest)
+    return list(handles.values())
+
+
+VIEWPORT = (1024, 768)
+
+
+def get_pyramid(handle: ImageHandle) -> ImagePyramid:
+    """Per-session pyramid; all of a session's images share one byte-bounded tile cache"""
+    cache = st.session_state.setdefault("tile_cache", TileCache())
+    pyramids = st.session_state.setdefault("pyramids", {})
+    pyramid = pyramids.get(handle.digest)
+    if pyramid is None:
+        pyramid = pyramids[handle.digest] = ImagePyramid(handle, cache)
+    return pyramid
+
+
+def show_zoom_viewer(handle: ImageHandle) -> None:
+    """Zoom/pan view that renders only the tiles inside the viewport"""
+    pyramid = get_pyramid(handle)
+    level = st.select_slider(
+        "Zoom",
+        options=list(range(pyramid.levels - 1, -1, -1)),
+        format_func=lambda level: f"{100 / (1 << level):g}%",
+        key=f"zoom_level_{handle.digest}",
+    )
+    pan_x, pan_y = st.columns(2)
+    x = pan_x.slider("Pan left/right", 0, 100, 50, key=f"pan_x_{handle.digest}")
+    y = pan_y.slider("Pan up/down", 0, 100, 50, key=f"pan_y_{handle.digest}")
+    view = pyramid.render(level, (x / 100, y / 100), VIEWPORT)
+    st.image(
+        encode_jpeg(view),
+        caption=f"{pyramid.width}×{pyramid.height} px at {100 / (1 << level):g}%",
+        use_container_width=True,
+    )
+
+
 st.title("🏥 Healthcare Diagnosis Support System")
 st.caption("AI-powered multi-agent medical diagnosis with imaging analysis")
 
@@ -35,6 +213,27 @@ with st.sidebar:
     st.divider()
     
     verbose = st.checkbox("Verbose mode", value=True)
+    combined_views = st.checkbox(
+        "Analyse related views together",
+        value=False,
+        help="Send all views of a multi-image study in one request instead of analysing them in parallel",
+    )
+    speculative = st.checkbox(
+        "Speculative execution",
+        value=SPECULATIVE_EXECUTION,
+        help="Start treatment and drug-safety steps on provisional inputs; kept only if upstream results agree",
+    )
+    profile = st.selectbox(
+        "Crew profile",
+        PROFILES,
+        index=PROFILES.index(CREW_PROFILE) if CREW_PROFILE in PROFILES else 0,
+        help='"fast" answers referral, follow-up and patient communication in one LLM call',
+    )
+    seed_similar = st.checkbox(
+        "Seed from similar earlier cases",
+        value=True,
+        help="Give the symptom analyzer the analysis of a sufficiently similar earlier presentation",
+    )
     st.caption(f"LLM Model: {OPENAI_MODEL}")
     
     st.divider()
@@ -57,6 +256,11 @@ col1, col2 = st.columns([2, 1])
 with col1:
     st.subheader("📋 Patient Information")
     with st.form("patient_input"):
+        patient_id = st.text_input(
+            "Patient ID",
+            placeholder="e.g., MRN-001234 (optional)",
+            help="Links runs in the case store to a patient"
+        )
         symptoms = st.text_area(
             "Primary symptoms *", 
             placeholder="e.g., fever, cough, fatigue, chest pain",
@@ -85,224 +289,290 @@ with col1:
 
 with col2:
     st.subheader("🩻 Medical Imaging (Optional)")
-    uploaded_file = st.file_uploader(
-        "Upload medical image",
+    uploaded_files = st.file_uploader(
+        "Upload medical images",
         type=["jpg", "jpeg", "png", "dicom"],
-        help="Upload X-ray, MRI, CT scan, or other medical images"
+        accept_multiple_files=True,
+        help="Upload X-ray, MRI, CT scan, or other medical images; add every view of a study"
     )
     
-    if uploaded_file is not None:
+    if uploaded_files:
         try:
-            image = PILImage.open(uploaded_file)
-            st.image(image, caption="Uploaded Image", use_container_width=True)
-            st.success("✅ Image ready for analysis")
+            handles = get_upload_handles(uploaded_files)
+            for handle in handles:
+                st.image(thumbnail_bytes(handle), caption=handle.name or "Uploaded Image", use_container_width=True)
+                if st.checkbox("🔍 Zoom and pan", key=f"zoom_{handle.digest}"):
+                    show_zoom_viewer(handle)
+                # Gate and hash a draft-decoded preview; the full-resolution pixels are never held
+                preview = analysis_preview(handle)
+                quality = assess_image_quality(preview, size=handle.size)
+                for issue in quality["issues"]:
+                    st.error(f"❌ {issue}")
+                for warning in quality["warnings"]:
+                    st.warning(f"⚠️ {warning}")
+                previous = find_near_duplicate(image_fingerprint(preview), patient_context=None)
+                if previous is not None:
+                    st.info(
+                        f"♻️ Near-duplicate of an earlier study (Hamming distance "
+                        f"{previous['hamming_distance']}); its analysis is reused only for the same patient context"
+                    )
+            st.success(f"✅ {len(handles)} image(s) ready for analysis")
         except Exception as e:
             st.error(f"Error loading image: {e}")
     else:
-        st.info("📤 Upload a medical image for AI-powered radiological analysis")
+        st.info("📤 Upload medical images for AI-powered radiological analysis")
 
 # Results section
 if submitted:
     if not symptoms or not demographics:
         st.error("⚠️ Please fill in at least symptoms and demographics")
     else:
-        # Save uploaded image temporarily if provided
-        image_path = None
+        # Pass the uploaded images by in-memory reference if provided
+        image_refs = None
+        image_hash = None
         include_imaging = False
         
-        if uploaded_file is not None:
+        if uploaded_files:
             try:
-                upload_dir = Path("temp_uploads")
-                upload_dir.mkdir(exist_ok=True)
-                image_path = upload_dir / f"medical_image_{uploaded_file.name}"
-                
-                image = PILImage.open(uploaded_file)
-                image.save(image_path)
+                handles = get_upload_handles(uploaded_files)
+                image_refs = [handle.ref for handle in handles]
+                mode = "combined" if combined_views and len(handles) > 1 else "parallel"
+                image_hash = mode + ":" + ",".join(handle.digest for handle in handles)
                 include_imaging = True
                 st.info(f"🩻 Medical imaging analysis enabled")
             except Exception as e:
                 st.warning(f"Could not process image: {e}. Continuing without imaging.")
         
-        inputs = {
-            "symptoms": symptoms or "",
-            "demographics": demographics or "",
-            "history": history or "",
-            "medications": medications or "",
-            "allergies": allergies or "",
-            "working_differential": "To be generated by Symptom Analyzer",
-            "diagnosis_summary": "To be generated by previous steps",
-            "proposed_medications": medications or "",
-            "conditions": "From differential/diagnosis",
-            "treatment_plan": "To be generated by Treatment Agent",
-            "referral_plan": "To be generated by Referral Agent",
-            "clinical_summary": "Consolidated output",
-            "medical_image_path": str(image_path) if image_path else "No image provided",
-        }
+        inputs = build_inputs(
+            symptoms,
+            demographics,
+            history,
+            medications,
+            allergies,
+            image_refs=image_refs,
+            imaging_combined=combined_views,
+            patient_id=patient_id,
+        )
+        key = case_key(inputs, image_hash)
+        results = get_result_cache()
+        store = get_store()
 
         try:
-            # Set report date
-            if 'report_date' not in st.session_state:
-                st.session_state.report_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            with st.spinner("🤖 Running multi-agent diagnosis crew... This may take a few minutes."):
-                crew = build_diagnosis_crew(verbose=verbose, include_imaging=include_imaging)
-                result = crew.kickoff(inputs=inputs)
-            
-            st.success("✅ Analysis completed successfully!")
-            st.divider()
-            
-            # Display formatted results
-            st.markdown("# 📊 Medical Diagnosis Report")
-            st.markdown(f"**Patient:** {demographics} | **Generated:** {st.session_state.report_date}")
-            st.divider()
-            
-            # Parse and format the result
-            result_text = ""
-            if hasattr(result, 'raw'):
-                result_text = result.raw
-            elif hasattr(result, 'output'):
-                result_text = result.output
-            elif isinstance(result, str):
-                result_text = result
-            else:
-                result_text = str(result)
-            
-            # Create tabs for organized display
-            tab1, tab2, tab3 = st.tabs(["📋 Executive Summary", "📝 Detailed Report", "🔍 Technical Output"])
-            
-            with tab1:
-                st.markdown("### 🎯 Key Findings")
-                
-                # Executive summary card
-                with st.container():
-                    st.markdown("""
-                    <style>
-                    .summary-card {
-                        background-color: #f0f8ff;
-                        padding: 20px;
-                        border-radius: 10px;
-                        border-left: 5px solid #1f77b4;
-                    }
-                    </style>
-                    """, unsafe_allow_html=True)
-                    
-                    col_a, col_b = st.columns(2)
-                    
-                    with col_a:
-                        st.metric("Chief Complaint", symptoms[:50] + "..." if len(symptoms) > 50 else symptoms)
-                        st.metric("Patient Demographics", demographics)
-                    
-                    with col_b:
-                        st.metric("Medications", medications if medications else "None reported")
-                        st.metric("Allergies", allergies if allergies else "None reported")
-                
-                st.markdown("---")
-                
-                # Extract first few paragraphs as summary
-                summary_lines = result_text.split('\n')[:10]
-                summary = '\n'.join([line for line in summary_lines if line.strip()])
-                st.markdown(summary)
-                
-                if include_imaging:
-                    st.info("🩻 Medical imaging analysis included in this report")
-            
-            with tab2:
-                st.markdown("### 📄 Complete Analysis")
-                
-                # Organize by sections if possible
-                sections = {
-                    "Symptom Analysis": "🔍",
-                    "Medical History": "📋",
-                    "Imaging Analysis": "🩻",
-                    "Treatment Recommendations": "💊",
-                    "Referral Assessment": "👨‍⚕️",
-                    "Drug Safety": "⚠️",
-                    "Follow-up Plan": "📅",
-                    "Patient Instructions": "👤"
-                }
-                
-                # Try to split by common section headers
-                current_section = None
-                section_content = {}
-                
-                for line in result_text.split('\n'):
-                    # Check if line is a section header
-                    is_header = False
-                    for section_name, icon in sections.items():
-                        if section_name.lower() in line.lower() and (line.startswith('#') or line.isupper()):
-                            current_section = section_name
-                            section_content[current_section] = []
-                            is_header = True
-                            break
-                    
-                    if not is_header and current_section:
-                        section_content[current_section].append(line)
-                
-                # Display sections in expanders
-                if section_content:
-                    for section_name, icon in sections.items():
-                        if section_name in section_content:
-                            with st.expander(f"{icon} **{section_name}**", expanded=(section_name == "Symptom Analysis")):
-                                content = '\n'.join(section_content[section_name])
-                                st.markdown(content)
+            entry = results.get(key)
+            served_from = "cache"
+            if entry is None:
+                previous = store.find_by_input_hash(key)
+                if previous is not None:
+                    entry = case_entry(previous, verbose)
+                    served_from = "store"
                 else:
-                    # Fallback: display full text
-                    st.markdown(result_text)
-                
-                st.divider()
-                
-                # Visual indicators
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.markdown("**🟢 Completed Tasks**")
-                    st.progress(1.0)
-                with col2:
-                    st.markdown("**👥 Agents Involved**")
-                    agent_count = 8 if include_imaging else 7
-                    st.write(f"{agent_count} specialized agents")
-                with col3:
-                    st.markdown("**⏱️ Process**")
-                    st.write("Sequential workflow")
-            
-            with tab3:
-                st.markdown("### 🔧 Technical Details")
-                st.code(result_text, language="markdown")
-                
-                with st.expander("📦 Raw JSON Output"):
-                    st.json(str(result))
-                
-                with st.expander("🔍 Debug Information"):
-                    st.write("**Crew Configuration:**")
-                    st.write(f"- Verbose mode: {verbose}")
-                    st.write(f"- Imaging enabled: {include_imaging}")
-                    st.write(f"- Model: {OPENAI_MODEL}")
-                    if include_imaging:
-                        st.write(f"- Vision model: {GOOGLE_API_KEY[:20]}..." if GOOGLE_API_KEY else "Not configured")
-            
-            st.divider()
-            
-            # Download report button
-            st.download_button(
-                label="📥 Download Full Report",
-                data=result_text,
-                file_name=f"diagnosis_report_{demographics.replace(' ', '_')}.txt",
-                mime="text/plain"
-            )
-            
-            st.caption(
-                "⚠️ **IMPORTANT DISCLAIMER**: This AI-generated analysis is for educational and informational "
-                "purposes only. All medical decisions should be made in consultation with qualified healthcare "
-                "professionals. Do not use this report as a substitute for professional medical advice, diagnosis, or treatment."
-            )
-            
-            # Cleanup temp image
-            if image_path and image_path.exists():
-                try:
-                    image_path.unlink()
-                except:
-                    pass
-                    
+                    st.session_state.similar_case = None
+                    checkpoint = CheckpointStore().load(key)
+                    if checkpoint is not None and checkpoint["completed"]:
+                        # Same case as an interrupted run: continue it with its original inputs
+                        inputs = checkpoint["inputs"]
+                        profile = checkpoint.get("profile", profile)
+                        st.info(
+                            f"⏯️ Resuming an interrupted run after {len(checkpoint['completed'])}/"
+                            f"{len(checkpoint['plan'])} completed steps"
+                        )
+                    else:
+                        match = get_similar_index().query(symptoms, demographics)
+                        if match is not None:
+                            similarity, similar = match
+                            st.session_state.similar_case = {**similar, "similarity": similarity, "seeded": seed_similar}
+                            if seed_similar:
+                                inputs["similar_case_analysis"] = similar["symptom_analysis"]
+                    with st.spinner("🤖 Running multi-agent diagnosis crew... This may take a few minutes."):
+                        entry = run_case(inputs, key, include_imaging, verbose, speculative, profile)
+                    served_from = None
+                # Partial runs stay out of the cache so a resubmission resumes them
+                if not entry.get("partial"):
+                    results.put(key, entry)
+            st.session_state.served_from = served_from
+            st.session_state.current_case = entry
         except Exception as e:
+            st.session_state.current_case = None
             st.error(f"❌ Failed to run diagnosis: {e}")
             with st.expander("🔍 View Error Details"):
                 st.exception(e)
+
+interrupted = st.session_state.get("interrupted")
+if interrupted is not None and not submitted:
+    st.warning(
+        f"⏸️ The last run stopped after {interrupted['completed']}/{interrupted['total']} steps; "
+        "completed steps are checkpointed and will not be rerun."
+    )
+    if st.button("🔁 Resume interrupted run"):
+        try:
+            with st.spinner("🤖 Resuming the diagnosis crew from the first unfinished step..."):
+                entry = run_case(
+                    interrupted["inputs"],
+                    interrupted["key"],
+                    interrupted["include_imaging"],
+                    verbose,
+                    speculative,
+                    interrupted.get("profile", profile),
+                )
+            st.session_state.served_from = None
+            st.session_state.current_case = entry
+        except Exception as e:
+            st.error(f"❌ Failed to resume diagnosis: {e}")
+            with st.expander("🔍 View Error Details"):
+                st.exception(e)
+        else:
+            st.rerun()
+
+similar_case = st.session_state.get("similar_case")
+if similar_case is not None:
+    action = "seeded the symptom analysis" if similar_case["seeded"] else "is available for reuse"
+    st.info(
+        f"🧭 A similar earlier case ({similar_case['similarity']:.0%} similar, run on "
+        f"{similar_case['created_at'].replace('T', ' ')}) {action}: "
+        f"{similar_case['symptoms']} | {similar_case['demographics']}"
+    )
+    if st.button("📂 Open similar earlier case"):
+        record = get_store().get(similar_case["case_id"])
+        if record is not None:
+            st.session_state.current_case = case_entry(record, verbose)
+            st.session_state.served_from = "similar"
+            st.session_state.similar_case = None
+
+# Render the latest case from memory, so tab switches and downloads do not rerun the crew
+case = st.session_state.get("current_case")
+if case is not None:
+    result_text = case["result_text"]
+    include_imaging = case["include_imaging"]
+    report = load_report(report_digest(result_text), result_text)
+    
+    served_from = st.session_state.get("served_from")
+    if served_from == "cache":
+        st.info("⚡ Served from cache: identical inputs and image were analysed earlier")
+    elif served_from == "store":
+        st.info(f"🗄️ Loaded from the case store: identical case run on {case['report_date']}")
+    elif served_from == "similar":
+        st.info(f"🧭 Showing the similar earlier case run on {case['report_date']}")
+    else:
+        st.success("✅ Analysis completed successfully!")
+    st.divider()
+    
+    # Display formatted results
+    st.markdown("# 📊 Medical Diagnosis Report")
+    st.markdown(f"**Patient:** {case['demographics']} | **Generated:** {case['report_date']}")
+    st.divider()
+    
+    # Create tabs for organized display
+    tab1, tab2, tab3 = st.tabs(["📋 Executive Summary", "📝 Detailed Report", "🔍 Technical Output"])
+    
+    with tab1:
+        st.markdown("### 🎯 Key Findings")
+        
+        # Executive summary card
+        with st.container():
+            st.markdown("""
+            <style>
+            .summary-card {
+                background-color: #f0f8ff;
+                padding: 20px;
+                border-radius: 10px;
+                border-left: 5px solid #1f77b4;
+            }
+            </style>
+            """, unsafe_allow_html=True)
+            
+            col_a, col_b = st.columns(2)
+            
+            with col_a:
+                chief_complaint = case["symptoms"]
+                st.metric("Chief Complaint", chief_complaint[:50] + "..." if len(chief_complaint) > 50 else chief_complaint)
+                st.metric("Patient Demographics", case["demographics"])
+            
+            with col_b:
+                st.metric("Medications", case["medications"] if case["medications"] else "None reported")
+                st.metric("Allergies", case["allergies"] if case["allergies"] else "None reported")
+        
+        st.markdown("---")
+        
+        st.markdown(report.summary)
+        
+        if include_imaging:
+            st.info("🩻 Medical imaging analysis included in this report")
+    
+    with tab2:
+        st.markdown("### 📄 Complete Analysis")
+        
+        # Display sections in expanders
+        if report.sections:
+            for section_name, icon, content in report.ordered_sections():
+                with st.expander(f"{icon} **{section_name}**", expanded=(section_name == "Symptom Analysis")):
+                    st.markdown(content)
+        else:
+            # Fallback: display full text
+            st.markdown(report.text)
+        
+        st.divider()
+        
+        # Visual indicators
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown("**🟢 Completed Tasks**")
+            st.progress(1.0)
+        with col2:
+            st.markdown("**👥 Agents Involved**")
+            skipped = case.get("skipped", [])
+            agent_count = (8 if include_imaging else 7) - len(skipped)
+            st.write(f"{agent_count} specialized agents" + (f" ({len(skipped)} step(s) skipped)" if skipped else ""))
+        with col3:
+            st.markdown("**⏱️ Process**")
+            st.write("Sequential workflow")
+    
+    with tab3:
+        st.markdown("### 🔧 Technical Details")
+        st.code(report.text, language="markdown")
+        
+        with st.expander("📦 Raw JSON Output"):
+            st.json(case["raw_output"])
+        
+        with st.expander("🔍 Debug Information"):
+            st.write("**Crew Configuration:**")
+            st.write(f"- Verbose mode: {case['verbose']}")
+            st.write(f"- Imaging enabled: {include_imaging}")
+            st.write(f"- Model: {OPENAI_MODEL}")
+            if include_imaging:
+                st.write(f"- Vision model: {GOOGLE_API_KEY[:20]}..." if GOOGLE_API_KEY else "Not configured")
+            results = get_result_cache()
+            st.write(f"- Result cache (this session): {len(results)}/{results.max_entries} entries, {results.hits} hits, {results.misses} misses")
+            st.write(f"- Case ID: {case['case_id']}")
+            st.write(f"- Similar-case index: {get_similar_index().stats()}")
+            if case.get("speculation"):
+                st.write("**Speculative steps (this run):**")
+                st.json(case["speculation"])
+            st.write(f"- Speculation overall: {speculation_stats.snapshot()}")
+            if case.get("tool_calls"):
+                st.write(f"- Tool calls (this run): {case['tool_calls']}")
+            if case.get("budget"):
+                st.write(f"- Run budget (this run): {case['budget']}")
+            st.write(f"- LLM calls per case (case store): {get_store().llm_call_stats()}")
+            if case["task_timings"]:
+                st.write("**Task timings (s):**")
+                st.json(case["task_timings"])
+            if "tile_cache" in st.session_state:
+                st.write(f"- Image tile cache (this session): {st.session_state.tile_cache.stats()}")
+            st.write("**Provider rate limiters:**")
+            st.json(limiter_metrics())
+    
+    st.divider()
+    
+    # Download report button
+    st.download_button(
+        label="📥 Download Full Report",
+        data=result_text,
+        file_name=f"diagnosis_report_{case['demographics'].replace(' ', '_')}.txt",
+        mime="text/plain"
+    )
+    
+    st.caption(
+        "⚠️ **IMPORTANT DISCLAIMER**: This AI-generated analysis is for educational and informational "
+        "purposes only. All medical decisions should be made in consultation with qualified healthcare "
+        "professionals. Do not use this report as a substitute for professional medical advice, diagnosis, or treatment."
+    )
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# Keep test runs offline
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,34 @@
+"""
+Batch interaction screening of free-text medication lists
+"""
+import pytest
+
+from health_crew.allergy import parse_allergies
+from health_crew.screening import screen_ward
+
+
+def _pairs(result):
+    return {(hit.drug_a, hit.drug_b, hit.severity) for hit in result.hits}
+
+
+@pytest.mark.parametrize(
+    "medications",
+    [
+        "warfarin 5 mg daily, sulfamethoxazole/trimethoprim 800/160 mg BID",
+        "Warfarin 5mg qd\nBactrim DS 1 tab BID",
+    ],
+)
+def test_combination_product_is_one_drug(medications):
+    (result,) = screen_ward([("P1", medications)])
+    assert result.unrecognized == []
+    assert ("sulfamethoxazole trimethoprim", "warfarin", "high") in _pairs(result)
+
+
+def test_slash_between_single_drugs_lists_both():
+    (result,) = screen_ward([("P1", "warfarin/aspirin")])
+    assert ("aspirin", "warfarin", "high") in _pairs(result)
+
+
+def test_slash_in_allergies():
+    assert parse_allergies("PCN/sulfa (rash)") == ["pcn", "sulfa"]
+    assert parse_allergies("amoxicillin/clavulanate") == ["amoxicillin/clavulanate"]
@@ -0,0 +1,51 @@
+"""
+Server worker path: cases submitted over HTTP run the same plan as the app
+"""
+import threading
+
+import pytest
+
+pytest.importorskip("crewai")
+
+from crewai import LLM  # noqa: E402
+
+from health_crew import server  # noqa: E402
+
+
+def _message_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.get("content", "")) for message in messages)
+
+
+class PromptRecorder:
+    """Stands in for the provider: records every prompt and proposes amoxicillin"""
+
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def answer(self, messages) -> str:
+        with self._lock:
+            self.prompts.append(_message_text(messages))
+        return "Thought: I now know the final answer\nFinal Answer: Start amoxicillin 500 mg TID for 7 days."
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = PromptRecorder()
+    monkeypatch.setattr(LLM, "call", lambda llm, messages, *args, **kwargs: recorder.answer(messages))
+    return recorder
+
+
+def test_server_case_gets_allergy_screen(recorder):
+    inputs, images = server.CaseService.parse_case(
+        {"symptoms": "fever and productive cough", "demographics": "age 40, male", "allergies": "penicillin (hives)"}
+    )
+    result = server._run_case(inputs, images)
+
+    assert result["result"]
+    safety_prompts = [prompt for prompt in recorder.prompts if "Allergy cross-reactivity screen" in prompt]
+    assert safety_prompts, "drug-safety step never ran"
+    assert all("Not screened yet" not in prompt for prompt in safety_prompts)
+    assert any("amoxicillin vs penicillin allergy" in prompt for prompt in safety_prompts)
@@ -0,0 +1,132 @@
+"""
+Per-run clones of the agent and task templates: isolation, cost and thread safety
+"""
+import re
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("crewai")
+
+from crewai import LLM  # noqa: E402
+
+from health_crew import runner, workflows  # noqa: E402
+from health_crew.intake import build_inputs  # noqa: E402
+from health_crew.templates import clone_plan  # noqa: E402
+from health_crew.trace import RunTrace  # noqa: E402
+
+_MARKER_RE = re.compile(r"\bcase-\d{3}\b")
+
+
+def _message_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.get("content", "")) for message in messages)
+
+
+class StubLLM:
+    """Stands in for the provider: answers every call with the case marker it was prompted with"""
+
+    def __init__(self):
+        self.calls = 0
+        self.mixed = []
+        self._lock = threading.Lock()
+
+    def answer(self, messages) -> str:
+        markers = set(_MARKER_RE.findall(_message_text(messages)))
+        with self._lock:
+            self.calls += 1
+            if len(markers) > 1:
+                self.mixed.append(sorted(markers))
+        time.sleep(0.002)  # let concurrent runs interleave
+        marker = markers.pop() if len(markers) == 1 else "no-marker"
+        return f"Thought: I now know the final answer\nFinal Answer: Assessment for {marker}."
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    stub = StubLLM()
+    monkeypatch.setattr(LLM, "call", lambda llm, messages, *args, **kwargs: stub.answer(messages))
+    return stub
+
+
+def _snapshot(plan):
+    """Identity of every mutable container and runtime field on the templates"""
+    snapshot = []
+    for _, agent, task in plan:
+        for model in (agent, task):
+            for name, value in vars(model).items():
+                if isinstance(value, (list, dict, set)):
+                    snapshot.append((id(model), name, id(value), len(value)))
+        snapshot.append((id(task), "output", task.output))
+        snapshot.append((id(agent), "agent_executor", id(getattr(agent, "agent_executor", None))))
+    return snapshot
+
+
+@pytest.mark.parametrize("include_imaging", [False, True])
+@pytest.mark.parametrize("profile", workflows.PROFILES)
+def test_clone_plan_is_independent(include_imaging, profile):
+    template = workflows._template_plan(include_imaging, profile)
+    plan = workflows.diagnosis_plan(include_imaging, profile)
+
+    templates = {id(obj) for _, agent, task in template for obj in (agent, task)}
+    assert [name for name, _, _ in plan] == [name for name, _, _ in template]
+    for (_, agent, task), (_, template_agent, template_task) in zip(plan, template):
+        assert agent is not template_agent and task is not template_task
+        assert task.agent is agent
+        assert task.output is None
+        assert all(id(context) not in templates for context in task.context or [])
+        for name, value in vars(agent).items():
+            if isinstance(value, (list, dict, set)):
+                assert value is not getattr(template_agent, name), f"agent {name} is shared"
+        assert agent.llm is template_agent.llm
+        assert [tool.name for tool in agent.tools] == [tool.name for tool in template_agent.tools]
+
+
+def test_clone_cost_is_small():
+    template = workflows._template_plan(True, "full")
+    clone_plan(template)
+    rounds = 200
+    started = time.perf_counter()
+    for _ in range(rounds):
+        clone_plan(template)
+    per_clone = (time.perf_counter() - started) / rounds
+    # Cloning must stay negligible next to a single LLM call
+    assert per_clone < 0.02, f"cloning a plan took {per_clone * 1000:.1f} ms"
+
+
+@pytest.mark.parametrize("speculative", [False, True])
+def test_concurrent_runs_do_not_share_state(stub_llm, tmp_path, speculative):
+    template = workflows._template_plan(False, "full")
+    before = _snapshot(template)
+    runs = 8
+    results, errors = {}, []
+
+    def run(index: int) -> None:
+        marker = f"case-{index:03d}"
+        try:
+            inputs = build_inputs(f"{marker}: fever and cough", "age 40, male", "", "", "")
+            with RunTrace(task_names=workflows.task_names(False, "full")):
+                results[marker] = runner.run_plan(
+                    inputs,
+                    checkpoints=runner.CheckpointStore(str(tmp_path / marker)),
+                    speculative=speculative,
+                    conditional=False,
+                    profile="full",
+                )
+        except Exception as e:  # collected so every thread finishes
+            errors.append(f"{marker}: {e!r}")
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(runs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors
+    assert not stub_llm.mixed, f"prompts mixed cases: {stub_llm.mixed[:3]}"
+    for marker, result in results.items():
+        for output in result.tasks_output:
+            assert marker in output.raw, f"{marker} got {output.raw!r}"
+    assert _snapshot(template) == before